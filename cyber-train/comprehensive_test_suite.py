@@ -2,6 +2,13 @@
 """
 Comprehensive test suite for NER and Intent models with multiple input types.
 Tests various query styles, domains, complexity levels, and edge cases.
+
+Test cases are run in batches through nlp.pipe (--batch-size, --n-process);
+results keep the input order. The post-processing filter runs as a component
+of the NER pipeline, inside the nlp.pipe workers. With --server a running
+inference_server.py answers instead of models loaded here. Predictions are
+cached per text (inference_cache.py; --cache-db keeps them between runs).
+Intents above 0.3 are read from the textcat score matrix (intent_scoring.py).
 """
 
 import spacy
@@ -12,9 +19,14 @@ import argparse
 from datetime import datetime
 import sys
 
+from inference_cache import open_cache
+from intent_scoring import IntentScorer
+from inference_server import InferenceClient
+from pattern_ruler import CATALOG_DIR, PATTERN_RULER
+
 # Import post-processing filter if available
 try:
-    from fix_entity_extraction import post_process_entities
+    from fix_entity_extraction import add_entity_filter
     USE_FILTER = True
 except ImportError:
     USE_FILTER = False
@@ -23,9 +35,20 @@ except ImportError:
 class ComprehensiveTester:
     """Comprehensive test suite for trained models."""
     
-    def __init__(self, ner_model_path: str = None, intent_model_path: str = None):
+    def __init__(self, ner_model_path: str = None, intent_model_path: str = None,
+                 batch_size: int = 256, n_process: int = 1, server: str = None,
+                 cache: bool = True, cache_db: str = None):
         self.ner_model = None
         self.intent_model = None
+        self.client = InferenceClient(server) if server else None
+        self.use_cache = cache
+        self.cache_db = Path(cache_db) if cache_db else None
+        self.cache = None
+        self.intent_scorer = None
+        self.has_ner = False
+        self.has_intent = False
+        self.batch_size = batch_size
+        self.n_process = n_process
         
         # Default paths
         if ner_model_path is None:
@@ -48,10 +71,29 @@ class ComprehensiveTester:
         print("LOADING MODELS")
         print("="*70)
         
+        if self.client is not None:
+            print(f"\n🔌 Using inference server at: {self.client.url}")
+            try:
+                info = self.client.health()
+                self.has_ner = info["ner"] is not None
+                self.has_intent = info["intent"] is not None
+                print(f"✅ NER: {info['ner']}, Intent: {info['intent']}")
+                self._open_cache(
+                    [Path(info["ner"]) if info["ner"] else None,
+                     Path(info["intent"]) if info["intent"] else None],
+                    [info["ner_pipeline"], info["intent_pipeline"]],
+                )
+            except (OSError, RuntimeError, ValueError) as e:
+                print(f"❌ Inference server not reachable: {e}")
+            print()
+            return
+        
         if self.ner_model_path.exists():
             try:
                 print(f"\n📦 Loading NER model from: {self.ner_model_path}")
                 self.ner_model = spacy.load(str(self.ner_model_path))
+                if USE_FILTER:
+                    add_entity_filter(self.ner_model)
                 print(f"✅ NER model loaded successfully")
             except Exception as e:
                 print(f"❌ Error loading NER model: {e}")
@@ -59,7 +101,11 @@ class ComprehensiveTester:
         else:
             print(f"⚠️  NER model not found at: {self.ner_model_path}")
         
-        if self.intent_model_path.exists():
+        if self.ner_model is not None and self.intent_model_path.resolve() == self.ner_model_path.resolve():
+            # A merged pipeline (merge_pipelines.py) sets ents and cats in one pass
+            self.intent_model = self.ner_model
+            print(f"✅ Using the NER pipeline for intents too (merged pipeline)")
+        elif self.intent_model_path.exists():
             try:
                 print(f"\n📦 Loading Intent model from: {self.intent_model_path}")
                 self.intent_model = spacy.load(str(self.intent_model_path))
@@ -70,15 +116,101 @@ class ComprehensiveTester:
         else:
             print(f"⚠️  Intent model not found at: {self.intent_model_path}")
         
+        self.has_ner = self.ner_model is not None
+        self.has_intent = self.intent_model is not None
+        if self.has_intent:
+            try:
+                self.intent_scorer = IntentScorer(self.intent_model)
+            except ValueError as e:
+                print(f"⚠️  {e}")
+                self.has_intent = False
+        self._open_cache(
+            [self.ner_model_path, self.intent_model_path],
+            [self.ner_model.pipe_names if self.has_ner else None,
+             self.intent_model.pipe_names if self.has_intent else None],
+        )
         print()
     
+    def _open_cache(self, model_paths: List[Path], pipelines: List):
+        if not self.use_cache or not (self.has_ner or self.has_intent):
+            return
+        if any(PATTERN_RULER in (pipeline or []) for pipeline in pipelines):
+            # A server started with --patterns; catalog edits change its entities
+            model_paths = [*model_paths, CATALOG_DIR]
+        self.cache = open_cache(model_paths, {"pipelines": pipelines}, db_path=self.cache_db)
+    
     def test_query(self, text: str, category: str = "general", 
                    expected_entities: List[Tuple[str, str]] = None,
                    expected_intents: List[str] = None) -> Dict:
         """Test a single query and return results."""
-        result = {
+        return self.test_queries([{
             "text": text,
             "category": category,
+            "expected_entities": expected_entities,
+            "expected_intents": expected_intents,
+        }])[0]
+    
+    def test_queries(self, test_cases: List[Dict]) -> List[Dict]:
+        """
+        Test many queries at once; returns one result per test case, in order.
+        
+        Test cases are test_query keyword dicts. Each model processes all
+        texts with nlp.pipe(batch_size, n_process) instead of one call per text.
+        """
+        texts = [test_case["text"] for test_case in test_cases]
+        if self.cache is not None:
+            predictions = self.cache.map("query", texts, self._predict)
+        else:
+            predictions = self._predict(texts)
+        return [self._build_result(
+                    test_case,
+                    [tuple(entity) for entity in entities] if entities is not None else None,
+                    [tuple(intent) for intent in intents] if intents is not None else None)
+                for test_case, (entities, intents) in zip(test_cases, predictions)]
+    
+    def _predict(self, texts: List[str]) -> List[Tuple[Optional[List], Optional[List]]]:
+        """(entities, intents scoring > 0.3) per text; None for a model that isn't available."""
+        if self.client is not None:
+            responses = self.client.predict(texts, entities=self.has_ner, intents=self.has_intent,
+                                            top_n=None, min_score=0.3)
+            return [([(entity[0], entity[1]) for entity in response["entities"]] if self.has_ner else None,
+                     [(label, score) for label, score in response["intents"] if score > 0.3]
+                     if self.has_intent else None)
+                    for response in responses]
+        
+        merged = self.intent_scorer is not None and self.intent_model is self.ner_model
+        if merged:
+            # Score the textcat from the NER docs instead of filling doc.cats
+            with self.ner_model.select_pipes(disable=[self.intent_scorer.name]):
+                ner_docs = self._pipe(self.ner_model, texts)
+        else:
+            ner_docs = self._pipe(self.ner_model, texts)
+        
+        # The filter component has already removed false positives
+        entities = [[(ent.text, ent.label_) for ent in doc.ents] if doc is not None else None
+                    for doc in ner_docs]
+        if self.intent_scorer is None:
+            intents = [None] * len(texts)
+        else:
+            # Intents with score > 0.3, best first
+            intents = self.intent_scorer.top_k(ner_docs if merged else texts, k=None, threshold=0.3,
+                                               batch_size=self.batch_size, n_process=self.n_process)
+        return list(zip(entities, intents))
+    
+    def _pipe(self, nlp, texts: List[str]) -> list:
+        """Processed docs for texts, or Nones when the model isn't loaded."""
+        if nlp is None:
+            return [None] * len(texts)
+        return list(nlp.pipe(texts, batch_size=self.batch_size, n_process=self.n_process))
+    
+    def _build_result(self, test_case: Dict, entities: Optional[List[Tuple[str, str]]] = None,
+                      intents: Optional[List[Tuple[str, float]]] = None) -> Dict:
+        """Result dict for one test case; None for a model that isn't available."""
+        expected_entities = test_case.get("expected_entities")
+        expected_intents = test_case.get("expected_intents")
+        result = {
+            "text": test_case["text"],
+            "category": test_case.get("category", "general"),
             "entities": [],
             "intents": [],
             "entity_count": 0,
@@ -87,23 +219,12 @@ class ComprehensiveTester:
         }
         
         # Test NER
-        if self.ner_model:
-            doc = self.ner_model(text)
-            entities = [(ent.text, ent.label_) for ent in doc.ents]
-            
-            # Apply post-processing filter if available
-            if USE_FILTER:
-                entities = post_process_entities(entities, apply_filter=True, apply_validation=True)
-            
+        if entities is not None:
             result["entities"] = entities
             result["entity_count"] = len(entities)
         
         # Test Intent
-        if self.intent_model:
-            doc = self.intent_model(text)
-            intents = sorted(doc.cats.items(), key=lambda x: x[1], reverse=True)
-            # Filter to top intents with score > 0.3
-            intents = [(intent, score) for intent, score in intents if score > 0.3]
+        if intents is not None:
             result["intents"] = intents
             result["intent_count"] = len(intents)
         
@@ -160,15 +281,16 @@ class ComprehensiveTester:
         
         print(f"\n📊 Running {len(test_cases)} test cases across multiple categories...")
         
-        for i, test_case in enumerate(test_cases, 1):
+        for i, result in enumerate(self.test_queries(test_cases), 1):
             print(f"\n[Test {i}/{len(test_cases)}]")
-            result = self.test_query(**test_case)
             self.print_result(result, show_details=False)
             self.results["test_cases"].append(result)
         
         # Generate summary
         self._generate_summary()
         self._print_summary()
+        if self.cache is not None:
+            print(f"\n{self.cache.summary()}")
     
     def _get_test_cases(self) -> List[Dict]:
         """
@@ -546,9 +668,8 @@ class ComprehensiveTester:
         
         print(f"\n📂 Loading {len(custom_tests)} custom test cases from {test_path}")
         
-        for i, test_case in enumerate(custom_tests, 1):
+        for i, result in enumerate(self.test_queries(custom_tests), 1):
             print(f"\n[Custom Test {i}/{len(custom_tests)}]")
-            result = self.test_query(**test_case)
             self.print_result(result)
             self.results["test_cases"].append(result)
         
@@ -593,17 +714,47 @@ def main():
         "--text",
         help="Test a single query"
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help="Texts per nlp.pipe batch (default: 256)"
+    )
+    parser.add_argument(
+        "--n-process",
+        type=int,
+        default=1,
+        help="Processes per model for nlp.pipe (default: 1)"
+    )
+    parser.add_argument(
+        "--server",
+        help="Use a running inference_server.py (e.g. http://127.0.0.1:8765) instead of loading the models"
+    )
+    parser.add_argument(
+        "--cache-db",
+        help="SQLite file that keeps predictions between runs (invalidated when the models change)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Don't cache predictions"
+    )
     
     args = parser.parse_args()
     
     tester = ComprehensiveTester(
         ner_model_path=args.ner_model,
-        intent_model_path=args.intent_model
+        intent_model_path=args.intent_model,
+        batch_size=args.batch_size,
+        n_process=args.n_process,
+        server=args.server,
+        cache=not args.no_cache,
+        cache_db=args.cache_db
     )
     
     tester.load_models()
     
-    if not tester.ner_model and not tester.intent_model:
+    if not tester.has_ner and not tester.has_intent:
         print("❌ No models loaded. Exiting.")
         return
     
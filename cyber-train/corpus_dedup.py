@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Exact and near-duplicate detection for the entities-intent corpus.
+
+The corpus is heavily templated ("Threat alert: Actor_40 targeting sector_40 ...")
+and double_training_data.py duplicates whole files, so a large share of the
+examples add epoch time without adding signal. This module provides:
+1. Exact deduplication on normalized text (lowercase, collapsed whitespace)
+2. Near-duplicate clustering with MinHash signatures and LSH banding
+3. Per-cluster caps so a template keeps a few variants instead of thousands
+4. A JSON report of everything that was collapsed
+
+Used by prepare_spacy_training.py (--dedup) and runnable on its own to audit
+the corpus without preparing training data.
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from jsonl_reader import iter_records
+
+# Mersenne prime for the universal hash family; a * x + b stays below 2**63
+_MERSENNE_PRIME = (1 << 31) - 1
+
+# Digits are masked for near-duplicate shingles so "Actor_40" and "Actor_41"
+# produce the same template
+_DIGITS = re.compile(r"\d+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for exact matching and split hashing: lowercase with collapsed whitespace."""
+    return " ".join(text.lower().split())
+
+
+class CorpusDeduplicator:
+    """
+    Streaming exact + near-duplicate filter.
+
+    Call keep() once per example in corpus order; it returns False for
+    examples that should be dropped. Near-duplicate clusters are built
+    greedily: the first example of a cluster becomes its representative and
+    only representatives are indexed, so the LSH index grows with the number
+    of clusters rather than the number of examples. Exact matching keeps a
+    16-byte digest and a count per distinct text, and the text itself only
+    for texts that turn out to repeat (for the report).
+    """
+
+    def __init__(self, near_threshold: float = 0.9, max_per_cluster: int = 5,
+                 num_perm: int = 64, bands: int = 8, shingle_size: int = 3, seed: int = 42):
+        assert num_perm % bands == 0, "num_perm must be divisible by bands"
+        self.near_threshold = near_threshold
+        self.max_per_cluster = max(1, max_per_cluster)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.RandomState(seed)
+        self._perm_a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._perm_b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+        # Digest -> copies seen; digest -> text for the repeated ones only
+        self._exact_seen = {}
+        self._exact_texts = {}
+        self._buckets = {}
+        self._clusters = []
+
+        self.stats = Counter()
+
+    def _shingles(self, text: str) -> np.ndarray:
+        """Hash the word n-grams of the digit-masked text."""
+        words = _DIGITS.sub("0", normalize_text(text)).split()
+        if len(words) < self.shingle_size:
+            grams = [" ".join(words)]
+        else:
+            grams = [" ".join(words[i:i + self.shingle_size])
+                     for i in range(len(words) - self.shingle_size + 1)]
+        return np.array([zlib.crc32(gram.encode("utf-8")) % _MERSENNE_PRIME for gram in set(grams)],
+                        dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a text."""
+        shingles = self._shingles(text)
+        hashed = (np.outer(self._perm_a, shingles) + self._perm_b[:, None]) % _MERSENNE_PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [bytes([band]) + signature[band * self.rows:(band + 1) * self.rows].tobytes()
+                for band in range(self.bands)]
+
+    def keep(self, text: str, source: Optional[str] = None) -> bool:
+        """Return True if the example should be kept."""
+        self.stats["seen"] += 1
+
+        exact_key = hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16).digest()
+        if exact_key in self._exact_seen:
+            self.stats["exact_removed"] += 1
+            self._exact_seen[exact_key] += 1
+            self._exact_texts.setdefault(exact_key, text)
+            return False
+        self._exact_seen[exact_key] = 1
+
+        if self.near_threshold <= 0:
+            self.stats["kept"] += 1
+            return True
+
+        signature = self.signature(text)
+        band_keys = self._band_keys(signature)
+
+        # Find the most similar existing cluster among LSH candidates
+        best_cluster, best_similarity = None, 0.0
+        candidates = set()
+        for key in band_keys:
+            candidates.update(self._buckets.get(key, ()))
+        for cluster_id in candidates:
+            similarity = float(np.mean(self._clusters[cluster_id]["signature"] == signature))
+            if similarity > best_similarity:
+                best_cluster, best_similarity = cluster_id, similarity
+
+        if best_cluster is not None and best_similarity >= self.near_threshold:
+            cluster = self._clusters[best_cluster]
+            cluster["size"] += 1
+            if cluster["kept"] < self.max_per_cluster:
+                cluster["kept"] += 1
+                self.stats["kept"] += 1
+                return True
+            if len(cluster["collapsed"]) < 3:
+                cluster["collapsed"].append(text)
+            if source and len(cluster["sources"]) < 5:
+                cluster["sources"].add(source)
+            self.stats["near_removed"] += 1
+            return False
+
+        cluster_id = len(self._clusters)
+        self._clusters.append({
+            "signature": signature,
+            "representative": text,
+            "size": 1,
+            "kept": 1,
+            "collapsed": [],
+            "sources": {source} if source else set(),
+        })
+        for key in band_keys:
+            self._buckets.setdefault(key, []).append(cluster_id)
+        self.stats["kept"] += 1
+        return True
+
+    def report(self, top_n: int = 50) -> Dict:
+        """Summary of what was collapsed, with the largest clusters first."""
+        collapsed_clusters = [c for c in self._clusters if c["size"] > c["kept"]]
+        collapsed_clusters.sort(key=lambda c: c["size"], reverse=True)
+        # First-seen order among equal counts
+        exact_duplicates = [key for key in self._exact_seen if key in self._exact_texts]
+        exact_duplicates.sort(key=self._exact_seen.get, reverse=True)
+        return {
+            "settings": {
+                "near_threshold": self.near_threshold,
+                "max_per_cluster": self.max_per_cluster,
+                "num_perm": self.num_perm,
+                "bands": self.bands,
+                "shingle_size": self.shingle_size,
+            },
+            "seen": self.stats["seen"],
+            "kept": self.stats["kept"],
+            "exact_removed": self.stats["exact_removed"],
+            "near_removed": self.stats["near_removed"],
+            "clusters": len(self._clusters),
+            "capped_clusters": len(collapsed_clusters),
+            "top_exact_duplicates": [
+                {"text": self._exact_texts[key], "copies": self._exact_seen[key]}
+                for key in exact_duplicates[:top_n]
+            ],
+            "top_clusters": [
+                {
+                    "representative": c["representative"],
+                    "size": c["size"],
+                    "kept": c["kept"],
+                    "collapsed_examples": c["collapsed"],
+                    "sources": sorted(c["sources"]),
+                }
+                for c in collapsed_clusters[:top_n]
+            ],
+        }
+
+    def summary_line(self) -> str:
+        return (f"kept {self.stats['kept']} of {self.stats['seen']} "
+                f"(exact duplicates: -{self.stats['exact_removed']}, "
+                f"near duplicates: -{self.stats['near_removed']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Report exact and near-duplicate examples in the entities-intent corpus"
+    )
+    parser.add_argument(
+        "--base-dir",
+        default="cyber-train/entities-intent",
+        help="Base directory containing JSONL files"
+    )
+    parser.add_argument(
+        "--near-dup-threshold",
+        type=float,
+        default=0.9,
+        help="Estimated Jaccard similarity for near duplicates (0 disables, default: 0.9)"
+    )
+    parser.add_argument(
+        "--max-per-cluster",
+        type=int,
+        default=5,
+        help="Examples kept per near-duplicate cluster (default: 5)"
+    )
+    parser.add_argument(
+        "--report",
+        default="dedup_report.json",
+        help="Output path for the JSON report"
+    )
+    args = parser.parse_args()
+
+    base_dir = Path(args.base_dir)
+    report = {}
+    for kind, pattern in (("entities", "*_entities.jsonl"), ("intents", "*_intent.jsonl")):
+        dedup = CorpusDeduplicator(args.near_dup_threshold, args.max_per_cluster)
+        for file_path in sorted(base_dir.rglob(pattern)):
+            source = str(file_path.relative_to(base_dir))
+            for record in iter_records(file_path, kind, errors=[]):
+                dedup.keep(record.text, source)
+        print(f"🧹 {kind}: {dedup.summary_line()}")
+        report[kind] = dedup.report()
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Saved dedup report: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
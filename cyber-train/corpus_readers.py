@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+"""
+Custom spaCy corpus readers for the cybersecurity training data.
+
+Registered readers (load with `spacy train ... --code cyber-train/corpus_readers.py`):
+- cyber.SparseIntentCorpus.v1: reads intent DocBins whose categories were
+  moved to a sparse sidecar file by prepare_spacy_training.py --sparse-intents
+- cyber.WeightedCorpus.v1: oversamples (or undersamples) examples on the fly
+  by pillar and label weights, instead of duplicating JSONL lines
+- cyber.JsonlCorpus.v1: streams the *_entities.jsonl / *_intent.jsonl files
+  directly, without prepare_spacy_training.py and without DocBins
+- cyber.StratifiedDevCorpus.v1: a small dev subset that covers as many
+  labels as possible, for frequent evaluation in training_driver.py
+
+Sparse intent encoding
+----------------------
+A DocBin stores every doc's `cats` as its own msgpack dict of label strings.
+With ~3k intent labels in the label table and ~8 labels annotated per doc,
+most of an intents_*.spacy file is repeated label strings. The sparse
+encoding interns every label once and keeps, per doc, only the label IDs that
+were annotated (positive or explicitly negative) in CSR layout:
+
+    labels  : unicode array, label ID -> label
+    offsets : int64 array of len(docs) + 1, row boundaries into ids/values
+    ids     : uint16/uint32 label IDs
+    values  : uint8 0/1 annotation values
+
+Labels that are not listed for a doc stay missing (not negative), which is
+how textcat_multilabel already treats labels absent from doc.cats.
+
+Weighted oversampling
+---------------------
+prepare_spacy_training.py stores each doc's source pillar (the directory of
+its JSONL file) in a <name>.pillars.npz sidecar next to every .spacy file
+(pillar names plus one uint16 name ID per doc; DocBin's own user_data
+storage packs a msgpack dict per doc, which tripled preparation time). The
+readers here put it back in doc.user_data["pillar"]. WeightedCorpus gives
+every example a weight
+
+    pillar weight × max(label weight over the example's labels)
+
+(labels: entity labels, or positive intent labels; unlisted pillars and
+labels weigh 1.0) and yields it floor(weight) times, plus once more with
+probability equal to the fractional part. A weight of 2.0 is the old
+double_training_data.py without the duplicate lines; weights below 1.0
+undersample. `pillar_targets` sets a pillar's weight so that it contributes
+about that many examples. Repeats are the same Example object, so nothing
+is copied. With training.max_epochs = -1 spaCy reads the corpus again every
+epoch and the fractional draws change each epoch; otherwise they are made
+once.
+
+Streaming JSONL
+---------------
+JsonlCorpus reads the entities-intent tree one record at a time with the
+shared jsonl_reader and builds each reference doc with the same code as
+prepare_spacy_training.py (align_entity_spans overlap rules, 0.5 intent
+threshold, pillar in doc.user_data). The split is chosen per record with
+assign_split, i.e. prepare's --split-mode hash, so train and dev readers
+over the same tree never share a text. Shuffling uses a bounded buffer of
+`shuffle_buffer` docs, reseeded each epoch, so memory does not grow with the
+corpus. spaCy only re-reads the training corpus every epoch with
+training.max_epochs = -1; otherwise it keeps one epoch of examples in memory.
+Deduplication and the preparation report are not available in this mode.
+
+Stratified mini-dev
+-------------------
+StratifiedDevCorpus picks `size` dev docs once: labels are visited from
+rarest to most frequent and a random doc is taken for every label no chosen
+doc covers yet, then the rest is filled at random. With ~8 labels per
+intent doc a few hundred docs cover most of the label space. training_driver
+evaluates on it every eval_frequency steps when the config has a
+[corpora.dev_mini] section and keeps the full dev set for checkpoints.
+"""
+
+import json
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+import srsly
+from spacy import util
+from spacy.tokens import Doc, DocBin
+from spacy.training import Corpus, Example
+from spacy.training.corpus import walk_corpus
+from spacy.vocab import Vocab
+
+# spacy train --code imports this file by path; JsonlCorpus needs its siblings
+_MODULE_DIR = str(Path(__file__).resolve().parent)
+if _MODULE_DIR not in sys.path:
+    sys.path.insert(0, _MODULE_DIR)
+
+# Sidecars written next to intents_<split>.spacy / entities_<split>.spacy
+SPARSE_CATS_SUFFIX = ".cats.npz"
+PILLARS_SUFFIX = ".pillars.npz"
+
+# doc.user_data key holding the pillar a doc came from
+PILLAR_KEY = "pillar"
+
+
+def sparse_cats_path(spacy_path: Union[str, Path]) -> Path:
+    """Return the sparse cats sidecar path for a .spacy file."""
+    spacy_path = Path(spacy_path)
+    return spacy_path.with_name(spacy_path.stem + SPARSE_CATS_SUFFIX)
+
+
+def encode_sparse_cats(cats_list: List[Dict[str, float]],
+                       labels: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+    """
+    Encode a list of per-doc cats dicts as interned CSR arrays.
+
+    `labels` fixes the label table (e.g. the sorted intent_labels.txt);
+    labels not in it are appended. Values are thresholded at 0.5.
+    """
+    labels = list(labels) if labels is not None else []
+    label_ids = {label: i for i, label in enumerate(labels)}
+    offsets = [0]
+    ids = []
+    values = []
+    for cats in cats_list:
+        for label, value in cats.items():
+            if label not in label_ids:
+                label_ids[label] = len(labels)
+                labels.append(label)
+            ids.append(label_ids[label])
+            values.append(1 if value >= 0.5 else 0)
+        offsets.append(len(ids))
+
+    id_dtype = np.uint16 if len(labels) <= np.iinfo(np.uint16).max else np.uint32
+    return {
+        "labels": np.array(labels, dtype=str),
+        "offsets": np.array(offsets, dtype=np.int64),
+        "ids": np.array(ids, dtype=id_dtype),
+        "values": np.array(values, dtype=np.uint8),
+    }
+
+
+def save_sparse_cats(path: Union[str, Path], arrays: Dict[str, np.ndarray]):
+    """Write encoded sparse cats to an .npz file."""
+    # np.savez appends .npz to names that lack it, so write through a handle
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+
+def pillars_path(spacy_path: Union[str, Path]) -> Path:
+    """Return the pillar sidecar path for a .spacy file."""
+    spacy_path = Path(spacy_path)
+    return spacy_path.with_name(spacy_path.stem + PILLARS_SUFFIX)
+
+
+def save_pillars(path: Union[str, Path], pillars: List[Optional[str]]):
+    """Write one pillar (or None) per doc as interned name IDs."""
+    names = sorted({pillar for pillar in pillars if pillar is not None})
+    name_ids = {name: i for i, name in enumerate(names)}
+    id_dtype = np.uint16 if len(names) < np.iinfo(np.uint16).max else np.uint32
+    # The largest ID of the dtype stands for "no pillar"
+    missing = np.iinfo(id_dtype).max
+    ids = np.array([name_ids.get(pillar, missing) for pillar in pillars], dtype=id_dtype)
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, names=np.array(names, dtype=str), ids=ids)
+
+
+def load_pillars(path: Union[str, Path]) -> List[Optional[str]]:
+    """Per-doc pillars from a sidecar written by save_pillars."""
+    with np.load(path) as data:
+        names = data["names"].tolist()
+        ids = data["ids"].tolist()
+    return [names[i] if i < len(names) else None for i in ids]
+
+
+class SparseCats:
+    """Decoded sparse cats file; builds small per-doc cats dicts on demand."""
+
+    def __init__(self, path: Union[str, Path]):
+        with np.load(path) as data:
+            # Python str objects are created once per label and shared by
+            # every cats dict built from this table
+            self.labels = data["labels"].tolist()
+            # Plain lists: slicing them is much cheaper than slicing arrays
+            # once per doc
+            self.offsets = data["offsets"].tolist()
+            self.ids = data["ids"].tolist()
+            self.values = data["values"].astype(float).tolist()
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def cats(self, index: int) -> Dict[str, float]:
+        """Return the annotated labels of one doc."""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        labels = self.labels
+        return {labels[label_id]: value for label_id, value
+                in zip(self.ids[start:end], self.values[start:end])}
+
+
+def read_pillars(spacy_path: Union[str, Path], n_docs: int) -> Optional[List[Optional[str]]]:
+    """Pillars of a .spacy file's docs from its sidecar, or None without one."""
+    path = pillars_path(spacy_path)
+    if not path.exists():
+        return None
+    pillars = load_pillars(path)
+    if len(pillars) != n_docs:
+        raise ValueError(f"{path} has {len(pillars)} pillars but {spacy_path} has {n_docs} docs")
+    return pillars
+
+
+def reference_labels(doc: Doc) -> List[str]:
+    """Entity labels of a doc, or its positive intent labels."""
+    if doc.ents:
+        return [ent.label_ for ent in doc.ents]
+    return [label for label, value in doc.cats.items() if value >= 0.5]
+
+
+class SparseIntentCorpus(Corpus):
+    """
+    spacy.Corpus that fills doc.cats from a sparse cats sidecar.
+
+    Each .spacy file must have a matching <name>.cats.npz with one row per
+    doc in the file. Files without a sidecar are read as plain DocBins.
+    A <name>.pillars.npz sidecar, when present, sets doc.user_data["pillar"].
+    """
+
+    def read_docbin(self, vocab: Vocab, locs: Iterable[Union[str, Path]]) -> Iterator[Doc]:
+        i = 0
+        for loc in locs:
+            loc = util.ensure_path(loc)
+            if not loc.parts[-1].endswith(".spacy"):
+                continue
+            doc_bin = DocBin().from_disk(loc)
+            cats_path = sparse_cats_path(loc)
+            sparse = SparseCats(cats_path) if cats_path.exists() else None
+            if sparse is not None and len(sparse) != len(doc_bin):
+                raise ValueError(f"{cats_path} has {len(sparse)} rows but {loc} has {len(doc_bin)} docs")
+            pillars = read_pillars(loc, len(doc_bin))
+            for index, doc in enumerate(doc_bin.get_docs(vocab)):
+                if sparse is not None:
+                    doc.cats = sparse.cats(index)
+                if pillars is not None and pillars[index] is not None:
+                    doc.user_data[PILLAR_KEY] = pillars[index]
+                if len(doc):
+                    yield doc
+                    i += 1
+                    if self.limit >= 1 and i >= self.limit:
+                        return
+
+
+@util.registry.readers("cyber.SparseIntentCorpus.v1")
+def create_sparse_intent_reader(
+    path: Optional[Path],
+    gold_preproc: bool = False,
+    max_length: int = 0,
+    limit: int = 0,
+    augmenter: Optional[Callable] = None,
+) -> Callable:
+    """Same arguments as spacy.Corpus.v1, so it can replace it via a config override."""
+    if path is None:
+        raise ValueError("cyber.SparseIntentCorpus.v1 requires a path")
+    return SparseIntentCorpus(
+        path,
+        gold_preproc=gold_preproc,
+        max_length=max_length,
+        limit=limit,
+        augmenter=augmenter,
+    )
+
+
+class WeightedCorpus(SparseIntentCorpus):
+    """
+    Corpus that repeats or drops examples according to pillar/label weights.
+
+    Works for entity and intent DocBins, dense or sparse. See the module
+    docstring for how weights are applied.
+    """
+
+    def __init__(self, path, *, pillar_weights: Dict[str, float] = None,
+                 label_weights: Dict[str, float] = None,
+                 pillar_targets: Dict[str, int] = None, seed: int = 0, **kwargs):
+        super().__init__(path, **kwargs)
+        self.pillar_weights = dict(pillar_weights or {})
+        self.label_weights = dict(label_weights or {})
+        self.pillar_targets = dict(pillar_targets or {})
+        self.seed = seed
+        self._epoch = 0
+        self._pillar_sizes = None
+
+    def pillar_sizes(self) -> Counter:
+        """Docs per pillar, read from the pillar sidecars without building docs."""
+        if self._pillar_sizes is None:
+            self._pillar_sizes = Counter()
+            for loc in walk_corpus(self.path, ".spacy"):
+                path = pillars_path(loc)
+                if path.exists():
+                    self._pillar_sizes.update(load_pillars(path))
+                else:
+                    # Files prepared before the sidecar kept the pillar in user_data
+                    for user_data in DocBin().from_disk(loc).user_data:
+                        pillar = srsly.msgpack_loads(user_data).get(PILLAR_KEY) if user_data else None
+                        self._pillar_sizes[pillar] += 1
+        return self._pillar_sizes
+
+    def _resolve_pillar_weights(self) -> Dict[str, float]:
+        """Pillar weights with pillar_targets turned into weights."""
+        weights = dict(self.pillar_weights)
+        sizes = self.pillar_sizes() if self.pillar_targets else {}
+        for pillar, target in self.pillar_targets.items():
+            if sizes.get(pillar):
+                weights[pillar] = target / sizes[pillar]
+        return weights
+
+    def weight(self, example, pillar_weights: Dict[str, float]) -> float:
+        pillar = example.reference.user_data.get(PILLAR_KEY)
+        weight = pillar_weights.get(pillar, 1.0)
+        if self.label_weights:
+            label_weight = max((self.label_weights.get(label, 1.0)
+                                for label in reference_labels(example.reference)),
+                               default=1.0)
+            weight *= label_weight
+        return weight
+
+    def __call__(self, nlp) -> Iterator:
+        pillar_weights = self._resolve_pillar_weights()
+        rng = random.Random(self.seed + self._epoch)
+        self._epoch += 1
+        if not pillar_weights and not self.label_weights:
+            yield from super().__call__(nlp)
+            return
+        for example in super().__call__(nlp):
+            weight = self.weight(example, pillar_weights)
+            copies = int(weight)
+            if rng.random() < weight - copies:
+                copies += 1
+            for _ in range(copies):
+                yield example
+
+
+class JsonlCorpus(Corpus):
+    """
+    Corpus that builds reference docs straight from training JSONL files.
+
+    `path` is the entities-intent directory (pillars are the subdirectories
+    of the files) or a single JSONL file. `kind` picks "entities" or
+    "intents"; `split` is "train", "dev", "test" or "all".
+    """
+
+    def __init__(self, path, *, kind: str, split: str = "train", train_ratio: float = 0.7,
+                 dev_ratio: float = 0.15, shuffle_buffer: int = 0, seed: int = 0, **kwargs):
+        super().__init__(path, **kwargs)
+        from prepare_spacy_training import KIND_SETTINGS
+
+        if kind not in KIND_SETTINGS:
+            raise ValueError(f"kind must be one of {sorted(KIND_SETTINGS)}, got {kind!r}")
+        if split not in ("train", "dev", "test", "all"):
+            raise ValueError(f"split must be train, dev, test or all, got {split!r}")
+        self.kind = kind
+        self.pattern = KIND_SETTINGS[kind]["pattern"]
+        self.split = split
+        self.train_ratio = train_ratio
+        self.dev_ratio = dev_ratio
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self._epoch = 0
+        self._reported = set()
+
+    def files(self) -> List[Path]:
+        if self.path.is_file():
+            return [self.path]
+        return sorted(self.path.rglob(self.pattern))
+
+    def _pillar(self, file_path: Path) -> str:
+        if self.path.is_file():
+            return file_path.parent.name
+        return file_path.relative_to(self.path).parent.as_posix()
+
+    def read_jsonl(self, nlp) -> Iterator[Doc]:
+        """Yield reference docs of the selected split in file order."""
+        from jsonl_reader import iter_records
+        from prepare_spacy_training import assign_split, make_entity_doc, make_intent_doc
+
+        counts = Counter()
+        i = 0
+        for file_path in self.files():
+            pillar = self._pillar(file_path)
+            errors = []
+            for record in iter_records(file_path, self.kind, errors):
+                if self.split != "all" and \
+                        assign_split(record.text, self.train_ratio, self.dev_ratio) != self.split:
+                    continue
+                if self.kind == "entities":
+                    item = {"text": record.text, "entities": record.entities, PILLAR_KEY: pillar}
+                    doc = make_entity_doc(nlp, item, counts)
+                else:
+                    item = {"text": record.text, "cats": record.cats, PILLAR_KEY: pillar}
+                    doc = make_intent_doc(nlp, item, counts)
+                if len(doc):
+                    yield doc
+                    i += 1
+                    if self.limit >= 1 and i >= self.limit:
+                        return
+            if errors and file_path not in self._reported:
+                self._reported.add(file_path)
+                print(f"⚠️  Skipped {len(errors)} invalid lines in {file_path}")
+
+    def _shuffled(self, docs: Iterator[Doc]) -> Iterator[Doc]:
+        """Approximate shuffle: emit a random doc from a buffer of shuffle_buffer docs."""
+        rng = random.Random(self.seed + self._epoch)
+        buffer = []
+        for doc in docs:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(doc)
+                continue
+            index = rng.randrange(len(buffer))
+            yield buffer[index]
+            buffer[index] = doc
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def __call__(self, nlp) -> Iterator[Example]:
+        ref_docs = self.read_jsonl(nlp)
+        if self.shuffle_buffer > 1:
+            ref_docs = self._shuffled(ref_docs)
+        self._epoch += 1
+        if self.gold_preproc:
+            examples = self.make_examples_gold_preproc(nlp, ref_docs)
+        else:
+            examples = self.make_examples(nlp, ref_docs)
+        for real_eg in examples:
+            yield from self.augmenter(nlp, real_eg)
+
+
+@util.registry.readers("cyber.JsonlCorpus.v1")
+def create_jsonl_reader(
+    path: Optional[Path],
+    kind: str,
+    split: str = "train",
+    train_ratio: float = 0.7,
+    dev_ratio: float = 0.15,
+    shuffle_buffer: int = 0,
+    seed: int = 0,
+    gold_preproc: bool = False,
+    max_length: int = 0,
+    limit: int = 0,
+    augmenter: Optional[Callable] = None,
+) -> Callable:
+    """
+    spacy.Corpus.v1 arguments plus the JSONL source settings.
+
+    Example (train section; use split = "dev" and shuffle_buffer = 0 for dev):
+
+        [corpora.train]
+        @readers = "cyber.JsonlCorpus.v1"
+        path = "cyber-train/entities-intent"
+        kind = "intents"
+        split = "train"
+        shuffle_buffer = 10000
+    """
+    if path is None:
+        raise ValueError("cyber.JsonlCorpus.v1 requires a path")
+    return JsonlCorpus(
+        path,
+        kind=kind,
+        split=split,
+        train_ratio=train_ratio,
+        dev_ratio=dev_ratio,
+        shuffle_buffer=shuffle_buffer,
+        seed=seed,
+        gold_preproc=gold_preproc,
+        max_length=max_length,
+        limit=limit,
+        augmenter=augmenter,
+    )
+
+
+class StratifiedDevCorpus(SparseIntentCorpus):
+    """
+    Fixed label-covering subset of a dev corpus; see the module docstring.
+
+    The subset is chosen on the first call and its reference docs are kept,
+    so later evaluations skip reading the DocBin.
+    """
+
+    def __init__(self, path, *, size: int = 500, seed: int = 0, **kwargs):
+        super().__init__(path, **kwargs)
+        self.size = size
+        self.seed = seed
+        self._docs = None
+
+    def select(self, docs: List[Doc]) -> List[Doc]:
+        if not self.size or len(docs) <= self.size:
+            return docs
+        rng = random.Random(self.seed)
+        doc_labels = [set(reference_labels(doc)) for doc in docs]
+        by_label = {}
+        for i, labels in enumerate(doc_labels):
+            for label in labels:
+                by_label.setdefault(label, []).append(i)
+
+        chosen = set()
+        covered = set()
+        for label in sorted(by_label, key=lambda label: (len(by_label[label]), label)):
+            if len(chosen) >= self.size:
+                break
+            if label in covered:
+                continue
+            i = rng.choice(by_label[label])
+            chosen.add(i)
+            covered |= doc_labels[i]
+        rest = [i for i in range(len(docs)) if i not in chosen]
+        rng.shuffle(rest)
+        chosen.update(rest[:self.size - len(chosen)])
+        print(f"🧩 Mini-dev: {len(chosen)} of {len(docs)} docs, "
+              f"covering {len(covered)} of {len(by_label)} labels", flush=True)
+        return [docs[i] for i in sorted(chosen)]
+
+    def __call__(self, nlp) -> Iterator[Example]:
+        if self._docs is None:
+            self._docs = self.select(list(self.read_docbin(nlp.vocab, walk_corpus(self.path, ".spacy"))))
+        if self.gold_preproc:
+            examples = self.make_examples_gold_preproc(nlp, self._docs)
+        else:
+            examples = self.make_examples(nlp, self._docs)
+        for real_eg in examples:
+            yield from self.augmenter(nlp, real_eg)
+
+
+@util.registry.readers("cyber.StratifiedDevCorpus.v1")
+def create_stratified_dev_reader(
+    path: Optional[Path],
+    size: int = 500,
+    seed: int = 0,
+    gold_preproc: bool = False,
+    max_length: int = 0,
+    limit: int = 0,
+    augmenter: Optional[Callable] = None,
+) -> Callable:
+    """spacy.Corpus.v1 arguments plus the subset size (0 = whole corpus) and seed."""
+    if path is None:
+        raise ValueError("cyber.StratifiedDevCorpus.v1 requires a path")
+    return StratifiedDevCorpus(
+        path,
+        size=size,
+        seed=seed,
+        gold_preproc=gold_preproc,
+        max_length=max_length,
+        limit=limit,
+        augmenter=augmenter,
+    )
+
+
+def _load_weights_file(path: Optional[Path]) -> Dict[str, Dict]:
+    if path is None:
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+@util.registry.readers("cyber.WeightedCorpus.v1")
+def create_weighted_reader(
+    path: Optional[Path],
+    pillar_weights: Optional[Dict[str, float]] = None,
+    label_weights: Optional[Dict[str, float]] = None,
+    pillar_targets: Optional[Dict[str, int]] = None,
+    weights_file: Optional[Path] = None,
+    seed: int = 0,
+    gold_preproc: bool = False,
+    max_length: int = 0,
+    limit: int = 0,
+    augmenter: Optional[Callable] = None,
+) -> Callable:
+    """
+    spacy.Corpus.v1 arguments plus sampling weights.
+
+    weights_file is an optional JSON file with "pillar_weights",
+    "label_weights" and/or "pillar_targets" objects (handy for long label
+    lists); values given directly in the config take precedence.
+    """
+    if path is None:
+        raise ValueError("cyber.WeightedCorpus.v1 requires a path")
+    from_file = _load_weights_file(weights_file)
+    return WeightedCorpus(
+        path,
+        pillar_weights={**from_file.get("pillar_weights", {}), **(pillar_weights or {})},
+        label_weights={**from_file.get("label_weights", {}), **(label_weights or {})},
+        pillar_targets={**from_file.get("pillar_targets", {}), **(pillar_targets or {})},
+        seed=seed,
+        gold_preproc=gold_preproc,
+        max_length=max_length,
+        limit=limit,
+        augmenter=augmenter,
+    )
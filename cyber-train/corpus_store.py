@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Compact binary corpus store for the entities-intent JSONL tree.
+
+Every audit, fix and preparation script re-parses the same ~180 MB of JSONL
+text. This module packs the corpus into one binary file that can be memory
+mapped and read record by record without JSON parsing:
+
+    MAGIC
+    records   : <uint32 length><msgpack record> ...
+    file table: msgpack list of source files (path, kind, pillar, record range)
+    offsets   : uint64 array, byte offset of every record
+    footer    : <uint64 table offset><uint64 offsets offset><uint64 count> MAGIC
+
+Records are grouped by source file, so a file or pillar is a contiguous
+range of record indices. Export writes the original JSONL layout back.
+
+Usage:
+    python cyber-train/corpus_store.py build --base-dir cyber-train/entities-intent --output corpus.cybc
+    python cyber-train/corpus_store.py export --store corpus.cybc --output-dir entities-intent
+    python cyber-train/corpus_store.py info --store corpus.cybc
+"""
+
+import argparse
+import bisect
+import json
+import mmap
+import struct
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+# The msgpack package (>= 1.0, where str/bin handling is the default) is
+# called directly when installed; otherwise the msgpack bundled with srsly
+# (a spaCy dependency). srsly's msgpack_dumps/loads look up numpy hooks in a
+# registry on every call, which costs ~100x the actual decode for small
+# records, so its packer is built once and maps are decoded without hooks.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MAGIC = b"CYBCORP1"
+FORMAT_VERSION = 1
+
+_LENGTH = struct.Struct("<I")
+_FOOTER = struct.Struct("<QQQ")
+
+if msgpack is not None and msgpack.version >= (1, 0):
+    def _packb(obj) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def _unpackb(data) -> object:
+        return msgpack.unpackb(data, raw=False)
+else:
+    import srsly.msgpack
+
+    # Stores are written from one thread (build_store)
+    _PACKER = srsly.msgpack.Packer(use_bin_type=True)
+
+    def _packb(obj) -> bytes:
+        return _PACKER.pack(obj)
+
+    def _unpackb(data) -> object:
+        # An explicit object_pairs_hook skips the per-map numpy decoder chain
+        return srsly.msgpack.unpackb(data, raw=False, object_pairs_hook=None)
+
+
+# Source file patterns per record kind
+KIND_PATTERNS = {
+    "entities": "*_entities.jsonl",
+    "intents": "*_intent.jsonl",
+}
+
+
+class CorpusRecord(NamedTuple):
+    """One example from the corpus."""
+    text: str
+    spans: Optional[List[list]]
+    cats: Optional[Dict[str, float]]
+    kind: str
+    pillar: str
+    file: str
+    line: int
+
+
+def _cats_from_intents(intents) -> Optional[Dict[str, float]]:
+    """Normalize an "intents"/"cats" value (dict or list of labels) to a dict."""
+    if intents is None:
+        return None
+    if isinstance(intents, list):
+        return {label: 1.0 for label in intents}
+    return intents
+
+
+class CorpusStore:
+    """
+    Memory-mapped reader for a corpus store file.
+
+    Records are decoded lazily on access; the offset index is read straight
+    from the mapped file, so opening a store costs O(number of files).
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[:len(MAGIC)] != MAGIC or self._mm[-len(MAGIC):] != MAGIC:
+            raise ValueError(f"{self.path} is not a corpus store file")
+
+        footer_start = len(self._mm) - len(MAGIC) - _FOOTER.size
+        table_offset, offsets_offset, count = _FOOTER.unpack_from(self._mm, footer_start)
+
+        header = _unpackb(self._mm[table_offset:offsets_offset])
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported corpus store version {header['version']} in {self.path}")
+        self.files = header["files"]
+        self._count = count
+        self._offsets = memoryview(self._mm)[offsets_offset:offsets_offset + 8 * count].cast("Q")
+
+        # Files hold ascending, contiguous record ranges; a record's file is found by bisecting their starts
+        self._file_starts = [entry["start"] for entry in self.files]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _raw(self, index: int) -> list:
+        offset = self._offsets[index]
+        (length,) = _LENGTH.unpack_from(self._mm, offset)
+        start = offset + _LENGTH.size
+        return _unpackb(self._mm[start:start + length])
+
+    def __getitem__(self, index: int) -> CorpusRecord:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        line, text, spans, _, intents, _ = self._raw(index)
+        # bisect_right skips empty files that share the start of the next one
+        entry = self.files[bisect.bisect_right(self._file_starts, index) - 1]
+        return CorpusRecord(text, spans, _cats_from_intents(intents),
+                            entry["kind"], entry["pillar"], entry["path"], line)
+
+    def __iter__(self) -> Iterator[CorpusRecord]:
+        for index in range(self._count):
+            yield self[index]
+
+    def iter_records(self, kind: str = None, pillar: str = None) -> Iterator[CorpusRecord]:
+        """Iterate records, optionally restricted to one kind and/or pillar."""
+        for entry in self.files:
+            if kind is not None and entry["kind"] != kind:
+                continue
+            if pillar is not None and entry["pillar"] != pillar:
+                continue
+            for index in range(entry["start"], entry["end"]):
+                yield self[index]
+
+    def to_jsonl_dict(self, index: int) -> dict:
+        """Rebuild the original JSONL object for a record (key order preserved)."""
+        _, text, spans, intents_key, intents, extra = self._raw(index)
+        item = {"text": text}
+        if spans is not None:
+            item["entities"] = spans
+        if intents_key is not None:
+            item[intents_key] = intents
+        item.update(extra)
+        return item
+
+    def close(self):
+        self._offsets.release()
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def build_store(base_dir: Path, output_path: Path) -> Dict[str, int]:
+    """
+    Pack all entity and intent JSONL files under base_dir into a store.
+
+    Blank lines are skipped; lines that are not valid JSON are counted and
+    left out. Returns record/error counts.
+    """
+    base_dir = Path(base_dir)
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    counts = Counter()
+    files = []
+    offsets = []
+
+    with open(output_path, 'wb') as out:
+        out.write(MAGIC)
+        for kind, pattern in KIND_PATTERNS.items():
+            for file_path in sorted(base_dir.rglob(pattern)):
+                relative = file_path.relative_to(base_dir)
+                entry = {
+                    "path": relative.as_posix(),
+                    "kind": kind,
+                    "pillar": relative.parent.as_posix(),
+                    "start": len(offsets),
+                }
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    for line_num, line in enumerate(f, 1):
+                        if not line.strip():
+                            continue
+                        try:
+                            item = json.loads(line)
+                        except json.JSONDecodeError:
+                            counts["errors"] += 1
+                            continue
+                        if not isinstance(item, dict) or not isinstance(item.get("text"), str):
+                            counts["errors"] += 1
+                            continue
+
+                        extra = dict(item)
+                        text = extra.pop("text")
+                        spans = extra.pop("entities", None)
+                        intents_key = None
+                        intents = None
+                        for key in ("intents", "cats"):
+                            if key in extra:
+                                intents_key = key
+                                intents = extra.pop(key)
+                                break
+
+                        payload = _packb([line_num, text, spans, intents_key, intents, extra])
+                        offsets.append(out.tell())
+                        out.write(_LENGTH.pack(len(payload)))
+                        out.write(payload)
+                        counts[kind] += 1
+                entry["end"] = len(offsets)
+                files.append(entry)
+
+        table_offset = out.tell()
+        out.write(_packb({"version": FORMAT_VERSION, "files": files}))
+        offsets_offset = out.tell()
+        out.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        out.write(_FOOTER.pack(table_offset, offsets_offset, len(offsets)))
+        out.write(MAGIC)
+
+    counts["files"] = len(files)
+    return counts
+
+
+def export_store(store_path: Path, output_dir: Path) -> int:
+    """Write the store back out as the entities-intent JSONL layout."""
+    output_dir = Path(output_dir)
+    written = 0
+    with CorpusStore(store_path) as store:
+        for entry in store.files:
+            target = output_dir / entry["path"]
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with open(target, 'w', encoding='utf-8') as f:
+                for index in range(entry["start"], entry["end"]):
+                    f.write(json.dumps(store.to_jsonl_dict(index), ensure_ascii=False) + '\n')
+                    written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build, export or inspect the binary corpus store"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Pack JSONL files into a store")
+    build_parser.add_argument(
+        "--base-dir",
+        default="cyber-train/entities-intent",
+        help="Base directory containing JSONL files"
+    )
+    build_parser.add_argument(
+        "--output",
+        default="cyber-train/spacy-training/entities-intent.cybc",
+        help="Output store file"
+    )
+
+    export_parser = subparsers.add_parser("export", help="Write a store back to JSONL files")
+    export_parser.add_argument("--store", required=True, help="Store file to export")
+    export_parser.add_argument("--output-dir", required=True, help="Directory for the JSONL layout")
+
+    info_parser = subparsers.add_parser("info", help="Show record counts per kind and pillar")
+    info_parser.add_argument("--store", required=True, help="Store file to inspect")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        counts = build_store(Path(args.base_dir), Path(args.output))
+        print(f"✅ Packed {counts['entities']} entity and {counts['intents']} intent records "
+              f"from {counts['files']} files into {args.output}")
+        if counts["errors"]:
+            print(f"⚠️  Skipped {counts['errors']} invalid lines")
+
+    elif args.command == "export":
+        written = export_store(Path(args.store), Path(args.output_dir))
+        print(f"✅ Exported {written} records to {args.output_dir}")
+
+    elif args.command == "info":
+        with CorpusStore(args.store) as store:
+            per_pillar = Counter()
+            for entry in store.files:
+                per_pillar[(entry["pillar"], entry["kind"])] += entry["end"] - entry["start"]
+            print(f"📦 {args.store}: {len(store)} records in {len(store.files)} files")
+            for (pillar, kind), count in sorted(per_pillar.items()):
+                print(f"   {pillar:40s} {kind:9s} {count:7d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,19 @@
 """
 Double the training data for each pillar by duplicating existing entries.
 This will help improve model training with more examples.
+
+Prefer oversampling at training time instead: corpus_readers.py registers
+cyber.WeightedCorpus.v1, which repeats examples by pillar/label weight
+without touching the JSONL files (a pillar weight of 2.0 matches doubling).
+--undo reverses the doubling of files doubled by this script; files that
+are not exactly doubled are left alone.
 """
 
 import json
 from pathlib import Path
 import argparse
 import random
+from collections import Counter
 from typing import List, Dict
 
 
@@ -57,11 +64,68 @@ def double_jsonl_file(file_path: Path, shuffle: bool = True, backup: bool = True
     return True
 
 
+def undouble_jsonl_file(file_path: Path, backup: bool = True):
+    """
+    Reverse double_jsonl_file, keeping any fixes applied to the file since
+    (the .jsonl.backup from doubling predates them).
+    
+    An unshuffled doubling (second half equal to the first) keeps the first
+    half. A shuffled one has every line an even number of times; the first
+    half of each line's occurrences is kept, so duplicates that were in the
+    file before doubling survive. Any other file is not a doubled file and is
+    left unchanged.
+    
+    Args:
+        file_path: Path to the JSONL file
+        backup: Whether to save the current content before rewriting
+    """
+    if not file_path.exists():
+        print(f"⚠️  File not found: {file_path}")
+        return False
+    
+    with open(file_path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    
+    keys = [line.rstrip('\n') for line in lines]
+    if not keys or len(keys) % 2:
+        print(f"   ⚠️  Empty or odd number of lines, not a doubled file; left unchanged")
+        return False
+    half = len(keys) // 2
+    counts = Counter(keys)
+    if keys[:half] == keys[half:]:
+        kept_keys = keys[:half]
+    elif all(count % 2 == 0 for count in counts.values()):
+        remaining = {key: count // 2 for key, count in counts.items()}
+        kept_keys = []
+        for key in keys:
+            if remaining[key]:
+                remaining[key] -= 1
+                kept_keys.append(key)
+    else:
+        odd = sum(1 for count in counts.values() if count % 2)
+        print(f"   ⚠️  {odd} lines occur an odd number of times, not a doubled file; left unchanged")
+        return False
+    kept_lines = [key + '\n' for key in kept_keys]
+    
+    if backup:
+        backup_path = file_path.with_suffix('.jsonl.undo-backup')
+        with open(backup_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        print(f"   📦 Backup created: {backup_path.name}")
+    
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.writelines(kept_lines)
+    
+    print(f"   ✅ Undoubled: {len(lines)} → {len(kept_lines)} entries")
+    return True
+
+
 def double_all_training_data(base_dir: Path, 
                             entities_only: bool = False,
                             intents_only: bool = False,
                             shuffle: bool = True,
-                            backup: bool = True):
+                            backup: bool = True,
+                            undo: bool = False):
     """
     Double all training data files in the base directory.
     
@@ -71,9 +135,10 @@ def double_all_training_data(base_dir: Path,
         intents_only: Only process intent files
         shuffle: Whether to shuffle data after doubling
         backup: Whether to create backups
+        undo: Reverse a previous doubling instead of doubling
     """
     print("="*70)
-    print("DOUBLING TRAINING DATA")
+    print("UNDOING DOUBLED TRAINING DATA" if undo else "DOUBLING TRAINING DATA")
     print("="*70)
     
     # Find all JSONL files
@@ -98,7 +163,8 @@ def double_all_training_data(base_dir: Path,
         
         for file_path in sorted(entity_files):
             print(f"\n   Processing: {file_path.relative_to(base_dir)}")
-            if double_jsonl_file(file_path, shuffle=shuffle, backup=backup):
+            if (undouble_jsonl_file(file_path, backup=backup) if undo
+                    else double_jsonl_file(file_path, shuffle=shuffle, backup=backup)):
                 entity_success += 1
                 entity_total += 1
             else:
@@ -114,7 +180,8 @@ def double_all_training_data(base_dir: Path,
         
         for file_path in sorted(intent_files):
             print(f"\n   Processing: {file_path.relative_to(base_dir)}")
-            if double_jsonl_file(file_path, shuffle=shuffle, backup=backup):
+            if (undouble_jsonl_file(file_path, backup=backup) if undo
+                    else double_jsonl_file(file_path, shuffle=shuffle, backup=backup)):
                 intent_success += 1
                 intent_total += 1
             else:
@@ -123,8 +190,16 @@ def double_all_training_data(base_dir: Path,
         print(f"\n   ✅ Processed {intent_success}/{intent_total} intent files")
     
     print("\n" + "="*70)
-    print("✅ DOUBLING COMPLETE!")
+    print("✅ UNDO COMPLETE!" if undo else "✅ DOUBLING COMPLETE!")
     print("="*70)
+    if undo:
+        print("\n📋 Next steps:")
+        print("   1. Re-run data preparation:")
+        print("      python3 cyber-train/prepare_spacy_training.py")
+        print("   2. Oversample while training instead, e.g.:")
+        print("      --corpora.train.@readers cyber.WeightedCorpus.v1 "
+              "--corpora.train.pillar_weights '{\"<pillar>\": 2.0}'")
+        return
     print("\n📋 Next steps:")
     print("   1. Re-run data preparation:")
     print("      python3 cyber-train/prepare_spacy_training.py")
@@ -161,6 +236,11 @@ def main():
         action="store_true",
         help="Don't create backup files"
     )
+    parser.add_argument(
+        "--undo",
+        action="store_true",
+        help="Reverse a previous doubling instead of doubling (files that are not exactly doubled are left unchanged)"
+    )
     
     args = parser.parse_args()
     
@@ -174,7 +254,8 @@ def main():
         entities_only=args.entities_only,
         intents_only=args.intents_only,
         shuffle=not args.no_shuffle,
-        backup=not args.no_backup
+        backup=not args.no_backup,
+        undo=args.undo
     )
 
 
@@ -1,9 +1,30 @@
 """
 Post-processing filter for NER model to remove false positives.
 This should be applied after entity extraction to improve precision.
+
+Two ways to apply it:
+1. post_process_entities() on (text, label) tuples after inference
+2. The "cyber_entity_filter" spaCy component, which filters doc.ents in
+   place inside the pipeline (so also inside nlp.pipe worker processes):
+
+       import fix_entity_extraction  # registers the factory
+       add_entity_filter(nlp)        # after "ner"
+
+Both use EntityFilter, which folds every rule below into one decision per
+(text, label): the text is stripped and lowercased once, the word and phrase
+sets are frozensets, and each label's checks and validator are looked up
+once and cached.
 """
 import re
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    from spacy.language import Language
+except ImportError:
+    Language = None
+
+# Bump when the filtering rules change (results cached by text are stale then)
+FILTER_VERSION = 1
 
 # Common words that should NOT be entities
 COMMON_WORDS = {
@@ -333,6 +354,26 @@ ENTITY_PATTERNS = {
 # Entity types that should be validated against patterns
 VALIDATED_TYPES = set(ENTITY_PATTERNS.keys())
 
+# Labels that may legitimately be a common word
+COMMON_WORD_LABELS = {'PERSON', 'ORGANIZATION', 'LOCATION', 'THREAT_ACTOR', 'MALWARE_TYPE'}
+
+# Labels that may legitimately be a phrase made of common words only
+COMMON_PHRASE_LABELS = {'PERSON', 'ORGANIZATION', 'THREAT_ACTOR'}
+
+# Words that are never TOOL entities
+TOOL_FALSE_POSITIVES = {'csrf', 'javascript', 'json', 'xml', 'html', 'base64', 'debunk', 'relative'}
+
+# Verbs rejected for the labels that keep picking them up
+COMMON_VERBS = {'investigate', 'check', 'verify', 'analyze', 'detect', 'monitor', 'track'}
+COMMON_VERB_LABELS = {'COMMIT', 'BRANCH', 'TRAINING_TYPE', 'INTEGRATION_TYPE'}
+
+# Labels held to stricter rules for common words and very short texts
+PROBLEMATIC_LABELS = {'BRANCH', 'COMMIT', 'TRAINING_TYPE', 'INTEGRATION_TYPE',
+                      'ENCRYPTION_TYPE', 'VULNERABILITY_ID'}
+
+# owner/repo or a GitHub/GitLab path
+REPOSITORY_PATTERN = re.compile(r'^[a-zA-Z0-9_-]+/[a-zA-Z0-9_.-]+$|github\.com/[^\s]+|gitlab\.com/[^\s]+')
+
 
 
 def is_false_positive_enhanced(text: str, label: str) -> bool:
@@ -341,7 +382,7 @@ def is_false_positive_enhanced(text: str, label: str) -> bool:
     
     # Check common words
     if text_lower in COMMON_WORDS:
-        if label not in ['PERSON', 'ORGANIZATION', 'LOCATION', 'THREAT_ACTOR', 'MALWARE_TYPE']:
+        if label not in COMMON_WORD_LABELS:
             return True
     
     # Check common phrases
@@ -350,23 +391,17 @@ def is_false_positive_enhanced(text: str, label: str) -> bool:
     
     # TOOL validation
     if label == "TOOL":
-        if text_lower in ['csrf', 'javascript', 'json', 'xml', 'html', 'base64', 'debunk', 'relative']:
+        if text_lower in TOOL_FALSE_POSITIVES:
             return True
     
-    # REPOSITORY validation
+    # REPOSITORY validation (URLs and file paths are rejected too)
     if label == "REPOSITORY":
-        if not re.match(r'^[a-zA-Z0-9_-]+/[a-zA-Z0-9_.-]+$|github\.com/[^\s]+|gitlab\.com/[^\s]+', text):
-            if ENTITY_PATTERNS.get('URL', re.compile('')).match(text):
-                return True
-            if ENTITY_PATTERNS.get('FILE_PATH', re.compile('')).match(text):
-                return True
+        if not REPOSITORY_PATTERN.match(text):
             return True
     
-    # DATE validation
+    # DATE validation (only once a DATE pattern is defined)
     if label == "DATE":
-        if not ENTITY_PATTERNS.get('DATE', re.compile('')).search(text):
-            if ENTITY_PATTERNS.get('FILE_PATH', re.compile('')).match(text):
-                return True
+        if 'DATE' in ENTITY_PATTERNS and not ENTITY_PATTERNS['DATE'].search(text):
             return True
     
     return False
@@ -405,9 +440,9 @@ def filter_entities(entities: List[Tuple[str, str]], min_length: int = 2) -> Lis
             continue
         
         # Skip if it's a common word pattern (e.g., "investigate", "check", "verify" as verbs)
-        if text_lower in ['investigate', 'check', 'verify', 'analyze', 'detect', 'monitor', 'track']:
+        if text_lower in COMMON_VERBS:
             # Only allow if it's a legitimate entity type (not COMMIT, BRANCH, etc.)
-            if label in ['COMMIT', 'BRANCH', 'TRAINING_TYPE', 'INTEGRATION_TYPE']:
+            if label in COMMON_VERB_LABELS:
                 continue
         
         # Skip single characters
@@ -430,16 +465,14 @@ def filter_entities(entities: List[Tuple[str, str]], min_length: int = 2) -> Lis
         if ' ' in text_clean:
             words = text_clean.lower().split()
             # Skip if all words are common words
-            if all(word in COMMON_WORDS for word in words) and label not in ['PERSON', 'ORGANIZATION', 'THREAT_ACTOR']:
+            if all(word in COMMON_WORDS for word in words) and label not in COMMON_PHRASE_LABELS:
                 continue
             # Skip if it matches a common phrase
             if text_lower in COMMON_PHRASES:
                 continue
         
         # Skip problematic entity types for common words
-        problematic_labels_for_common = ['BRANCH', 'COMMIT', 'TRAINING_TYPE', 'INTEGRATION_TYPE', 
-                                        'ENCRYPTION_TYPE', 'VULNERABILITY_ID']
-        if label in problematic_labels_for_common:
+        if label in PROBLEMATIC_LABELS:
             # Be extra strict - only allow if it's clearly not a common word
             if text_lower in COMMON_WORDS or text_lower in COMMON_PHRASES:
                 continue
@@ -484,20 +517,154 @@ def post_process_entities(entities: List[Tuple[str, str]],
     Returns:
         Post-processed list of entities
     """
-    if apply_filter:
-        entities = filter_entities(entities)
-    
-    if apply_validation:
-        validated = []
-        for text, label in entities:
-            if validate_entity_type(text, label):
-                validated.append((text, label))
-            # For non-validated types, keep them
-            elif label not in VALIDATED_TYPES:
-                validated.append((text, label))
-        entities = validated
-    
-    return entities
+    return get_entity_filter(apply_filter=apply_filter, apply_validation=apply_validation).filter_pairs(entities)
+
+
+class _LabelRules(NamedTuple):
+    """The per-label parts of the rules, resolved once per label."""
+    common_word_ok: bool
+    common_phrase_ok: bool
+    tool: bool
+    repository: bool
+    date_pattern: Optional[re.Pattern]
+    verb_blocked: bool
+    problematic: bool
+    pattern: Optional[re.Pattern]
+
+
+class EntityFilter:
+    """
+    filter_entities + validate_entity_type as one precompiled decision.
+
+    keep() gives the same answer as post_process_entities for a single
+    (text, label); filter_doc() applies it to doc.ents in place. Instances
+    are also the "cyber_entity_filter" pipeline component.
+    """
+
+    def __init__(self, apply_filter: bool = True, apply_validation: bool = True, min_length: int = 2):
+        self.apply_filter = apply_filter
+        self.apply_validation = apply_validation
+        self.min_length = min_length
+        self.common_words = frozenset(COMMON_WORDS)
+        self.common_phrases = frozenset(COMMON_PHRASES)
+        self.punctuation = frozenset(PUNCTUATION)
+        self._rules: Dict[str, _LabelRules] = {}
+
+    def _label_rules(self, label: str) -> _LabelRules:
+        rules = self._rules.get(label)
+        if rules is None:
+            rules = self._rules[label] = _LabelRules(
+                common_word_ok=label in COMMON_WORD_LABELS,
+                common_phrase_ok=label in COMMON_PHRASE_LABELS,
+                tool=label == "TOOL",
+                repository=label == "REPOSITORY",
+                date_pattern=ENTITY_PATTERNS.get('DATE') if label == "DATE" else None,
+                verb_blocked=label in COMMON_VERB_LABELS,
+                problematic=label in PROBLEMATIC_LABELS,
+                pattern=ENTITY_PATTERNS.get(label),
+            )
+        return rules
+
+    def keep(self, text: str, label: str) -> bool:
+        """Whether post_process_entities would keep this entity."""
+        text_clean = text.strip()
+        rules = self._label_rules(label)
+        if self.apply_filter and not self._passes_filter(text_clean, rules):
+            return False
+        if self.apply_validation and rules.pattern is not None:
+            return rules.pattern.match(text_clean) is not None
+        return True
+
+    def _passes_filter(self, text_clean: str, rules: _LabelRules) -> bool:
+        if len(text_clean) < self.min_length:
+            return False
+        punctuation = self.punctuation
+        if text_clean in punctuation or all(c in punctuation for c in text_clean):
+            return False
+
+        text_lower = text_clean.lower()
+        is_common_word = text_lower in self.common_words
+        if text_lower in self.common_phrases:
+            return False
+        if is_common_word and not rules.common_word_ok:
+            return False
+        if rules.tool and text_lower in TOOL_FALSE_POSITIVES:
+            return False
+        if rules.repository and not REPOSITORY_PATTERN.match(text_clean):
+            return False
+        if rules.date_pattern is not None and not rules.date_pattern.search(text_clean):
+            return False
+        if rules.verb_blocked and text_lower in COMMON_VERBS:
+            return False
+        if len(text_clean) == 1 and text_clean not in ['I']:
+            return False
+        if rules.pattern is not None and not rules.pattern.match(text_clean):
+            if rules.pattern is ENTITY_PATTERNS.get('IP_ADDRESS') and not any(c.isdigit() for c in text_clean):
+                return False
+            if rules.pattern is ENTITY_PATTERNS.get('CVE_ID') and not text_clean.upper().startswith('CVE-'):
+                return False
+        if ' ' in text_clean and not rules.common_phrase_ok:
+            if all(word in self.common_words for word in text_lower.split()):
+                return False
+        if rules.problematic and (is_common_word or len(text_clean) <= 2):
+            return False
+        return True
+
+    def filter_pairs(self, entities: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Filter (text, label) tuples."""
+        return [(text, label) for text, label in entities if self.keep(text, label)]
+
+    def filter_doc(self, doc):
+        """Drop filtered entities from doc.ents in place; returns the doc."""
+        ents = doc.ents
+        kept = [ent for ent in ents if self.keep(ent.text, ent.label_)]
+        if len(kept) != len(ents):
+            doc.ents = kept
+        return doc
+
+    def filter_docs(self, docs: Iterable) -> List:
+        """filter_doc for a list of docs."""
+        return [self.filter_doc(doc) for doc in docs]
+
+    # spaCy component protocol
+    def __call__(self, doc):
+        return self.filter_doc(doc)
+
+    def pipe(self, stream: Iterable, batch_size: int = 128) -> Iterator:
+        for doc in stream:
+            yield self.filter_doc(doc)
+
+
+_FILTERS: Dict[Tuple[bool, bool], EntityFilter] = {}
+
+
+def get_entity_filter(apply_filter: bool = True, apply_validation: bool = True) -> EntityFilter:
+    """Shared EntityFilter for the given settings."""
+    key = (apply_filter, apply_validation)
+    if key not in _FILTERS:
+        _FILTERS[key] = EntityFilter(apply_filter=apply_filter, apply_validation=apply_validation)
+    return _FILTERS[key]
+
+
+ENTITY_FILTER_COMPONENT = "cyber_entity_filter"
+
+if Language is not None:
+    @Language.factory(
+        ENTITY_FILTER_COMPONENT,
+        default_config={"apply_filter": True, "apply_validation": True, "min_length": 2},
+    )
+    def create_entity_filter(nlp, name: str, apply_filter: bool, apply_validation: bool,
+                             min_length: int) -> EntityFilter:
+        return EntityFilter(apply_filter=apply_filter, apply_validation=apply_validation,
+                            min_length=min_length)
+
+
+def add_entity_filter(nlp, **config) -> bool:
+    """Add the filter component after "ner"; returns False if there is no ner or it's already there."""
+    if ENTITY_FILTER_COMPONENT in nlp.pipe_names or "ner" not in nlp.pipe_names:
+        return False
+    nlp.add_pipe(ENTITY_FILTER_COMPONENT, after="ner", config=config)
+    return True
 
 
 # Example usage
@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+"""
+Two-stage hierarchical intent classifier.
+
+The flat intent model scores all ~3,000 labels for every query. Here:
+1. A router (exclusive `textcat`) predicts the pillar - the
+   entities-intent/<pillar> directory the query's intents come from
+2. One `textcat_multilabel` head per pillar scores only that pillar's labels
+3. A label's final score is max over the routed pillars of
+   P(pillar) × P(label | pillar); the top `top_pillars` pillars are routed
+
+Pillars with a single label get no head (the label scores P(pillar)).
+Texts are tokenized once by the router; heads run their textcat model on the
+same Doc, so a query costs one tokenization plus a few small models.
+
+Needs intent .spacy files from prepare_spacy_training.py with their
+<name>.pillars.npz sidecars; sparse intent sidecars are read transparently.
+
+Layout of a model directory:
+    meta.json                 pillars, their labels and head directories
+    router/model-best
+    heads/<pillar>/model-best
+    data/                     per-stage training files
+
+Usage:
+    python cyber-train/hierarchical_intent.py train \\
+        --data-dir cyber-train/spacy-training --output cyber-train/models/hierarchical_intent
+    python cyber-train/hierarchical_intent.py predict \\
+        --model cyber-train/models/hierarchical_intent "show me failed MFA logins"
+    python cyber-train/hierarchical_intent.py benchmark \\
+        --model cyber-train/models/hierarchical_intent \\
+        --flat-model cyber-train/models/intent_model/model-best \\
+        --test cyber-train/spacy-training/intents_test.spacy
+"""
+
+import argparse
+import contextlib
+import json
+import statistics
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from intent_scoring import IntentScorer
+from parallel_training import limit_blas_threads
+from stage_profiler import peak_rss_mb
+
+ROUTER_DIR = "router"
+HEADS_DIR = "heads"
+DATA_DIR = "data"
+META_FILE = "meta.json"
+
+
+def pillar_dirname(pillar: str) -> str:
+    """Directory name for a pillar (nested pillars like osint/imint are flattened)."""
+    return pillar.replace("/", "__")
+
+
+def read_intent_docs(path: Path, vocab) -> list:
+    """Read intent docs, filling cats and pillars from their sidecars when there are any."""
+    from corpus_readers import SparseIntentCorpus
+
+    return list(SparseIntentCorpus(path).read_docbin(vocab, [Path(path)]))
+
+
+def positive_labels(cats: Dict[str, float]) -> List[str]:
+    return [label for label, value in cats.items() if value >= 0.5]
+
+
+# ---------------------------------------------------------------------------
+# Training
+# ---------------------------------------------------------------------------
+
+def build_stage_data(train_path: Path, dev_path: Path, output_dir: Path,
+                     min_dev_docs: int = 20) -> Dict:
+    """
+    Write router and per-pillar training files; return the pillar table.
+
+    Head docs keep only the cats of their pillar's labels. Pillars without
+    enough dev docs borrow every tenth training doc as dev data.
+    """
+    import spacy
+    from corpus_readers import PILLAR_KEY
+    from spacy.tokens import DocBin
+
+    vocab = spacy.blank("en").vocab
+    splits = {"train": read_intent_docs(train_path, vocab), "dev": read_intent_docs(dev_path, vocab)}
+    missing = sum(1 for docs in splits.values() for doc in docs if PILLAR_KEY not in doc.user_data)
+    if missing:
+        raise ValueError(f"{missing} docs have no pillar (no {train_path.stem}.pillars.npz sidecar?); "
+                         f"re-run prepare_spacy_training.py to write it")
+
+    labels = defaultdict(set)
+    by_pillar = {name: defaultdict(list) for name in splits}
+    for name, docs in splits.items():
+        for doc in docs:
+            pillar = doc.user_data[PILLAR_KEY]
+            by_pillar[name][pillar].append(doc)
+            if name == "train":
+                labels[pillar].update(positive_labels(doc.cats))
+    pillars = sorted(labels)
+
+    data_dir = output_dir / DATA_DIR
+    data_dir.mkdir(parents=True, exist_ok=True)
+    for name, docs in splits.items():
+        router_docs = []
+        for doc in docs:
+            pillar = doc.user_data[PILLAR_KEY]
+            routed = doc.copy()
+            routed.cats = {p: 1.0 if p == pillar else 0.0 for p in pillars}
+            router_docs.append(routed)
+        DocBin(docs=router_docs).to_disk(data_dir / f"router_{name}.spacy")
+
+    table = {}
+    for pillar in pillars:
+        pillar_labels = labels[pillar]
+        entry = {"labels": sorted(pillar_labels), "train_docs": len(by_pillar["train"][pillar])}
+        if len(pillar_labels) > 1:
+            train_docs = by_pillar["train"][pillar]
+            dev_docs = by_pillar["dev"][pillar]
+            if len(dev_docs) < min_dev_docs:
+                dev_docs = dev_docs + train_docs[::10]
+            head_dir = data_dir / pillar_dirname(pillar)
+            head_dir.mkdir(exist_ok=True)
+            for name, docs in (("train", train_docs), ("dev", dev_docs)):
+                head_docs = []
+                for doc in docs:
+                    head_doc = doc.copy()
+                    head_doc.cats = {label: value for label, value in doc.cats.items()
+                                     if label in pillar_labels}
+                    head_docs.append(head_doc)
+                DocBin(docs=head_docs).to_disk(head_dir / f"{name}.spacy")
+            entry["head"] = f"{HEADS_DIR}/{pillar_dirname(pillar)}"
+        table[pillar] = entry
+    return table
+
+
+def stage_config(pipeline: str, base_config: Optional[Path]):
+    """Training config for the router (`textcat`) or a head (`textcat_multilabel`)."""
+    from spacy import util
+    from spacy.cli.init_config import init_config
+
+    if pipeline == "textcat_multilabel" and base_config is not None:
+        return util.load_config(base_config, interpolate=False)
+    return init_config(lang="en", pipeline=[pipeline], optimize="efficiency")
+
+
+def train_stage(name: str, config_text: str, output_dir: str, train_path: str, dev_path: str,
+                overrides: Dict) -> Tuple[str, Optional[float], Optional[str]]:
+    """Pool worker: train one stage with TrainingDriver; returns (name, best score, error)."""
+    from training_driver import TrainingDriver
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    config_path = output_dir / "config.cfg"
+    config_path.write_text(config_text)
+    stage_overrides = {"paths.train": train_path, "paths.dev": dev_path, **overrides}
+    try:
+        with open(output_dir / "train.log", 'w') as log, contextlib.redirect_stdout(log):
+            driver = TrainingDriver(config_path, output_dir, stage_overrides)
+            driver.run()
+        state = driver.load_state()
+        return name, state["best_score"], None
+    except Exception as e:
+        return name, None, f"{type(e).__name__}: {e}"
+
+
+def train_hierarchical(data_dir: Path, output_dir: Path, base_config: Optional[Path],
+                       router_steps: int, head_steps: int, head_length: int,
+                       workers: int = 1, threads: int = 1):
+    """Build the stage data, then train the router and all heads in a process pool."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    print("\n🔄 Building router and per-pillar data...")
+    table = build_stage_data(data_dir / "intents_train.spacy", data_dir / "intents_dev.spacy", output_dir)
+    heads = {pillar: entry for pillar, entry in table.items() if "head" in entry}
+    print(f"✅ {len(table)} pillars, {len(heads)} heads, "
+          f"{sum(len(entry['labels']) for entry in table.values())} pillar labels")
+
+    data = output_dir / DATA_DIR
+    router_config = stage_config("textcat", None).to_str()
+    head_config = stage_config("textcat_multilabel", base_config).to_str()
+    jobs = [("router", router_config, str(output_dir / ROUTER_DIR),
+             str(data / "router_train.spacy"), str(data / "router_dev.spacy"),
+             {"training.max_steps": router_steps})]
+    for pillar in sorted(heads, key=lambda p: -table[p]["train_docs"]):
+        head_data = data / pillar_dirname(pillar)
+        jobs.append((pillar, head_config, str(output_dir / table[pillar]["head"]),
+                     str(head_data / "train.spacy"), str(head_data / "dev.spacy"),
+                     {"training.max_steps": head_steps,
+                      "components.textcat_multilabel.model.length": head_length}))
+
+    print(f"\n🔄 Training {len(jobs)} stages with {workers} workers...")
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                             initializer=limit_blas_threads, initargs=(threads,)) as pool:
+        futures = [pool.submit(train_stage, *job) for job in jobs]
+        for future in futures:
+            name, score, error = future.result()
+            if error:
+                failed.append(name)
+                print(f"   ❌ {name}: {error}")
+            else:
+                print(f"   ✅ {name}: dev score {score:.4f}")
+
+    meta = {
+        "pillars": table,
+        "router": f"{ROUTER_DIR}/model-best",
+        "head_model": "model-best",
+        "failed": failed,
+    }
+    with open(output_dir / META_FILE, 'w') as f:
+        json.dump(meta, f, indent=2)
+    print(f"\n✅ Hierarchical intent model saved to {output_dir}")
+    return meta
+
+
+# ---------------------------------------------------------------------------
+# Inference
+# ---------------------------------------------------------------------------
+
+class HierarchicalIntentClassifier:
+    """
+    Router + per-pillar heads behind one predict API.
+
+    Heads are loaded on first use; with max_loaded_heads > 0 the least
+    recently used heads are dropped to bound memory.
+    """
+
+    def __init__(self, model_dir: Path, top_pillars: int = 2, max_loaded_heads: int = 0):
+        import spacy
+
+        self.model_dir = Path(model_dir)
+        with open(self.model_dir / META_FILE, 'r') as f:
+            self.meta = json.load(f)
+        self.top_pillars = top_pillars
+        self.max_loaded_heads = max_loaded_heads
+        self.router = spacy.load(self.model_dir / self.meta["router"])
+        self.router_pipe = self.router.get_pipe("textcat")
+        self.pillars = list(self.router_pipe.labels)
+        self._heads = OrderedDict()
+
+    def _head(self, pillar: str):
+        """Return the textcat_multilabel pipe of a pillar, or None for single-label pillars."""
+        entry = self.meta["pillars"].get(pillar, {})
+        if "head" not in entry or pillar in self.meta.get("failed", []):
+            return None
+        if pillar in self._heads:
+            self._heads.move_to_end(pillar)
+            return self._heads[pillar]
+        import spacy
+
+        nlp = spacy.load(self.model_dir / entry["head"] / self.meta["head_model"])
+        self._heads[pillar] = nlp.get_pipe("textcat_multilabel")
+        if self.max_loaded_heads and len(self._heads) > self.max_loaded_heads:
+            self._heads.popitem(last=False)
+        return self._heads[pillar]
+
+    def load_heads(self):
+        """Load every head up front (up to max_loaded_heads) instead of on first use."""
+        for pillar in self.pillars:
+            self._head(pillar)
+
+    def predict_batch(self, texts: List[str], k: int = 5,
+                      batch_size: int = 256) -> List[List[Tuple[str, float]]]:
+        """Top-k (label, score) lists, one per text."""
+        results = []
+        for start in range(0, len(texts), batch_size):
+            docs = list(self.router.tokenizer.pipe(texts[start:start + batch_size]))
+            router_scores = self.router_pipe.model.ops.to_numpy(self.router_pipe.predict(docs))
+            n_routes = min(self.top_pillars, len(self.pillars))
+            routes = np.argsort(-router_scores, axis=1)[:, :n_routes]
+
+            # Group docs by routed pillar so every head runs once per batch
+            per_pillar = defaultdict(list)
+            for i, pillar_ids in enumerate(routes):
+                for pillar_id in pillar_ids:
+                    per_pillar[self.pillars[pillar_id]].append(i)
+
+            label_scores = [dict() for _ in docs]
+            for pillar, doc_ids in per_pillar.items():
+                pillar_id = self.pillars.index(pillar)
+                head = self._head(pillar)
+                if head is None:
+                    labels = self.meta["pillars"].get(pillar, {}).get("labels", [])
+                    for i in doc_ids:
+                        for label in labels:
+                            self._merge(label_scores[i], label, float(router_scores[i, pillar_id]))
+                    continue
+                head_scores = head.model.ops.to_numpy(head.predict([docs[i] for i in doc_ids]))
+                head_labels = head.labels
+                for row, i in enumerate(doc_ids):
+                    prior = float(router_scores[i, pillar_id])
+                    top = np.argsort(-head_scores[row])[:k]
+                    for j in top:
+                        self._merge(label_scores[i], head_labels[j], prior * float(head_scores[row, j]))
+
+            for scores in label_scores:
+                results.append(sorted(scores.items(), key=lambda item: -item[1])[:k])
+        return results
+
+    @staticmethod
+    def _merge(scores: Dict[str, float], label: str, score: float):
+        if score > scores.get(label, 0.0):
+            scores[label] = score
+
+    def predict(self, text: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Top-k (label, score) for one text."""
+        return self.predict_batch([text], k)[0]
+
+    def route(self, text: str) -> List[Tuple[str, float]]:
+        """Router probabilities, best first."""
+        doc = self.router.make_doc(text)
+        scores = self.router_pipe.model.ops.to_numpy(self.router_pipe.predict([doc]))[0]
+        return sorted(zip(self.pillars, scores.tolist()), key=lambda item: -item[1])
+
+
+class FlatIntentClassifier:
+    """The single textcat_multilabel model behind the same predict API, for benchmarks."""
+
+    def __init__(self, model_path: Path):
+        import spacy
+
+        self.nlp = spacy.load(model_path)
+        self.scorer = IntentScorer(self.nlp, "textcat_multilabel")
+        self.labels = self.scorer.labels
+
+    def predict_batch(self, texts: List[str], k: int = 5,
+                      batch_size: int = 256) -> List[List[Tuple[str, float]]]:
+        return self.scorer.top_k(texts, k, batch_size=batch_size)
+
+    def predict(self, text: str, k: int = 5) -> List[Tuple[str, float]]:
+        return self.predict_batch([text], k)[0]
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def _benchmark_model(kind: str, model_path: str, test_path: str, ks: Tuple[int, ...],
+                     latency_queries: int, top_pillars: int) -> Dict:
+    """Pool worker: load one model in a fresh process and measure it."""
+    import spacy
+
+    vocab = spacy.blank("en").vocab
+    docs = read_intent_docs(Path(test_path), vocab)
+    texts = [doc.text for doc in docs]
+    gold = [set(positive_labels(doc.cats)) for doc in docs]
+
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    if kind == "hierarchical":
+        model = HierarchicalIntentClassifier(Path(model_path), top_pillars=top_pillars)
+        model.load_heads()
+    else:
+        model = FlatIntentClassifier(Path(model_path))
+    load_seconds = time.perf_counter() - started
+
+    latencies = []
+    for text in texts[:latency_queries]:
+        query_started = time.perf_counter()
+        model.predict(text, max(ks))
+        latencies.append((time.perf_counter() - query_started) * 1000)
+
+    started = time.perf_counter()
+    predictions = model.predict_batch(texts, max(ks))
+    batch_seconds = time.perf_counter() - started
+
+    recall = {}
+    evaluated = [(labels, predicted) for labels, predicted in zip(gold, predictions) if labels]
+    for k in ks:
+        hits = sum(len(labels & {label for label, _ in predicted[:k]}) / len(labels)
+                   for labels, predicted in evaluated)
+        recall[f"recall@{k}"] = round(hits / len(evaluated), 4) if evaluated else None
+
+    latencies.sort()
+    rss_after = peak_rss_mb()
+    return {
+        "model": kind,
+        "path": model_path,
+        "load_seconds": round(load_seconds, 2),
+        # Peak RSS after loading and predicting, minus the process baseline
+        "memory_mb": round(rss_after - rss_before, 1) if rss_after is not None else None,
+        "latency_ms_p50": round(statistics.median(latencies), 2) if latencies else None,
+        "latency_ms_p95": round(latencies[int(len(latencies) * 0.95) - 1], 2) if latencies else None,
+        "batch_docs_per_sec": round(len(texts) / batch_seconds, 1) if batch_seconds else None,
+        "docs": len(texts),
+        **recall,
+    }
+
+
+def run_benchmark(model_dir: Path, flat_model: Optional[Path], test_path: Path,
+                  ks: Tuple[int, ...] = (1, 3, 5), latency_queries: int = 500,
+                  top_pillars: int = 2) -> List[Dict]:
+    """Benchmark each model in its own process so memory figures don't mix."""
+    models = [("hierarchical", model_dir)]
+    if flat_model is not None:
+        models.append(("flat", flat_model))
+    results = []
+    for kind, path in models:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results.append(pool.submit(_benchmark_model, kind, str(path), str(test_path), ks,
+                                       latency_queries, top_pillars).result())
+    return results
+
+
+def print_benchmark(results: List[Dict], ks: Tuple[int, ...]):
+    print(f"\n{'='*90}")
+    print("HIERARCHICAL vs FLAT INTENT MODEL")
+    print(f"{'='*90}")
+    recall_headers = " ".join(f"{f'R@{k}':>7s}" for k in ks)
+    print(f"{'model':14s} {'load s':>7s} {'mem MB':>8s} {'p50 ms':>7s} {'p95 ms':>7s} "
+          f"{'docs/s':>9s} {recall_headers}")
+    for r in results:
+        recalls = " ".join(f"{r[f'recall@{k}']:7.4f}" if r[f'recall@{k}'] is not None else f"{'-':>7s}"
+                           for k in ks)
+        memory = f"{r['memory_mb']:8.1f}" if r["memory_mb"] is not None else f"{'-':>8s}"
+        print(f"{r['model']:14s} {r['load_seconds']:7.2f} {memory} "
+              f"{r['latency_ms_p50']:7.2f} {r['latency_ms_p95']:7.2f} "
+              f"{r['batch_docs_per_sec']:9,.0f} {recalls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train, query or benchmark the hierarchical (pillar → intent) classifier"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="Train the router and per-pillar heads")
+    train_parser.add_argument(
+        "--data-dir",
+        default="cyber-train/spacy-training",
+        help="Directory with intents_train/dev.spacy (with pillars in user data)"
+    )
+    train_parser.add_argument(
+        "--output",
+        default="cyber-train/models/hierarchical_intent",
+        help="Output model directory"
+    )
+    train_parser.add_argument(
+        "--config",
+        default="cyber-train/models/configs/config_intent.cfg",
+        help="Base textcat_multilabel config for the heads"
+    )
+    train_parser.add_argument("--router-steps", type=int, default=5000, help="max_steps for the router")
+    train_parser.add_argument("--head-steps", type=int, default=2000, help="max_steps for each head")
+    train_parser.add_argument(
+        "--head-length",
+        type=int,
+        default=2 ** 16,
+        help="TextCatBOW hash table length per head (default: 65536)"
+    )
+    train_parser.add_argument("--workers", type=int, default=1, help="Stages trained at once")
+    train_parser.add_argument("--threads", type=int, default=1, help="BLAS threads per worker")
+
+    predict_parser = subparsers.add_parser("predict", help="Print top intents for texts")
+    predict_parser.add_argument("--model", default="cyber-train/models/hierarchical_intent")
+    predict_parser.add_argument("--top-k", type=int, default=5)
+    predict_parser.add_argument("--top-pillars", type=int, default=2)
+    predict_parser.add_argument("texts", nargs="+")
+
+    bench_parser = subparsers.add_parser("benchmark", help="Compare with the flat model")
+    bench_parser.add_argument("--model", default="cyber-train/models/hierarchical_intent")
+    bench_parser.add_argument("--flat-model", help="Flat intent model (e.g. models/intent_model/model-best)")
+    bench_parser.add_argument("--test", default="cyber-train/spacy-training/intents_test.spacy")
+    bench_parser.add_argument("--latency-queries", type=int, default=500,
+                              help="Queries timed one by one (default: 500)")
+    bench_parser.add_argument("--top-pillars", type=int, default=2)
+    bench_parser.add_argument("--output", help="Write results as JSON")
+
+    args = parser.parse_args()
+
+    if args.command == "train":
+        base_config = Path(args.config) if args.config and Path(args.config).exists() else None
+        if base_config is None:
+            print(f"⚠️  {args.config} not found, heads use spaCy's default textcat_multilabel config")
+        train_hierarchical(Path(args.data_dir), Path(args.output), base_config,
+                           args.router_steps, args.head_steps, args.head_length,
+                           args.workers, args.threads)
+
+    elif args.command == "predict":
+        classifier = HierarchicalIntentClassifier(Path(args.model), top_pillars=args.top_pillars)
+        for text in args.texts:
+            print(f"\n📝 {text}")
+            print("   Pillars: " + ", ".join(f"{p} {s:.2f}" for p, s in classifier.route(text)[:args.top_pillars]))
+            for label, score in classifier.predict(text, args.top_k):
+                print(f"   {score:.4f}  {label}")
+
+    elif args.command == "benchmark":
+        ks = (1, 3, 5)
+        results = run_benchmark(Path(args.model), Path(args.flat_model) if args.flat_model else None,
+                                Path(args.test), ks, args.latency_queries, args.top_pillars)
+        print_benchmark(results, ks)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"\n📊 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Hyperparameter sweep with successive halving for the NER and intent configs.
+
+Replaces hand-made config variants (config_ner-1.cfg, config_intent-3.cfg,
+...) with one command:
+1. Builds trials from a base config and a search space over config keys
+   (full grid, or a random sample of it with --trials)
+2. Trains all trials for a small step budget in a process pool, each trial
+   with training_driver.TrainingDriver in its own directory
+3. Keeps the best 1/eta of the trials by dev score, resumes the survivors
+   with eta times the budget, and repeats up to --max-steps
+4. Prints a ranked table with dev score, training throughput and model size,
+   and writes sweep_results.json plus the winning config
+
+Every trial uses the same seed, so differences come from the parameters.
+
+Usage:
+    python cyber-train/hyperparam_sweep.py cyber-train/models/configs/config_intent.cfg \\
+        --train cyber-train/spacy-training/intents_train.spacy \\
+        --dev cyber-train/spacy-training/intents_dev.spacy \\
+        --output cyber-train/models/sweeps/intent --workers 4
+
+    # custom search space (repeatable), instead of the preset for the pipeline
+    python cyber-train/hyperparam_sweep.py config_ner.cfg ... \\
+        --param training.dropout=0.1,0.2,0.3 \\
+        --param components.tok2vec.model.encode.width=64,96,128
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import random
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from parallel_training import limit_blas_threads
+
+# Default search spaces per trainable component (dotted config keys)
+PRESETS = {
+    "ner": {
+        "training.dropout": [0.1, 0.2, 0.3],
+        "training.batcher.size.stop": [1000, 2000],
+        # The embed layer's width interpolates this value in the efficiency configs
+        "components.tok2vec.model.encode.width": [64, 96, 128],
+    },
+    "textcat_multilabel": {
+        "training.dropout": [0.1, 0.2],
+        "training.batcher.size.stop": [1000, 2000],
+        "components.textcat_multilabel.model.ngram_size": [1, 2, 3],
+        "components.textcat_multilabel.model.length": [2 ** 18, 2 ** 20],
+    },
+}
+
+
+def parse_value(text: str):
+    """Parse a config value given on the command line (JSON, else string)."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def parse_space(params: List[str]) -> Dict[str, list]:
+    """Turn ["key=v1,v2", ...] into {key: [v1, v2]}."""
+    space = {}
+    for param in params:
+        key, sep, values = param.partition("=")
+        if not sep or not values:
+            raise ValueError(f"--param {param!r} must look like section.key=v1,v2,...")
+        space[key] = [parse_value(value) for value in values.split(",")]
+    return space
+
+
+def config_has_key(config, key: str) -> bool:
+    node = config
+    for part in key.split("."):
+        if not isinstance(node, dict) or part not in node:
+            return False
+        node = node[part]
+    return True
+
+
+def build_trials(space: Dict[str, list], limit: int = 0, seed: int = 0) -> List[Dict]:
+    """All parameter combinations, or a random sample of `limit` of them."""
+    keys = sorted(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+    if limit and limit < len(grid):
+        grid = random.Random(seed).sample(grid, limit)
+    return [{"id": f"trial-{i:03d}", "params": params} for i, params in enumerate(grid)]
+
+
+def _dir_size_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) / (1024 * 1024)
+
+
+def run_trial(trial: Dict, config_path: str, base_overrides: Dict, budget: int,
+              sweep_dir: str, code_path: Optional[str] = None) -> Dict:
+    """Train one trial up to `budget` steps (resuming earlier rungs) and report it."""
+    from training_driver import TrainingDriver
+
+    trial_dir = Path(sweep_dir) / trial["id"]
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    overrides = dict(base_overrides)
+    overrides.update(trial["params"])
+    overrides["training.max_steps"] = budget
+
+    result = {"id": trial["id"], "params": trial["params"], "budget": budget}
+    started = time.perf_counter()
+    try:
+        with open(trial_dir / "train.log", 'a') as log, contextlib.redirect_stdout(log):
+            driver = TrainingDriver(config_path, trial_dir, overrides, code_path=code_path)
+            driver.run(resume=True)
+            state = driver.load_state()
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+
+    best_model = trial_dir / "model-best"
+    result.update({
+        "score": state["best_score"],
+        "best_step": state["best_step"],
+        "steps": state["step"],
+        "words_per_sec": state.get("words_per_sec"),
+        "model_mb": round(_dir_size_mb(best_model), 2) if best_model.exists() else None,
+        "rung_seconds": round(time.perf_counter() - started, 1),
+        "stop_reason": state.get("stop_reason"),
+    })
+    return result
+
+
+def successive_halving(trials: List[Dict], args, base_overrides: Dict, sweep_dir: Path) -> List[Dict]:
+    """Run the rungs and return one result per trial (latest rung it reached)."""
+    results = {}
+    survivors = trials
+    budget = min(args.min_steps, args.max_steps)
+    rung = 0
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=get_context("spawn"),
+                             initializer=limit_blas_threads, initargs=(args.threads,)) as pool:
+        while True:
+            print(f"\n🔄 Rung {rung}: {len(survivors)} trials × {budget} steps")
+            futures = [
+                pool.submit(run_trial, trial, str(args.config), base_overrides, budget,
+                            str(sweep_dir), args.code)
+                for trial in survivors
+            ]
+            for future in futures:
+                result = future.result()
+                result["rung"] = rung
+                results[result["id"]] = result
+                if "error" in result:
+                    print(f"   ❌ {result['id']}: {result['error']}")
+                else:
+                    print(f"   {result['id']}: score {result['score']:.4f} "
+                          f"({result['rung_seconds']:.0f}s) {format_params(result['params'])}")
+
+            ranked = sorted((results[trial["id"]] for trial in survivors
+                             if "error" not in results[trial["id"]]),
+                            key=lambda r: r["score"], reverse=True)
+            if budget >= args.max_steps or len(ranked) <= 1:
+                break
+            keep = max(1, len(ranked) // args.eta)
+            for result in ranked[keep:]:
+                result["pruned"] = True
+                if not args.keep_pruned:
+                    shutil.rmtree(sweep_dir / result["id"], ignore_errors=True)
+            survivors = [{"id": r["id"], "params": r["params"]} for r in ranked[:keep]]
+            print(f"✂️  Keeping {keep}: {', '.join(t['id'] for t in survivors)}")
+            budget = min(budget * args.eta, args.max_steps)
+            rung += 1
+    return list(results.values())
+
+
+def format_params(params: Dict) -> str:
+    return " ".join(f"{key.rsplit('.', 1)[-1]}={value}" for key, value in sorted(params.items()))
+
+
+def print_table(results: List[Dict]):
+    """Ranked table: furthest rung first, then dev score."""
+    ranked = sorted(results, key=lambda r: ("error" not in r, r.get("rung", 0),
+                                             r.get("score") or 0.0), reverse=True)
+    print(f"\n{'='*100}")
+    print("SWEEP RESULTS")
+    print(f"{'='*100}")
+    print(f"{'#':>3}  {'trial':10s} {'score':>7s} {'steps':>6s} {'words/s':>9s} {'size MB':>8s}  "
+          f"{'status':10s} params")
+    for i, r in enumerate(ranked, 1):
+        if "error" in r:
+            print(f"{i:3d}  {r['id']:10s} {'-':>7s} {'-':>6s} {'-':>9s} {'-':>8s}  {'error':10s} "
+                  f"{format_params(r['params'])}")
+            continue
+        status = f"pruned@{r['rung']}" if r.get("pruned") else "final"
+        words_per_sec = f"{r['words_per_sec']:,.0f}" if r["words_per_sec"] else "-"
+        size = f"{r['model_mb']:.1f}" if r["model_mb"] is not None else "-"
+        print(f"{i:3d}  {r['id']:10s} {r['score']:7.4f} {r['steps']:6d} {words_per_sec:>9s} {size:>8s}  "
+              f"{status:10s} {format_params(r['params'])}")
+    return ranked
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep spaCy config hyperparameters with successive halving"
+    )
+    parser.add_argument("config", help="Base training config (.cfg)")
+    parser.add_argument("--train", required=True, help="Training corpus (.spacy)")
+    parser.add_argument("--dev", required=True, help="Dev corpus (.spacy)")
+    parser.add_argument(
+        "--output",
+        default="cyber-train/models/sweeps",
+        help="Directory for trial models and results"
+    )
+    parser.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        metavar="KEY=V1,V2",
+        help="Search values for a config key (repeatable); default: preset for the pipeline"
+    )
+    parser.add_argument(
+        "--override",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Fixed config override for all trials (repeatable)"
+    )
+    parser.add_argument("--trials", type=int, default=0, help="Random sample of the grid (default: full grid)")
+    parser.add_argument("--min-steps", type=int, default=500, help="Step budget of the first rung (default: 500)")
+    parser.add_argument(
+        "--max-steps",
+        type=int,
+        default=0,
+        help="Step budget of the final rung (default: training.max_steps of the config)"
+    )
+    parser.add_argument("--eta", type=int, default=3, help="Keep 1/eta of the trials per rung (default: 3)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help="Trials trained at once (default: half the CPUs)")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="BLAS threads per trial (default: CPUs / workers)")
+    parser.add_argument("--code", help="Python file with registered functions (e.g. corpus_readers.py)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for --trials sampling")
+    parser.add_argument("--keep-pruned", action="store_true", help="Keep model directories of pruned trials")
+    args = parser.parse_args()
+
+    from spacy import util
+    from training_driver import parse_overrides
+
+    config = util.load_config(args.config, interpolate=False)
+    if args.param:
+        space = parse_space(args.param)
+    else:
+        trainable = [name for name in config["nlp"]["pipeline"] if name in PRESETS]
+        if not trainable:
+            print(f"❌ No preset search space for pipeline {config['nlp']['pipeline']}; use --param")
+            return
+        space = PRESETS[trainable[-1]]
+    unknown = [key for key in space if not config_has_key(config, key)]
+    if unknown:
+        print(f"❌ Not in {args.config}: {', '.join(unknown)}")
+        return
+
+    if args.eta < 2:
+        print("❌ --eta must be at least 2")
+        return
+    args.max_steps = args.max_steps or config["training"]["max_steps"]
+    if not args.max_steps:
+        print("❌ The config has no training.max_steps; pass --max-steps")
+        return
+    args.threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+
+    base_overrides = parse_overrides(args.override)
+    base_overrides["paths.train"] = args.train
+    base_overrides["paths.dev"] = args.dev
+
+    trials = build_trials(space, args.trials, args.seed)
+    sweep_dir = Path(args.output)
+    sweep_dir.mkdir(parents=True, exist_ok=True)
+
+    print("="*70)
+    print("HYPERPARAMETER SWEEP")
+    print("="*70)
+    print(f"Base config: {args.config}")
+    for key, values in sorted(space.items()):
+        print(f"   {key}: {values}")
+    print(f"Trials: {len(trials)}, rungs {args.min_steps} → {args.max_steps} steps (eta {args.eta})")
+    print(f"Workers: {args.workers} × {args.threads} threads")
+
+    started = time.perf_counter()
+    results = successive_halving(trials, args, base_overrides, sweep_dir)
+    ranked = print_table(results)
+
+    summary = {
+        "config": str(args.config),
+        "space": space,
+        "overrides": base_overrides,
+        "min_steps": args.min_steps,
+        "max_steps": args.max_steps,
+        "eta": args.eta,
+        "wall_seconds": round(time.perf_counter() - started, 1),
+        "results": ranked,
+    }
+    with open(sweep_dir / "sweep_results.json", 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"\n📊 Results saved to {sweep_dir / 'sweep_results.json'}")
+
+    best = next((r for r in ranked if "error" not in r), None)
+    if best is not None:
+        best_config = util.load_config(args.config, interpolate=False, overrides=best["params"])
+        best_path = sweep_dir / f"{Path(args.config).stem}_best.cfg"
+        best_config.to_disk(best_path)
+        print(f"✅ Best: {best['id']} score {best['score']:.4f} ({format_params(best['params'])})")
+        print(f"   Config: {best_path}")
+        print(f"   Model:  {sweep_dir / best['id'] / 'model-best'}")
+
+
+if __name__ == "__main__":
+    main()
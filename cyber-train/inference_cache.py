@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache for NER and intent predictions.
+
+Generated corpora and the test suites repeat the same texts many times, and
+re-runs repeat whole suites. ResultCache keeps predictions keyed by:
+1. the model fingerprint: content digest of meta.json and config.cfg plus
+   the size and mtime of every other file under the model directory, so
+   retraining model-best (or copying another model over it) changes it
+   without hashing hundreds of MB of weights
+2. FILTER_VERSION of fix_entity_extraction.py and the call options
+   (pipeline components, filter on/off, top_n ...)
+3. the text with whitespace runs collapsed (case is kept; the models are
+   case-sensitive)
+
+Lookups go to an in-memory LRU first, then to an optional SQLite file
+(--cache-db), so re-runs only pay for texts not seen before. Each row also
+records the directories it was predicted with (models, the pattern ruler's
+catalogs) and their fingerprints; opening the database drops the rows of a
+directory whose fingerprint has changed since, and keeps those of other
+tools and settings sharing the file. Duplicates within one batch are
+predicted once.
+
+Used by test_models.py and comprehensive_test_suite.py.
+"""
+
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+try:
+    from fix_entity_extraction import FILTER_VERSION
+except ImportError:
+    FILTER_VERSION = 0
+
+# Small files whose content identifies a pipeline; everything else by size + mtime
+CONTENT_FILES = ("meta.json", "config.cfg")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    models TEXT NOT NULL,
+    value TEXT NOT NULL
+)
+"""
+
+
+def normalize_text(text: str) -> str:
+    """Cache key form of a text: stripped, whitespace runs collapsed to one space."""
+    return " ".join(text.split())
+
+
+def model_fingerprint(path: Optional[Path]) -> str:
+    """Short digest that changes whenever the model directory changes."""
+    if path is None:
+        return "none"
+    path = Path(path)
+    if not path.exists():
+        return "missing"
+    digest = hashlib.sha256()
+    for file in sorted(f for f in path.rglob("*") if f.is_file()):
+        relative = file.relative_to(path).as_posix()
+        if file.name in CONTENT_FILES:
+            digest.update(f"{relative}|".encode("utf-8") + file.read_bytes())
+        else:
+            stat = file.stat()
+            digest.update(f"{relative}|{stat.st_size}|{stat.st_mtime_ns}|".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def pipeline_fingerprint(*parts: Any) -> str:
+    """Combine model fingerprints and settings into one fingerprint."""
+    return hashlib.sha256(json.dumps([FILTER_VERSION, *parts], default=str).encode("utf-8")).hexdigest()[:16]
+
+
+class ResultCache:
+    """LRU (+ optional SQLite) cache of JSON-serializable predictions per text."""
+
+    def __init__(self, fingerprint: str, maxsize: int = 100_000, db_path: Optional[Path] = None,
+                 models: Optional[Dict[str, str]] = None):
+        self.fingerprint = fingerprint
+        # Directory -> fingerprint the predictions depend on
+        self.models = dict(sorted((models or {}).items()))
+        self.maxsize = maxsize
+        self.memory: "OrderedDict[str, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.conn = None
+        if db_path is not None:
+            db_path = Path(db_path)
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(db_path)
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(predictions)")]
+            if columns and "models" not in columns:
+                # Written before rows recorded their models; nothing to tell stale rows apart
+                self.conn.execute("DROP TABLE predictions")
+            self.conn.execute(SCHEMA)
+            self._drop_stale()
+            self.conn.commit()
+
+    def _drop_stale(self):
+        """Delete rows predicted with an older version of one of our directories."""
+        stale = []
+        for (models,) in self.conn.execute("SELECT DISTINCT models FROM predictions"):
+            if any(path in self.models and fingerprint != self.models[path]
+                   for path, fingerprint in json.loads(models).items()):
+                stale.append(models)
+        self.conn.executemany("DELETE FROM predictions WHERE models = ?", [(models,) for models in stale])
+
+    def key(self, namespace: str, options: Any, text: str) -> str:
+        payload = json.dumps([self.fingerprint, namespace, options, normalize_text(text)], default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, value: Any):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def map(self, namespace: str, texts: List[str], compute: Callable[[List[str]], List[Any]],
+            options: Any = None) -> List[Any]:
+        """
+        compute(texts) for every text, from the cache where possible.
+
+        compute gets each missing (normalized-distinct) text once and must
+        return one JSON-serializable value per text, in order. Values read
+        back from SQLite have lists where compute returned tuples.
+        """
+        keys = [self.key(namespace, options, text) for text in texts]
+        values: Dict[str, Any] = {}
+        for key in keys:
+            if key in self.memory and key not in values:
+                self.memory.move_to_end(key)
+                values[key] = self.memory[key]
+
+        missing = list(dict.fromkeys(key for key in keys if key not in values))
+        if missing and self.conn is not None:
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, value FROM predictions WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                for key, value in rows:
+                    values[key] = json.loads(value)
+                    self._remember(key, values[key])
+            missing = [key for key in missing if key not in values]
+
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            first_text = {}
+            for key, text in zip(keys, texts):
+                first_text.setdefault(key, text)
+            computed = compute([first_text[key] for key in missing])
+            for key, value in zip(missing, computed):
+                values[key] = value
+                self._remember(key, value)
+            if self.conn is not None:
+                models = json.dumps(self.models)
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO predictions (key, fingerprint, models, value) VALUES (?, ?, ?, ?)",
+                    [(key, self.fingerprint, models, json.dumps(values[key])) for key in missing])
+                self.conn.commit()
+        return [values[key] for key in keys]
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"♻️  Prediction cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)"
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def open_cache(model_paths: Iterable[Optional[Path]], settings: Any, db_path: Optional[Path] = None,
+               maxsize: int = 100_000) -> ResultCache:
+    """
+    ResultCache for the given model directories and pipeline settings.
+
+    model_paths may also hold other directories the predictions depend on
+    (e.g. the pattern ruler's catalogs); None entries stand for no model.
+    """
+    fingerprints = [model_fingerprint(path) for path in model_paths]
+    models = {str(Path(path).resolve()): fingerprint
+              for path, fingerprint in zip(model_paths, fingerprints) if path is not None}
+    # Rows of an older filter can't hit again either
+    models["FILTER_VERSION"] = str(FILTER_VERSION)
+    fingerprint = pipeline_fingerprint(fingerprints, settings)
+    return ResultCache(fingerprint, maxsize=maxsize, db_path=db_path, models=models)
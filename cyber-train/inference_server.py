@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Long-lived local inference server for the NER and intent models.
+
+Loading both pipelines takes seconds, and every test/CLI invocation used to
+pay that before its first prediction. This server loads them once and
+answers over localhost HTTP:
+1. POST /predict with {"texts": [...], "top_n": 5, "min_score": null,
+   "entities": true, "intents": true, "filter": true, "pattern_only": false}
+   returns {"results": [{"entities": [[text, label, start, end], ...],
+   "intents": [[label, score], ...]}, ...]} in input order. Intents are the
+   top_n best (null: all) of those scoring above min_score (null: any).
+2. GET /health returns the loaded pipelines and batching statistics.
+
+Requests are handled on one thread each but never run the models
+themselves: they are queued, and one worker thread coalesces whatever
+arrives within --max-wait-ms (up to --max-batch texts) into a single
+nlp.pipe call per model. Under load that amortizes the per-call overhead
+over many queries; when idle a request waits at most max-wait-ms.
+
+InferenceClient is the matching client; test_models.py and
+comprehensive_test_suite.py use it with --server.
+
+Usage:
+    python cyber-train/inference_server.py serve \\
+        --ner cyber-train/models/ner_model/model-best \\
+        --intent cyber-train/models/intent_model/model-best
+    python cyber-train/inference_server.py query --text "Block 10.0.0.1"
+    python cyber-train/test_models.py --server http://127.0.0.1:8765 --test-suite
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+
+
+class PredictOptions(NamedTuple):
+    """What to compute for a request; requests with equal options share a pipe call."""
+    entities: bool = True
+    intents: bool = True
+    top_n: Optional[int] = 5
+    min_score: Optional[float] = None
+    filter: bool = True
+    pattern_only: bool = False
+
+    @classmethod
+    def from_request(cls, payload: Dict) -> "PredictOptions":
+        top_n = payload.get("top_n", cls._field_defaults["top_n"])
+        min_score = payload.get("min_score")
+        if top_n is not None and int(top_n) < 1:
+            raise ValueError("top_n must be at least 1 (or null for every label above min_score)")
+        return cls(
+            entities=bool(payload.get("entities", True)),
+            intents=bool(payload.get("intents", True)),
+            top_n=int(top_n) if top_n is not None else None,
+            min_score=float(min_score) if min_score is not None else None,
+            filter=bool(payload.get("filter", True)),
+            pattern_only=bool(payload.get("pattern_only", False)),
+        )
+
+
+class InferenceEngine:
+    """The loaded pipelines; only ever used from the batcher thread."""
+
+    def __init__(self, ner_path: Optional[Path], intent_path: Optional[Path],
+                 batch_size: int = 256, patterns: bool = False):
+        import spacy
+
+        self.batch_size = batch_size
+        self.ner_path = Path(ner_path) if ner_path else None
+        self.intent_path = Path(intent_path) if intent_path else None
+        self.ner_model = None
+        self.intent_model = None
+        self.intent_scorer = None
+        self.filter_name = None
+
+        if self.ner_path is not None and self.ner_path.exists():
+            self.ner_model = spacy.load(self.ner_path)
+            try:
+                from fix_entity_extraction import ENTITY_FILTER_COMPONENT, add_entity_filter
+                add_entity_filter(self.ner_model)
+                self.filter_name = ENTITY_FILTER_COMPONENT
+            except ImportError:
+                print("⚠️  Post-processing filter not available")
+            if patterns:
+                from pattern_ruler import add_pattern_ruler
+                add_pattern_ruler(self.ner_model)
+        if self.intent_path is not None and self.intent_path.exists():
+            if self.ner_model is not None and self.intent_path.resolve() == self.ner_path.resolve():
+                # Merged pipeline (merge_pipelines.py): one pass sets ents and cats
+                self.intent_model = self.ner_model
+            else:
+                self.intent_model = spacy.load(self.intent_path)
+            from intent_scoring import IntentScorer
+            try:
+                self.intent_scorer = IntentScorer(self.intent_model)
+            except ValueError as e:
+                print(f"⚠️  {e}")
+                self.intent_model = None
+
+    def describe(self) -> Dict:
+        return {
+            "ner": str(self.ner_path) if self.ner_model is not None else None,
+            "intent": str(self.intent_path) if self.intent_model is not None else None,
+            "ner_pipeline": self.ner_model.pipe_names if self.ner_model is not None else [],
+            "intent_pipeline": self.intent_model.pipe_names if self.intent_model is not None else [],
+            "merged": self.ner_model is not None and self.intent_model is self.ner_model,
+        }
+
+    def predict(self, texts: List[str], options: PredictOptions) -> List[Dict]:
+        """One result dict per text."""
+        results = [{"entities": [], "intents": []} for _ in texts]
+        want_entities = options.entities and self.ner_model is not None
+        want_intents = options.intents and self.intent_model is not None
+        # A merged pipeline does both in one pass unless entities need a reduced pipeline
+        one_pass = want_entities and want_intents and self.intent_model is self.ner_model \
+            and not options.pattern_only
+
+        docs = None
+        if want_entities:
+            docs = self._pipe_entities(texts, options, skip_textcat=one_pass)
+            for result, doc in zip(results, docs):
+                result["entities"] = [[ent.text, ent.label_, ent.start_char, ent.end_char]
+                                      for ent in doc.ents]
+        if want_intents:
+            # Straight from the score matrix; the merged pipeline scores the docs it already made
+            top = self.intent_scorer.top_k(docs if one_pass else texts, k=options.top_n,
+                                           threshold=options.min_score, batch_size=self.batch_size)
+            for result, intents in zip(results, top):
+                result["intents"] = [[label, score] for label, score in intents]
+        return results
+
+    def _pipe_entities(self, texts: List[str], options: PredictOptions, skip_textcat: bool = False):
+        nlp = self.ner_model
+        if options.pattern_only:
+            from pattern_ruler import PATTERN_RULER, pattern_only
+            if PATTERN_RULER in nlp.pipe_names:
+                with pattern_only(nlp):
+                    return list(nlp.pipe(texts, batch_size=self.batch_size))
+        disable = []
+        if not options.filter and self.filter_name in nlp.pipe_names:
+            disable.append(self.filter_name)
+        if skip_textcat:
+            disable.append(self.intent_scorer.name)
+        with nlp.select_pipes(disable=disable):
+            return list(nlp.pipe(texts, batch_size=self.batch_size))
+
+
+class _Request(NamedTuple):
+    texts: List[str]
+    options: PredictOptions
+    future: Future
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent requests into micro-batches on one worker thread.
+
+    The first queued request opens a batch; requests arriving within
+    max_wait_ms of it join until max_batch texts are collected. Requests
+    with the same options are then run through the engine together.
+    """
+
+    def __init__(self, engine: InferenceEngine, max_batch: int = 128, max_wait_ms: float = 5.0):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "busy_seconds": 0.0}
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str], options: PredictOptions) -> Future:
+        future = Future()
+        self.queue.put(_Request(list(texts), options, future))
+        return future
+
+    def close(self):
+        self.queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            if first is None:
+                return
+            batch = [first]
+            size = len(first.texts)
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    request = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+                size += len(request.texts)
+            self._process(batch)
+            if stop:
+                return
+
+    def _process(self, batch: List[_Request]):
+        started = time.perf_counter()
+        groups: Dict[PredictOptions, List[_Request]] = {}
+        for request in batch:
+            groups.setdefault(request.options, []).append(request)
+        for options, requests in groups.items():
+            texts = [text for request in requests for text in request.texts]
+            try:
+                results = self.engine.predict(texts, options)
+            except Exception as e:
+                for request in requests:
+                    request.future.set_exception(e)
+                continue
+            offset = 0
+            for request in requests:
+                request.future.set_result(results[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+        self.stats["requests"] += len(batch)
+        self.stats["texts"] += sum(len(request.texts) for request in batch)
+        self.stats["batches"] += 1
+        self.stats["busy_seconds"] += time.perf_counter() - started
+
+
+def make_handler(batcher: MicroBatcher, timeout: float):
+    """Request handler class bound to a batcher."""
+
+    class InferenceHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, payload: Dict):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            stats = dict(batcher.stats)
+            stats["avg_batch_texts"] = stats["texts"] / stats["batches"] if stats["batches"] else 0.0
+            self._send_json(200, {"status": "ok", **batcher.engine.describe(),
+                                  "queued": batcher.queue.qsize(), "stats": stats})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                texts = payload["texts"]
+                if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                    raise ValueError("texts must be a list of strings")
+                options = PredictOptions.from_request(payload)
+            except (ValueError, KeyError, TypeError) as e:
+                self._send_json(400, {"error": f"Bad request: {e}"})
+                return
+            try:
+                results = batcher.submit(texts, options).result(timeout=timeout)
+            except Exception as e:
+                self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+            self._send_json(200, {"results": results})
+
+        def log_message(self, format, *args):
+            # One line per request would drown the batching statistics
+            pass
+
+    return InferenceHandler
+
+
+def serve(engine: InferenceEngine, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+          max_batch: int = 128, max_wait_ms: float = 5.0, timeout: float = 60.0):
+    """Run the server until Ctrl+C."""
+    batcher = MicroBatcher(engine, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    server = ThreadingHTTPServer((host, port), make_handler(batcher, timeout))
+    server.daemon_threads = True
+    print(f"🚀 Serving on http://{host}:{port} (max batch {max_batch} texts, max wait {max_wait_ms:g} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Stopping")
+    finally:
+        server.server_close()
+        batcher.close()
+        stats = batcher.stats
+        if stats["batches"]:
+            print(f"📊 {stats['requests']} requests, {stats['texts']} texts in {stats['batches']} batches "
+                  f"({stats['texts'] / stats['batches']:.1f} texts/batch)")
+
+
+class InferenceClient:
+    """Client for a running inference server."""
+
+    def __init__(self, url: str = DEFAULT_URL, timeout: float = 60.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path: str, payload: Optional[Dict] = None) -> Dict:
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request(self.url + path, data=data,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"Inference server error {e.code}: {e.read().decode('utf-8', 'replace')}") from e
+
+    def health(self) -> Dict:
+        return self._request("/health")
+
+    def is_available(self) -> bool:
+        try:
+            return self.health().get("status") == "ok"
+        except (OSError, RuntimeError, ValueError):
+            return False
+
+    def predict(self, texts: List[str], **options) -> List[Dict]:
+        """One {"entities", "intents"} dict per text; options as in PredictOptions."""
+        if not texts:
+            return []
+        return self._request("/predict", {"texts": list(texts), **options})["results"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local inference server for the NER and intent models")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Load the models and serve them")
+    serve_parser.add_argument("--ner", default="cyber-train/models/ner_model/model-best", help="NER pipeline")
+    serve_parser.add_argument("--intent", default="cyber-train/models/intent_model/model-best",
+                              help="Intent pipeline (same path as --ner for a merged pipeline)")
+    serve_parser.add_argument("--host", default=DEFAULT_HOST, help=f"Bind address (default: {DEFAULT_HOST})")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+    serve_parser.add_argument("--max-batch", type=int, default=128,
+                              help="Max texts per micro-batch (default: 128)")
+    serve_parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                              help="How long a batch waits for more requests (default: 5)")
+    serve_parser.add_argument("--batch-size", type=int, default=256, help="nlp.pipe batch size (default: 256)")
+    serve_parser.add_argument("--patterns", action="store_true",
+                              help="Add the regex/catalog ruler in front of ner (enables pattern_only)")
+
+    query_parser = subparsers.add_parser("query", help="Send texts to a running server")
+    query_parser.add_argument("--url", default=DEFAULT_URL, help=f"Server URL (default: {DEFAULT_URL})")
+    query_parser.add_argument("--text", action="append", default=[], help="Text (repeatable)")
+    query_parser.add_argument("--top-n", type=int, default=5, help="Intents per text (default: 5)")
+    query_parser.add_argument("--pattern-only", action="store_true", help="Regex/catalog entities only")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        started = time.perf_counter()
+        print(f"📦 Loading {args.ner} + {args.intent}")
+        engine = InferenceEngine(Path(args.ner), Path(args.intent), batch_size=args.batch_size,
+                                 patterns=args.patterns)
+        if engine.ner_model is None and engine.intent_model is None:
+            print("❌ No models loaded. Exiting.")
+            return
+        info = engine.describe()
+        print(f"✅ Loaded in {time.perf_counter() - started:.1f}s: NER {info['ner_pipeline']}, "
+              f"intent {info['intent_pipeline']}{' (merged)' if info['merged'] else ''}")
+        serve(engine, args.host, args.port, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+
+    elif args.command == "query":
+        client = InferenceClient(args.url)
+        started = time.perf_counter()
+        results = client.predict(args.text, top_n=args.top_n, pattern_only=args.pattern_only)
+        elapsed = time.perf_counter() - started
+        for text, result in zip(args.text, results):
+            print(f"\n📝 {text}")
+            for entity_text, label, _, _ in result["entities"]:
+                print(f"   • {entity_text} → {label}")
+            for intent, score in result["intents"]:
+                print(f"   🎯 {intent}: {score:.4f}")
+        print(f"\n⏱️  {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Top-k / threshold intent scoring straight from the textcat score matrix.
+
+Letting the pipeline set doc.cats builds a ~3,000-entry dict per text, and
+the callers then sort all of it to keep five labels or the few above 0.3.
+IntentScorer skips both:
+1. only the components the textcat listens to run (none for the BOW intent
+   model), then textcat.predict() scores the whole batch as one matrix
+2. top_k_rows() picks the top labels per row with np.argpartition, or the
+   labels above a threshold with one vectorized comparison, and sorts just
+   those
+
+The scores are the ones doc.cats would hold, and equal scores keep label
+order, as the stable sort over doc.cats did.
+
+Usage:
+    scorer = IntentScorer(nlp)
+    scorer.top_k(texts, k=5)                   # [[(label, score), ...], ...]
+    scorer.top_k(texts, k=None, threshold=0.3) # every label scoring > 0.3
+    scores = scorer.score_matrix(texts)        # (len(texts), len(labels)) array
+"""
+
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+TEXTCAT_COMPONENTS = ("textcat_multilabel", "textcat")
+
+
+def top_k_rows(scores: np.ndarray, labels: Sequence[str], k: Optional[int] = 5,
+               threshold: Optional[float] = None) -> List[List[Tuple[str, float]]]:
+    """
+    Best labels of each row of a (docs, labels) score matrix, best first.
+
+    k=None keeps every label scoring above the threshold; with both, the top
+    k of those. k <= 0 gives empty rows.
+    """
+    if k is not None and k <= 0:
+        return [[] for _ in range(scores.shape[0])]
+    n_labels = scores.shape[1]
+    results = []
+    if threshold is not None:
+        above = scores > threshold
+    for row in range(scores.shape[0]):
+        row_scores = scores[row]
+        if threshold is not None:
+            candidates = np.flatnonzero(above[row])
+        else:
+            candidates = None
+        if k is not None and k < (n_labels if candidates is None else len(candidates)):
+            pool = row_scores if candidates is None else row_scores[candidates]
+            kth = pool[np.argpartition(-pool, k - 1)[k - 1]]
+            # argpartition splits ties at the k-th score arbitrarily; take the first ones
+            better = np.flatnonzero(pool > kth)
+            picked = np.concatenate([better, np.flatnonzero(pool == kth)[:k - len(better)]])
+            candidates = picked if candidates is None else candidates[picked]
+        elif candidates is None:
+            candidates = np.arange(n_labels)
+        # Best first; equal scores in label order
+        order = np.lexsort((candidates, -row_scores[candidates]))
+        results.append([(labels[j], float(row_scores[j])) for j in candidates[order]])
+    return results
+
+
+class IntentScorer:
+    """Scores a pipeline's textcat without setting doc.cats."""
+
+    def __init__(self, nlp, component: Optional[str] = None):
+        if component is None:
+            component = next((name for name in TEXTCAT_COMPONENTS if name in nlp.pipe_names), None)
+            if component is None:
+                raise ValueError(f"No textcat component in the pipeline {nlp.pipe_names}")
+        self.nlp = nlp
+        self.name = component
+        self.textcat = nlp.get_pipe(component)
+        self.labels = list(self.textcat.labels)
+        # Embedding components (tok2vec) the textcat listens to must run first
+        self.upstream = [name for name in nlp.pipe_names
+                         if component in getattr(nlp.get_pipe(name), "listening_components", [])]
+
+    def make_docs(self, texts: Iterable[str], batch_size: int = 256, n_process: int = 1) -> list:
+        """Docs with just what the textcat needs (tokens, plus upstream embeddings)."""
+        if not self.upstream:
+            return list(self.nlp.tokenizer.pipe(texts, batch_size=batch_size))
+        with self.nlp.select_pipes(enable=self.upstream):
+            return list(self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process))
+
+    def score_docs(self, docs: list, batch_size: int = 256) -> np.ndarray:
+        """(len(docs), len(labels)) scores for docs that already went through the upstream components."""
+        if not docs:
+            return np.zeros((0, len(self.labels)), dtype="float32")
+        ops = self.textcat.model.ops
+        scores = np.concatenate([ops.to_numpy(self.textcat.predict(docs[start:start + batch_size]))
+                                 for start in range(0, len(docs), batch_size)])
+        # textcat only returns zeros for empty docs when the whole batch is empty;
+        # batched with other docs they would get the model's bias scores
+        scores[[len(doc) == 0 for doc in docs]] = 0
+        return scores
+
+    def score_matrix(self, texts_or_docs: Union[List[str], list], batch_size: int = 256,
+                     n_process: int = 1) -> np.ndarray:
+        """(len(texts), len(labels)) score matrix; columns follow self.labels."""
+        if texts_or_docs and isinstance(texts_or_docs[0], str):
+            texts_or_docs = self.make_docs(texts_or_docs, batch_size, n_process)
+        return self.score_docs(list(texts_or_docs), batch_size)
+
+    def top_k(self, texts_or_docs: Union[List[str], list], k: Optional[int] = 5,
+              threshold: Optional[float] = None, batch_size: int = 256,
+              n_process: int = 1) -> List[List[Tuple[str, float]]]:
+        """Top k labels (and/or those scoring > threshold) per text, best first."""
+        return top_k_rows(self.score_matrix(texts_or_docs, batch_size, n_process), self.labels, k, threshold)
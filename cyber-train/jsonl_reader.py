@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Shared typed JSONL reader for the entities-intent training files.
+
+Decodes each line straight into a typed record and validates it against one
+schema, so every script agrees on what a valid example is:
+
+    entities: {"text": str, "entities": [[start: int, end: int, label: str], ...]}
+    intents:  {"text": str, "cats": {label: value}}
+              or {"text": str, "intents": {label: value} | [label, ...]}
+
+A record with both "cats" and "intents" uses "cats". Intent records are
+normalized to a cats dict (list entries become 1.0).
+
+The fastest available decoder is used:
+1. msgspec: decoding and schema validation both happen in C
+2. orjson: fast decoding, validation in Python
+3. json (stdlib)
+All three accept and reject the same records. Invalid lines are reported as
+"path:line - message".
+
+Usage:
+    from jsonl_reader import iter_records, iter_batches
+
+    errors = []
+    for record in iter_records(path, "entities", errors=errors):
+        record.text, record.entities, record.line
+    for batch in iter_batches(path, "intents", batch_size=1000):
+        ...
+
+    python cyber-train/jsonl_reader.py --base-dir cyber-train/entities-intent
+"""
+
+import argparse
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if msgspec is not None:
+    BACKEND = "msgspec"
+elif orjson is not None:
+    BACKEND = "orjson"
+else:
+    BACKEND = "json"
+
+KINDS = ("entities", "intents")
+
+
+class EntityRecord(NamedTuple):
+    """One NER example."""
+    text: str
+    entities: List[Tuple[int, int, str]]
+    line: int
+
+
+class IntentRecord(NamedTuple):
+    """One intent example; cats holds the raw label values."""
+    text: str
+    cats: Dict[str, Any]
+    line: int
+
+
+class JsonlError(NamedTuple):
+    """An invalid line."""
+    path: str
+    line: int
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.path}:{self.line} - {self.message}"
+
+
+class JsonlFormatError(ValueError):
+    """Raised for an invalid line when no error list is passed."""
+
+    def __init__(self, error: JsonlError):
+        super().__init__(str(error))
+        self.error = error
+
+
+# ---------------------------------------------------------------------------
+# Decoders: each returns a function bytes -> record that raises ValueError
+# ---------------------------------------------------------------------------
+
+if msgspec is not None:
+    class _EntityStruct(msgspec.Struct):
+        text: str
+        entities: List[Tuple[int, int, str]]
+
+    class _IntentStruct(msgspec.Struct):
+        text: str
+        cats: Union[Dict[str, Any], msgspec.UnsetType] = msgspec.UNSET
+        intents: Union[Dict[str, Any], List[str], msgspec.UnsetType] = msgspec.UNSET
+
+    _ENTITY_DECODER = msgspec.json.Decoder(_EntityStruct)
+    _INTENT_DECODER = msgspec.json.Decoder(_IntentStruct)
+    _ANY_DECODER = msgspec.json.Decoder()
+
+
+def _loads(line: bytes):
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def check_entity_record(item) -> List[Tuple[int, int, str]]:
+    """
+    Validate a decoded entity record and return its spans as tuples.
+
+    Python version of the schema check msgspec does; also usable on records
+    built in memory. Raises ValueError for invalid records.
+    """
+    if not isinstance(item, dict):
+        raise ValueError(f"Expected `object`, got `{type(item).__name__}`")
+    if not isinstance(item.get("text"), str):
+        raise ValueError("Object missing required field `text`" if "text" not in item
+                         else "Expected `str` - at `$.text`")
+    entities = item.get("entities")
+    if not isinstance(entities, list):
+        raise ValueError("Object missing required field `entities`" if "entities" not in item
+                         else "Expected `array` - at `$.entities`")
+    spans = []
+    for i, entity in enumerate(entities):
+        # bool is an int subclass, but msgspec (like JSON) treats it separately
+        if (not isinstance(entity, list) or len(entity) != 3
+                or type(entity[0]) is not int or type(entity[1]) is not int
+                or not isinstance(entity[2], str)):
+            raise ValueError(f"Expected `[int, int, str]` - at `$.entities[{i}]`")
+        spans.append(tuple(entity))
+    return spans
+
+
+def check_intent_record(item) -> Dict[str, Any]:
+    """
+    Validate a decoded intent record and return its normalized cats dict.
+
+    Python version of the schema check msgspec does; also usable on records
+    built in memory. Raises ValueError for invalid records.
+    """
+    if not isinstance(item, dict):
+        raise ValueError(f"Expected `object`, got `{type(item).__name__}`")
+    if not isinstance(item.get("text"), str):
+        raise ValueError("Object missing required field `text`" if "text" not in item
+                         else "Expected `str` - at `$.text`")
+    if "cats" in item:
+        if not isinstance(item["cats"], dict):
+            raise ValueError("Expected `object` - at `$.cats`")
+    if "intents" in item:
+        intents = item["intents"]
+        if isinstance(intents, list):
+            if not all(isinstance(label, str) for label in intents):
+                raise ValueError("Expected `str` - at `$.intents[...]`")
+        elif not isinstance(intents, dict):
+            raise ValueError("Expected `object | array` - at `$.intents`")
+    return _cats_of(item.get("cats"), item.get("intents"))
+
+
+def _cats_of(cats, intents) -> Dict[str, Any]:
+    if cats is not None:
+        return cats
+    if intents is None:
+        raise ValueError("Object missing required field `cats` or `intents`")
+    if isinstance(intents, list):
+        return {label: 1.0 for label in intents}
+    return intents
+
+
+def _make_decoder(kind: Optional[str]):
+    """Return decode(line_bytes, line_num) for a record kind (None: plain dicts)."""
+    if kind is not None and kind not in KINDS:
+        raise ValueError(f"Unknown record kind {kind!r}; expected one of {KINDS} or None")
+
+    if msgspec is not None:
+        if kind == "entities":
+            def decode(line, line_num):
+                record = _ENTITY_DECODER.decode(line)
+                return EntityRecord(record.text, record.entities, line_num)
+        elif kind == "intents":
+            def decode(line, line_num):
+                record = _INTENT_DECODER.decode(line)
+                cats = None if record.cats is msgspec.UNSET else record.cats
+                intents = None if record.intents is msgspec.UNSET else record.intents
+                return IntentRecord(record.text, _cats_of(cats, intents), line_num)
+        else:
+            def decode(line, line_num):
+                return _ANY_DECODER.decode(line)
+        return decode
+
+    if kind == "entities":
+        def decode(line, line_num):
+            item = _loads(line)
+            entities = check_entity_record(item)
+            return EntityRecord(item["text"], entities, line_num)
+    elif kind == "intents":
+        def decode(line, line_num):
+            item = _loads(line)
+            cats = check_intent_record(item)
+            return IntentRecord(item["text"], cats, line_num)
+    else:
+        def decode(line, line_num):
+            return _loads(line)
+    return decode
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def iter_records(path: Union[str, Path], kind: Optional[str],
+                 errors: Optional[List[JsonlError]] = None) -> Iterator:
+    """
+    Yield the valid records of a JSONL file in file order.
+
+    kind is "entities", "intents" or None (plain decoded objects, no schema).
+    Blank lines are skipped. Invalid lines are appended to `errors` when a
+    list is given; otherwise the first one raises JsonlFormatError.
+    """
+    decode = _make_decoder(kind)
+    # Both JSON decoding errors and schema errors subclass ValueError
+    # (msgspec.DecodeError, orjson.JSONDecodeError, json.JSONDecodeError)
+    with open(path, 'rb') as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield decode(line, line_num)
+            except (ValueError, TypeError) as e:
+                error = JsonlError(str(path), line_num, _describe(e))
+                if errors is None:
+                    raise JsonlFormatError(error) from e
+                errors.append(error)
+
+
+def iter_batches(path: Union[str, Path], kind: Optional[str], batch_size: int = 1000,
+                 errors: Optional[List[JsonlError]] = None) -> Iterator[list]:
+    """Like iter_records, but yield lists of up to batch_size records."""
+    batch = []
+    for record in iter_records(path, kind, errors):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_records(path: Union[str, Path], kind: Optional[str]) -> Tuple[list, List[JsonlError]]:
+    """Read a whole file; return (records, errors)."""
+    errors = []
+    records = list(iter_records(path, kind, errors))
+    return records, errors
+
+
+def _describe(error: Exception) -> str:
+    """Prefix JSON syntax errors the way the scripts always have."""
+    message = str(error)
+    is_syntax_error = isinstance(error, json.JSONDecodeError)
+    if orjson is not None and isinstance(error, orjson.JSONDecodeError):
+        is_syntax_error = True
+    if msgspec is not None and isinstance(error, msgspec.DecodeError) \
+            and not isinstance(error, msgspec.ValidationError):
+        is_syntax_error = True
+    return f"JSON decode error: {message}" if is_syntax_error else f"Invalid format: {message}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate entity and intent JSONL files with the shared schema"
+    )
+    parser.add_argument(
+        "--base-dir",
+        default="cyber-train/entities-intent",
+        help="Base directory containing JSONL files"
+    )
+    parser.add_argument(
+        "--max-errors",
+        type=int,
+        default=20,
+        help="Invalid lines to print (default: 20)"
+    )
+    args = parser.parse_args()
+
+    base_dir = Path(args.base_dir)
+    print(f"Decoder backend: {BACKEND}")
+    counts = Counter()
+    errors = []
+    for kind, pattern in (("entities", "*_entities.jsonl"), ("intents", "*_intent.jsonl")):
+        for file_path in sorted(base_dir.rglob(pattern)):
+            for _ in iter_records(file_path, kind, errors):
+                counts[kind] += 1
+
+    print(f"✅ {counts['entities']} valid entity and {counts['intents']} valid intent records")
+    if errors:
+        print(f"⚠️  {len(errors)} invalid lines")
+        for error in errors[:args.max_errors]:
+            print(f"   {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Combine the NER and intent models into one spaCy pipeline.
+
+The two models are trained separately and, used as two Language objects,
+tokenize every text twice and keep two vocabularies in memory. This script:
+1. merge: starts from the NER pipeline (tokenizer, tok2vec, ner) and sources
+   textcat_multilabel from the intent pipeline, so one nlp(text) call sets
+   both doc.ents and doc.cats. A textcat that listens to the intent
+   pipeline's own tok2vec gets a private copy of it first. The merged
+   pipeline is checked against the two originals on sample texts (same
+   entities, same scores) and timed against them.
+2. joint-config: writes a config that trains ner and textcat_multilabel on
+   one shared tok2vec (textcat as TextCatEnsemble: BOW + the shared
+   embeddings), plus a corpus directory holding both training sets. Entity
+   docs have no cats and intent docs no entity annotation, and spaCy treats
+   both as missing, so each component only learns from its own examples.
+
+Usage:
+    python cyber-train/merge_pipelines.py merge \\
+        --ner cyber-train/models/ner_model/model-best \\
+        --intent cyber-train/models/intent_model/model-best \\
+        --output cyber-train/models/combined_model
+    python cyber-train/merge_pipelines.py joint-config \\
+        --data-dir cyber-train/spacy-training --output cyber-train/models/joint
+    python cyber-train/training_driver.py cyber-train/models/joint/config_joint.cfg \\
+        --output cyber-train/models/joint_model --code cyber-train/corpus_readers.py
+"""
+
+import argparse
+import shutil
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import spacy
+from spacy import util
+
+from corpus_readers import pillars_path, sparse_cats_path
+
+TEXTCAT = "textcat_multilabel"
+
+SAMPLE_TEXTS = [
+    "APT41 used WannaCry malware to attack IP 192.168.1.1. CVE-2021-44228 was exploited.",
+    "Investigate the suspicious login from 10.0.0.1 and reset the admin credentials",
+    "Verify the source of this viral video and check if the image is authentic",
+    "Domain example.com uses nameserver ns1.example.com and is hosted at AWS-US-EAST-1",
+    "Execute the incident response playbook for ransomware containment",
+]
+
+
+def merge_pipelines(ner_path: Path, intent_path: Path):
+    """Return the NER pipeline with the intent textcat sourced into it."""
+    nlp = spacy.load(ner_path)
+    intent_nlp = spacy.load(intent_path)
+    if TEXTCAT not in intent_nlp.pipe_names:
+        raise ValueError(f"{intent_path} has no {TEXTCAT} component (pipeline: {intent_nlp.pipe_names})")
+    if TEXTCAT in nlp.pipe_names:
+        raise ValueError(f"{ner_path} already has a {TEXTCAT} component")
+
+    # The NER pipeline's tok2vec keeps its name, so a textcat listening to
+    # the intent pipeline's tok2vec must carry its own copy
+    for tok2vec_name in intent_nlp.pipe_names:
+        component = intent_nlp.get_pipe(tok2vec_name)
+        if TEXTCAT in getattr(component, "listening_components", []):
+            intent_nlp.replace_listeners(tok2vec_name, TEXTCAT, ["model.tok2vec"])
+            print(f"🧩 {TEXTCAT} now has its own copy of {tok2vec_name}")
+
+    nlp.add_pipe(TEXTCAT, source=intent_nlp)
+    nlp.meta["name"] = "combined_model"
+    nlp.meta["description"] = f"NER from {ner_path} and intents from {intent_path}"
+    nlp.meta["performance"] = {**intent_nlp.meta.get("performance", {}),
+                               **nlp.meta.get("performance", {})}
+    return nlp
+
+
+def verify_merged(nlp, ner_path: Path, intent_path: Path, texts: List[str],
+                  tolerance: float = 1e-5) -> bool:
+    """Check the merged pipeline gives the originals' entities and scores, and time both setups."""
+    ner_nlp = spacy.load(ner_path)
+    intent_nlp = spacy.load(intent_path)
+
+    started = time.perf_counter()
+    ner_docs = list(ner_nlp.pipe(texts))
+    intent_docs = list(intent_nlp.pipe(texts))
+    separate_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    merged_docs = list(nlp.pipe(texts))
+    merged_seconds = time.perf_counter() - started
+
+    mismatches = 0
+    for ner_doc, intent_doc, doc in zip(ner_docs, intent_docs, merged_docs):
+        ents = [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+        expected = [(ent.start_char, ent.end_char, ent.label_) for ent in ner_doc.ents]
+        max_diff = max((abs(doc.cats[label] - score) for label, score in intent_doc.cats.items()),
+                       default=0.0)
+        if ents != expected or max_diff > tolerance:
+            mismatches += 1
+            if mismatches <= 3:
+                print(f"   ⚠️  Differs: {doc.text[:60]!r} (entities equal: {ents == expected}, "
+                      f"max score diff {max_diff:.2e})")
+
+    print(f"\n📊 {len(texts)} texts: two pipelines {separate_seconds:.2f}s, "
+          f"merged {merged_seconds:.2f}s ({separate_seconds / merged_seconds:.2f}x)"
+          if merged_seconds else f"\n📊 {len(texts)} texts")
+    if mismatches:
+        print(f"❌ {mismatches} of {len(texts)} texts differ from the separate pipelines")
+        return False
+    print(f"✅ Merged pipeline matches the separate pipelines on all {len(texts)} texts")
+    return True
+
+
+def load_texts(path: Optional[Path], limit: int) -> List[str]:
+    """Texts from a .spacy file or a text file (one per line), else the built-in samples."""
+    if path is None:
+        return SAMPLE_TEXTS
+    if path.suffix == ".spacy":
+        from spacy.tokens import DocBin
+        texts = [doc.text for doc in DocBin().from_disk(path).get_docs(spacy.blank("en").vocab)]
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            texts = [line.strip() for line in f if line.strip()]
+    return texts[:limit] if limit else texts
+
+
+def _dir_size_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file()) / 1024 / 1024
+
+
+# ---------------------------------------------------------------------------
+# Joint training config
+# ---------------------------------------------------------------------------
+
+def joint_config(intent_config: Optional[Path] = None):
+    """ner + textcat_multilabel on one shared tok2vec."""
+    from spacy.cli.init_config import init_config
+
+    config = init_config(lang="en", pipeline=["ner", TEXTCAT], optimize="efficiency", silent=True)
+    textcat = config["components"][TEXTCAT]
+    linear_model = dict(textcat["model"])
+    if intent_config is not None and intent_config.exists():
+        # Keep the BOW settings tuned for the intent model (hash length, n-grams)
+        tuned = util.load_config(intent_config, interpolate=False)["components"][TEXTCAT]["model"]
+        if tuned.get("@architectures", "").startswith("spacy.TextCatBOW"):
+            linear_model = dict(tuned)
+    linear_model.pop("nO", None)
+    textcat["model"] = {
+        "@architectures": "spacy.TextCatEnsemble.v2",
+        "nO": None,
+        "linear_model": linear_model,
+        "tok2vec": {
+            "@architectures": "spacy.Tok2VecListener.v1",
+            "width": "${components.tok2vec.model.encode.width}",
+            "upstream": "tok2vec",
+        },
+    }
+    return config
+
+
+def write_joint_corpus(data_dir: Path, corpus_dir: Path) -> dict:
+    """Link the entity and intent files of each split into <corpus_dir>/<split>/."""
+    paths = {}
+    for split in ("train", "dev"):
+        split_dir = corpus_dir / split
+        split_dir.mkdir(parents=True, exist_ok=True)
+        for prefix in ("entities", "intents"):
+            source = data_dir / f"{prefix}_{split}.spacy"
+            if not source.exists():
+                raise FileNotFoundError(f"{source} not found; run prepare_spacy_training.py first")
+            for path in (source, sparse_cats_path(source), pillars_path(source)):
+                if not path.exists():
+                    continue
+                target = split_dir / path.name
+                if target.exists() or target.is_symlink():
+                    target.unlink()
+                try:
+                    target.symlink_to(path.resolve())
+                except OSError:
+                    shutil.copy2(path, target)
+        paths[split] = split_dir
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Combine NER and intent models into one pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    merge_parser = subparsers.add_parser("merge", help="Merge two trained pipelines")
+    merge_parser.add_argument("--ner", default="cyber-train/models/ner_model/model-best", help="NER pipeline")
+    merge_parser.add_argument("--intent", default="cyber-train/models/intent_model/model-best",
+                              help="Intent pipeline")
+    merge_parser.add_argument("--output", default="cyber-train/models/combined_model",
+                              help="Output pipeline directory")
+    merge_parser.add_argument("--texts", help="Texts to verify on (.spacy or one text per line)")
+    merge_parser.add_argument("--limit", type=int, default=1000, help="Max texts to verify on (default: 1000)")
+    merge_parser.add_argument("--skip-verify", action="store_true", help="Don't compare with the originals")
+
+    joint_parser = subparsers.add_parser("joint-config", help="Config for training both on one tok2vec")
+    joint_parser.add_argument("--data-dir", default="cyber-train/spacy-training",
+                              help="Directory with entities_*/intents_* .spacy files")
+    joint_parser.add_argument("--output", default="cyber-train/models/joint",
+                              help="Directory for config_joint.cfg and the joint corpus")
+    joint_parser.add_argument("--intent-config", default="cyber-train/models/configs/config_intent.cfg",
+                              help="Intent config whose BOW settings to keep")
+
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        ner_path, intent_path, output = Path(args.ner), Path(args.intent), Path(args.output)
+        print(f"📦 Merging {ner_path} + {intent_path}")
+        nlp = merge_pipelines(ner_path, intent_path)
+        print(f"✅ Pipeline: {nlp.pipe_names}")
+        if not args.skip_verify:
+            texts = load_texts(Path(args.texts) if args.texts else None, args.limit)
+            if not verify_merged(nlp, ner_path, intent_path, texts):
+                print("   Not saving the merged pipeline")
+                return
+        nlp.to_disk(output)
+        separate = _dir_size_mb(ner_path) + _dir_size_mb(intent_path)
+        print(f"💾 Saved to {output} ({_dir_size_mb(output):.1f} MB; separate models {separate:.1f} MB)")
+        print(f"   nlp = spacy.load('{output}'); doc = nlp(text) → doc.ents, doc.cats")
+
+    elif args.command == "joint-config":
+        output = Path(args.output)
+        output.mkdir(parents=True, exist_ok=True)
+        corpus = write_joint_corpus(Path(args.data_dir), output / "corpus")
+        config = joint_config(Path(args.intent_config) if args.intent_config else None)
+        config["paths"]["train"] = str(corpus["train"])
+        config["paths"]["dev"] = str(corpus["dev"])
+        if any(sparse_cats_path(path).exists() for path in corpus["train"].glob("*.spacy")):
+            # Sparse intent sidecars need the custom reader
+            for name in ("train", "dev"):
+                config["corpora"][name]["@readers"] = "cyber.SparseIntentCorpus.v1"
+        config_path = output / "config_joint.cfg"
+        config.to_disk(config_path)
+        print(f"✅ Joint config: {config_path}")
+        print(f"   Corpus: {output / 'corpus'} (entity and intent files per split)")
+        print(f"   Train with: python cyber-train/training_driver.py {config_path} "
+              f"--output <model dir> --code cyber-train/corpus_readers.py")
+
+
+if __name__ == "__main__":
+    main()
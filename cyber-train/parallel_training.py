@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Run several training jobs at once, each pinned to its own share of the CPUs.
+
+The NER and intent models train independently and neither keeps a many-core
+machine busy, so train_spacy_models.py --parallel starts both as separate
+processes. Each job gets:
+- a disjoint set of cores (os.sched_setaffinity, Linux only)
+- OMP/OpenBLAS/MKL/numexpr thread counts equal to its core count, so the
+  BLAS pools of the two jobs don't oversubscribe the machine
+- unbuffered output, merged line by line into the console and one log file
+  with a [job] prefix
+
+Used by train_spacy_models.py; see split_cores() and run_jobs().
+"""
+
+import os
+import subprocess
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+# Thread pool sizes honoured by numpy's BLAS backends and thinc
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+class TrainingJob(NamedTuple):
+    """One training command to run with a CPU budget."""
+    name: str
+    cmd: List[str]
+    cores: List[int]
+
+
+def available_cores() -> List[int]:
+    """Cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cores(names: Sequence[str], shares: Optional[Dict[str, int]] = None,
+                cores: Optional[List[int]] = None) -> Dict[str, List[int]]:
+    """
+    Partition the available cores between jobs.
+
+    `shares` fixes the core count of some jobs; the remaining cores are split
+    evenly between the others. With fewer cores than jobs every job gets all
+    cores (they then share them).
+    """
+    cores = list(cores) if cores is not None else available_cores()
+    shares = dict(shares or {})
+    if len(cores) < len(names):
+        return {name: list(cores) for name in names}
+
+    fixed = sum(shares.get(name, 0) for name in names)
+    if fixed > len(cores) or (fixed == len(cores) and len(shares) < len(names)):
+        raise ValueError(f"Requested {fixed} cores but only {len(cores)} are available")
+    flexible = [name for name in names if not shares.get(name)]
+    remaining = len(cores) - fixed
+    for i, name in enumerate(flexible):
+        # Spread the remainder over the first jobs
+        shares[name] = remaining // len(flexible) + (1 if i < remaining % len(flexible) else 0)
+
+    partition = {}
+    start = 0
+    for name in names:
+        partition[name] = cores[start:start + shares[name]]
+        start += shares[name]
+    return partition
+
+
+def limit_blas_threads(threads: int):
+    """
+    Set the thread-count variables in this process's environment.
+
+    Only effective before numpy/spaCy are imported, e.g. in the initializer
+    of a spawn-context process pool.
+    """
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+
+
+def job_env(cores: List[int]) -> Dict[str, str]:
+    """Environment for a job limited to `cores`."""
+    env = dict(os.environ)
+    for var in THREAD_ENV_VARS:
+        env[var] = str(len(cores))
+    env["PYTHONUNBUFFERED"] = "1"
+    return env
+
+
+def _pin(pid: int, cores: List[int]):
+    """
+    Restrict a just-started process to `cores`.
+
+    Done from the parent after Popen rather than in a preexec_fn, which is
+    unsafe once the pump threads of earlier jobs are running. The child is
+    still single-threaded then, so the BLAS threads it starts later inherit
+    the mask.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        os.sched_setaffinity(pid, cores)
+    except ProcessLookupError:
+        pass
+
+
+def run_jobs(jobs: List[TrainingJob], log_path: Path) -> Dict[str, bool]:
+    """
+    Start all jobs, stream their merged output, and wait for them.
+
+    Returns job name -> success. Ctrl+C from the terminal reaches every job
+    (the in-process driver then writes a checkpoint before exiting).
+    """
+    log_path = Path(log_path)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    width = max(len(job.name) for job in jobs)
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    with open(log_path, 'a', encoding='utf-8') as log:
+        def emit(name: str, line: str):
+            text = f"[{name:<{width}}] {line}"
+            with lock:
+                print(text, flush=True)
+                log.write(f"{datetime.now().strftime('%H:%M:%S')} {text}\n")
+                log.flush()
+
+        processes = {}
+        readers = []
+        for job in jobs:
+            emit(job.name, f"🚀 {len(job.cores)} cores {_core_ranges(job.cores)}: {' '.join(job.cmd)}")
+            process = subprocess.Popen(
+                job.cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                encoding='utf-8',
+                errors='replace',
+                bufsize=1,
+                env=job_env(job.cores),
+            )
+            _pin(process.pid, job.cores)
+            processes[job.name] = process
+
+            def pump(name=job.name, stream=process.stdout):
+                for line in stream:
+                    emit(name, line.rstrip("\n"))
+
+            reader = threading.Thread(target=pump, daemon=True)
+            reader.start()
+            readers.append(reader)
+
+        try:
+            for process in processes.values():
+                process.wait()
+        except KeyboardInterrupt:
+            # The children got the SIGINT from the terminal too; give them time
+            # to checkpoint before giving up on them
+            for process in processes.values():
+                try:
+                    process.wait(timeout=120)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+            raise
+        finally:
+            for reader in readers:
+                reader.join()
+
+        results = {}
+        for name, process in processes.items():
+            results[name] = process.returncode == 0
+            status = "✅ finished" if results[name] else f"❌ exited with code {process.returncode}"
+            emit(name, status)
+        emit("all", f"⏱️  Wall time {time.perf_counter() - started:.1f}s")
+    return results
+
+
+def _core_ranges(cores: List[int]) -> str:
+    """Format [0, 1, 2, 5] as "0-2,5"."""
+    ranges = []
+    for core in cores:
+        if ranges and core == ranges[-1][1] + 1:
+            ranges[-1][1] = core
+        else:
+            ranges.append([core, core])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Deterministic entity extraction for pattern-shaped entity types.
+
+IPs, CVEs, hashes, emails, wallets, ATT&CK technique IDs, URLs and the terms
+in catalogs/*.txt (tools, threat actors, malware, LLM models ...) don't need a
+statistical model. The "cyber_pattern_ruler" component labels them before
+`ner` runs:
+1. Regexes (the audit patterns) run over doc.text; matches that line up with
+   token boundaries become entities.
+2. A PhraseMatcher built from the catalogs matches the catalog terms
+   (case-sensitive by default, phrase_attr="LOWER" to ignore case).
+3. Overlapping matches keep the longest; entities already on the doc are kept
+   unless overwrite_ents is set.
+
+`ner` keeps preset entities and only predicts around them, so the rest of
+the pipeline is unchanged. With pattern_only() the statistical components
+are switched off altogether (only the tokenizer, the ruler and the entity
+filter run), which is enough for most IOC lookups.
+
+Usage:
+    python cyber-train/pattern_ruler.py add --model cyber-train/models/ner_model/model-best \\
+        --output cyber-train/models/ner_model/model-patterns
+    python cyber-train/pattern_ruler.py extract --text "Block 10.0.0.1 (CVE-2021-44228)" --pattern-only
+    python cyber-train/pattern_ruler.py extract --model <model> --texts queries.txt --benchmark
+"""
+
+import argparse
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import spacy
+import srsly
+from spacy.language import Language
+from spacy.matcher import PhraseMatcher
+from spacy.tokens import Doc, Span
+from spacy.util import filter_spans
+
+CATALOG_DIR = Path(__file__).resolve().parent / "catalogs"
+
+PATTERN_RULER = "cyber_pattern_ruler"
+
+# Audit regexes (audit_training_data.py, comprehensive_quality_audit_final.py),
+# in priority order for equal-length overlaps
+REGEX_PATTERNS = {
+    'URL': re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+[^\s<>"{}|\\^`\[\].,;:!?)\']'),
+    'EMAIL_ADDRESS': re.compile(r'\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b'),
+    'CVE_ID': re.compile(r'\bCVE-\d{4}-\d{4,7}\b', re.IGNORECASE),
+    'IP_ADDRESS': re.compile(r'\b(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\b'),
+    'HASH': re.compile(r'\b(?:[a-fA-F0-9]{64}|[a-fA-F0-9]{40}|[a-fA-F0-9]{32})\b'),
+    'WALLET_ADDRESS': re.compile(r'\b(?:0x[a-fA-F0-9]{40}|bc1[a-z0-9]{25,39}|[13][a-km-zA-HJ-NP-Z1-9]{25,34})\b'),
+    'TECHNIQUE_ID': re.compile(r'\b(?:T\d{4}(?:\.\d{3})?|TA\d{4})\b'),
+}
+
+# Catalog file -> entity label (domain/file extension lists are hints, not entities)
+CATALOG_LABELS = {
+    'tools.txt': 'TOOL',
+    'threat_actors.txt': 'THREAT_ACTOR',
+    'malware_types.txt': 'MALWARE_TYPE',
+    'llm_models.txt': 'LLM_MODEL',
+    'llm_providers.txt': 'LLM_PROVIDER',
+    'cloud_providers.txt': 'CLOUD_PROVIDER',
+    'compliance_frameworks.txt': 'COMPLIANCE_FRAMEWORK',
+    'protocol_types.txt': 'PROTOCOL_TYPE',
+}
+
+
+def load_catalog(path: Path) -> List[str]:
+    """Terms of one catalog file (one per line, # comments)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def load_catalogs(catalog_dir: Path = CATALOG_DIR) -> Dict[str, List[str]]:
+    """
+    Label -> terms for every known catalog in catalog_dir.
+
+    A term listed in two catalogs keeps the label of the first one (in
+    CATALOG_LABELS order); a PhraseMatcher can only give a span one label.
+    """
+    catalogs = {}
+    seen = set()
+    for filename, label in CATALOG_LABELS.items():
+        path = Path(catalog_dir) / filename
+        if not path.exists():
+            continue
+        terms = [term for term in load_catalog(path) if term not in seen]
+        seen.update(terms)
+        catalogs.setdefault(label, []).extend(terms)
+    return catalogs
+
+
+class PatternRuler:
+    """Regex + catalog entity labelling; the "cyber_pattern_ruler" component."""
+
+    def __init__(self, nlp: Language, name: str = PATTERN_RULER, use_regexes: bool = True,
+                 phrase_attr: str = "ORTH", overwrite_ents: bool = False):
+        self.nlp = nlp
+        self.name = name
+        self.use_regexes = use_regexes
+        self.phrase_attr = phrase_attr
+        self.overwrite_ents = overwrite_ents
+        self.catalogs: Dict[str, List[str]] = {}
+        self.matcher = PhraseMatcher(nlp.vocab, attr=phrase_attr)
+
+    def add_catalogs(self, catalogs: Dict[str, List[str]]):
+        """Add label -> terms to the phrase matcher."""
+        make_doc = self.nlp.make_doc
+        for label, terms in catalogs.items():
+            terms = [term for term in terms if term not in self.catalogs.get(label, ())]
+            if not terms:
+                continue
+            self.catalogs.setdefault(label, []).extend(terms)
+            self.matcher.add(label, [make_doc(term) for term in terms])
+
+    @property
+    def labels(self) -> List[str]:
+        regex_labels = list(REGEX_PATTERNS) if self.use_regexes else []
+        return regex_labels + [label for label in self.catalogs if label not in regex_labels]
+
+    def match(self, doc: Doc) -> List[Span]:
+        """Non-overlapping pattern and catalog spans (longest wins)."""
+        spans = []
+        if self.use_regexes:
+            text = doc.text
+            for label, pattern in REGEX_PATTERNS.items():
+                for m in pattern.finditer(text):
+                    # Only spans that line up with tokens; the rest is left to ner
+                    span = doc.char_span(m.start(), m.end(), label=label)
+                    if span is not None:
+                        spans.append(span)
+        if self.catalogs:
+            spans.extend(self.matcher(doc, as_spans=True))
+        return filter_spans(spans)
+
+    def __call__(self, doc: Doc) -> Doc:
+        spans = self.match(doc)
+        if not spans:
+            return doc
+        if self.overwrite_ents:
+            doc.ents = filter_spans(spans + [ent for ent in doc.ents])
+        else:
+            taken = set()
+            for ent in doc.ents:
+                taken.update(range(ent.start, ent.end))
+            new = [span for span in spans if not taken.intersection(range(span.start, span.end))]
+            if new:
+                doc.ents = list(doc.ents) + new
+        return doc
+
+    def pipe(self, stream: Iterable[Doc], batch_size: int = 128) -> Iterator[Doc]:
+        for doc in stream:
+            yield self(doc)
+
+    # The catalogs are saved with the pipeline; the regexes live in this module
+    def to_disk(self, path, exclude=tuple()):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        srsly.write_json(path / "catalogs.json", self.catalogs)
+
+    def from_disk(self, path, exclude=tuple()):
+        catalogs_path = Path(path) / "catalogs.json"
+        if catalogs_path.exists():
+            self.add_catalogs(srsly.read_json(catalogs_path))
+        return self
+
+    def to_bytes(self, exclude=tuple()) -> bytes:
+        return srsly.msgpack_dumps({"catalogs": self.catalogs})
+
+    def from_bytes(self, bytes_data: bytes, exclude=tuple()):
+        self.add_catalogs(srsly.msgpack_loads(bytes_data)["catalogs"])
+        return self
+
+
+@Language.factory(
+    PATTERN_RULER,
+    default_config={"use_regexes": True, "phrase_attr": "ORTH", "overwrite_ents": False},
+)
+def create_pattern_ruler(nlp: Language, name: str, use_regexes: bool, phrase_attr: str,
+                         overwrite_ents: bool) -> PatternRuler:
+    return PatternRuler(nlp, name, use_regexes=use_regexes, phrase_attr=phrase_attr,
+                        overwrite_ents=overwrite_ents)
+
+
+def add_pattern_ruler(nlp: Language, catalog_dir: Optional[Path] = CATALOG_DIR,
+                      **config) -> PatternRuler:
+    """Add the ruler in front of ner (or last without ner), loaded with the catalogs."""
+    if PATTERN_RULER in nlp.pipe_names:
+        return nlp.get_pipe(PATTERN_RULER)
+    position = {"before": "ner"} if "ner" in nlp.pipe_names else {}
+    ruler = nlp.add_pipe(PATTERN_RULER, config=config, **position)
+    if catalog_dir is not None:
+        ruler.add_catalogs(load_catalogs(catalog_dir))
+    return ruler
+
+
+def pattern_pipeline(catalog_dir: Path = CATALOG_DIR, lang: str = "en", **config) -> Language:
+    """A blank pipeline with only the ruler, for pattern-only extraction without a model."""
+    nlp = spacy.blank(lang)
+    add_pattern_ruler(nlp, catalog_dir, **config)
+    return nlp
+
+
+@contextmanager
+def pattern_only(nlp: Language):
+    """Run only the ruler (and the entity filter, if present) inside this block."""
+    try:
+        from fix_entity_extraction import ENTITY_FILTER_COMPONENT
+    except ImportError:
+        ENTITY_FILTER_COMPONENT = None
+    enable = [name for name in nlp.pipe_names if name in (PATTERN_RULER, ENTITY_FILTER_COMPONENT)]
+    if PATTERN_RULER not in enable:
+        raise ValueError(f"No {PATTERN_RULER} in the pipeline {nlp.pipe_names}; use add_pattern_ruler()")
+    with nlp.select_pipes(enable=enable):
+        yield nlp
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regex/catalog entity ruler in front of NER")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="Add the ruler to a pipeline and save it")
+    add_parser.add_argument("--model", required=True, help="Pipeline with ner")
+    add_parser.add_argument("--output", required=True, help="Output pipeline directory")
+    add_parser.add_argument("--catalogs", default=str(CATALOG_DIR), help="Catalog directory")
+    add_parser.add_argument("--ignore-case", action="store_true", help="Match catalog terms case-insensitively")
+
+    extract_parser = subparsers.add_parser("extract", help="Extract entities")
+    extract_parser.add_argument("--model", help="Pipeline (default: blank pipeline with only the ruler)")
+    extract_parser.add_argument("--catalogs", default=str(CATALOG_DIR), help="Catalog directory")
+    extract_parser.add_argument("--text", help="One text")
+    extract_parser.add_argument("--texts", help="Text file, one text per line")
+    extract_parser.add_argument("--pattern-only", action="store_true", help="Skip ner (and everything else)")
+    extract_parser.add_argument("--benchmark", action="store_true",
+                                help="Time pattern-only against the full pipeline instead of printing")
+
+    args = parser.parse_args()
+
+    if args.command == "add":
+        nlp = spacy.load(args.model)
+        ruler = add_pattern_ruler(nlp, Path(args.catalogs),
+                                  phrase_attr="LOWER" if args.ignore_case else "ORTH")
+        terms = sum(len(terms) for terms in ruler.catalogs.values())
+        print(f"✅ Pipeline: {nlp.pipe_names}")
+        print(f"   {len(REGEX_PATTERNS)} regexes, {terms} catalog terms for {len(ruler.catalogs)} labels")
+        nlp.to_disk(args.output)
+        print(f"💾 Saved to {args.output}")
+        return
+
+    if args.model:
+        nlp = spacy.load(args.model)
+        add_pattern_ruler(nlp, Path(args.catalogs))
+        try:
+            from fix_entity_extraction import add_entity_filter
+            add_entity_filter(nlp)
+        except ImportError:
+            pass
+    else:
+        nlp = pattern_pipeline(Path(args.catalogs))
+    if args.text:
+        texts = [args.text]
+    elif args.texts:
+        with open(args.texts, 'r', encoding='utf-8') as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        parser.error("extract needs --text or --texts")
+
+    if args.benchmark:
+        with pattern_only(nlp):
+            started = time.perf_counter()
+            pattern_ents = sum(len(doc.ents) for doc in nlp.pipe(texts))
+            pattern_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        full_ents = sum(len(doc.ents) for doc in nlp.pipe(texts))
+        full_seconds = time.perf_counter() - started
+        print(f"📊 {len(texts)} texts")
+        print(f"   Pattern-only: {pattern_seconds * 1e6 / len(texts):8.1f} µs/text, {pattern_ents} entities")
+        print(f"   Full:         {full_seconds * 1e6 / len(texts):8.1f} µs/text, {full_ents} entities "
+              f"({nlp.pipe_names})")
+        return
+
+    if args.pattern_only:
+        with pattern_only(nlp):
+            docs = list(nlp.pipe(texts))
+    else:
+        docs = list(nlp.pipe(texts))
+    for doc in docs:
+        print(f"\n📝 {doc.text}")
+        for ent in doc.ents:
+            print(f"   • {ent.text} → {ent.label_}")
+
+
+if __name__ == "__main__":
+    main()
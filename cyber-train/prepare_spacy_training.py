@@ -8,29 +8,305 @@ This script:
 2. Validates data format and quality
 3. Converts JSONL to spaCy's .spacy format
 4. Splits data into train/dev/test sets
-5. Generates statistics and reports
+5. Generates statistics and reports (preparation_report.txt and a
+   machine-readable preparation_report.json with per-stage timings)
 """
 
+import hashlib
 import json
+import os
+import time
+import tracemalloc
+import numpy as np
 import spacy
-from spacy.tokens import DocBin
+from spacy.strings import get_string_id
+from spacy.tokens import Doc, DocBin, Span
 from pathlib import Path
 import random
 from collections import Counter, defaultdict
-from typing import List, Dict, Tuple, Set
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Iterable, Tuple, Set
 import argparse
 from datetime import datetime
 
+from corpus_dedup import CorpusDeduplicator, normalize_text
+from corpus_readers import (PILLAR_KEY, encode_sparse_cats, load_pillars, pillars_path, save_pillars,
+                            save_sparse_cats, sparse_cats_path)
+from stage_profiler import StageProfiler, peak_rss_mb
+from jsonl_reader import check_entity_record, check_intent_record, iter_records
+
 # Set random seed for reproducibility
 random.seed(42)
 
+# Bump when conversion output changes so cached DocBin shards are rebuilt
+CACHE_VERSION = 6
+
+# Per-kind file patterns, output names and report wording
+KIND_SETTINGS = {
+    "entities": {
+        "noun": "entity",
+        "task": "NER TRAINING",
+        "pattern": "*_entities.jsonl",
+        "prefix": "entities",
+        "labels_file": "entity_labels.txt",
+    },
+    "intents": {
+        "noun": "intent",
+        "task": "TEXT CLASSIFICATION TRAINING",
+        "pattern": "*_intent.jsonl",
+        "prefix": "intents",
+        "labels_file": "intent_labels.txt",
+    },
+}
+
+# Doc.spans.to_bytes() of a doc without span groups (an empty msgpack list)
+_NO_SPAN_GROUPS = b"\x90"
+
+
+class PillarDocBin(DocBin):
+    """
+    DocBin that keeps every doc's source pillar in a list next to the docs.
+    
+    Docs carry their pillar in doc.user_data["pillar"] while they are built,
+    but DocBin's store_user_data packs a msgpack dict per doc through srsly's
+    hook registry, which tripled preparation time. The pillars follow the
+    docs through add/merge/get_docs instead and are written to the
+    <name>.pillars.npz sidecar that corpus_readers reads back.
+    """
+    
+    def __init__(self, docs: Iterable = ()):
+        self.pillars: List = []
+        super().__init__(docs=docs)
+    
+    def add(self, doc: Doc):
+        super().add(doc)
+        self.pillars.append(doc.user_data.get(PILLAR_KEY))
+    
+    def merge(self, other: DocBin):
+        super().merge(other)
+        self.pillars.extend(getattr(other, "pillars", [None] * len(other)))
+    
+    def get_docs(self, vocab):
+        for doc, pillar in zip(super().get_docs(vocab), self.pillars):
+            if pillar is not None:
+                doc.user_data[PILLAR_KEY] = pillar
+            yield doc
+    
+    def from_bytes(self, bytes_data: bytes, pillars: List = None) -> "PillarDocBin":
+        super().from_bytes(bytes_data)
+        self.pillars = list(pillars) if pillars is not None else [None] * len(self)
+        return self
+    
+    def to_disk(self, path):
+        super().to_disk(path)
+        save_pillars(pillars_path(path), self.pillars)
+    
+    def from_disk(self, path) -> "PillarDocBin":
+        super().from_disk(path)
+        sidecar = pillars_path(path)
+        if sidecar.exists():
+            self.pillars = load_pillars(sidecar)
+        return self
+    
+    @classmethod
+    def select(cls, doc_bins: List["PillarDocBin"], refs: List[Tuple[int, int]]) -> "PillarDocBin":
+        """
+        DocBin of the (bin index, doc index) docs in `refs`, in that order.
+        
+        The stored token arrays are copied over without building Doc objects.
+        The string table keeps just the strings the selected docs use, as
+        add() would have collected them, so the output is the same as adding
+        the docs one by one.
+        """
+        selected = cls()
+        for bin_index, doc_index in refs:
+            source = doc_bins[bin_index]
+            selected.tokens.append(source.tokens[doc_index])
+            selected.spaces.append(source.spaces[doc_index])
+            selected.cats.append(source.cats[doc_index])
+            selected.span_groups.append(source.span_groups[doc_index])
+            selected.flags.append(source.flags[doc_index])
+            selected.user_data.append(None)
+            selected.pillars.append(source.pillars[doc_index])
+        
+        sources = {bin_index for bin_index, _ in refs}
+        if any(groups not in (b"", _NO_SPAN_GROUPS) for groups in selected.span_groups):
+            # Span labels live in the serialized groups; keep every string
+            for bin_index in sources:
+                selected.strings.update(doc_bins[bin_index].strings)
+            return selected
+        by_hash = {}
+        for bin_index in sources:
+            by_hash.update((get_string_id(string), string) for string in doc_bins[bin_index].strings)
+        if selected.tokens:
+            used = np.unique(np.concatenate([tokens.ravel() for tokens in selected.tokens]))
+            selected.strings = {by_hash[key] for key in used.tolist() if key in by_hash}
+        return selected
+
+
+# Blank pipelines are cached per process so pool workers only build them once
+_BLANK_NLP_CACHE = {}
+
+
+def _get_blank_nlp(lang: str = "en"):
+    """Return a cached blank pipeline for tokenization."""
+    if lang not in _BLANK_NLP_CACHE:
+        _BLANK_NLP_CACHE[lang] = spacy.blank(lang)
+    return _BLANK_NLP_CACHE[lang]
+
+
+def assign_split(text: str, train_ratio: float = 0.7, dev_ratio: float = 0.15) -> str:
+    """
+    Deterministically assign a text to "train", "dev" or "test".
+    
+    The bucket comes from a stable hash of the normalized text, so the
+    assignment does not depend on RNG state or corpus order, stays put when
+    other records are added, and exact duplicates always share a split.
+    """
+    digest = hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=8).digest()
+    position = int.from_bytes(digest, "big") / 2**64
+    if position < train_ratio:
+        return "train"
+    if position < train_ratio + dev_ratio:
+        return "dev"
+    return "test"
+
+
+def align_entity_spans(doc, entities: List[list], counts: Counter = None) -> List:
+    """
+    Align character-offset entities to token spans and drop overlaps.
+    
+    Matches Doc.char_span: "contract" alignment (tokens fully inside the
+    offsets) is used when it yields at least one token, otherwise "expand"
+    (tokens touched by the offsets). A char -> token lookup table is built
+    once per doc, so each entity aligns in O(1) instead of a char_span binary
+    search per mode. Overlaps are then resolved with one sorted sweep,
+    keeping the earliest and, on ties, the longest span.
+    
+    Outcomes are tallied in `counts`: aligned_contract, aligned_expand,
+    dropped_invalid (offsets outside the text), dropped_empty (only
+    whitespace covered) and dropped_overlap.
+    """
+    counts = counts if counts is not None else Counter()
+    counts["docs"] += 1
+    if not entities:
+        return []
+    
+    # owner[c] is the token whose text or trailing whitespace covers char c
+    text_length = len(doc.text)
+    owner = []
+    token_starts = []
+    token_ends = []
+    for token in doc:
+        owner.extend([token.i] * len(token.text_with_ws))
+        token_starts.append(token.idx)
+        token_ends.append(token.idx + len(token))
+    
+    aligned = []
+    for start_char, end_char, label in entities:
+        counts["spans"] += 1
+        if not 0 <= start_char < end_char <= text_length:
+            counts["dropped_invalid"] += 1
+            continue
+        
+        first = owner[start_char]
+        last = owner[end_char - 1]
+        
+        # Contract: keep only tokens completely within the offsets
+        start = first + 1 if token_starts[first] < start_char else first
+        end = last - 1 if end_char < token_ends[last] else last
+        if start <= end:
+            counts["aligned_contract"] += 1
+        else:
+            # Expand: every token touched, ignoring trailing whitespace at the start
+            start = first + 1 if start_char == token_ends[first] else first
+            end = last
+            if start > end:
+                counts["dropped_empty"] += 1
+                continue
+            counts["aligned_expand"] += 1
+        aligned.append((start, end + 1, label))
+    
+    # Sweep by start, longest first; keep spans that begin after the last kept end
+    aligned.sort(key=lambda x: (x[0], -(x[1] - x[0])))
+    spans = []
+    last_end = 0
+    for start, end, label in aligned:
+        if start < last_end:
+            counts["dropped_overlap"] += 1
+            continue
+        spans.append(Span(doc, start, end, label=label))
+        last_end = end
+    
+    return spans
+
+
+def make_entity_doc(nlp, item: dict, counts: Counter) -> Doc:
+    """Build one NER reference doc from an {"text", "entities"[, "pillar"]} record."""
+    doc = nlp.make_doc(item["text"])
+    doc.ents = align_entity_spans(doc, item["entities"], counts)
+    if PILLAR_KEY in item:
+        doc.user_data[PILLAR_KEY] = item[PILLAR_KEY]
+    return doc
+
+
+def make_intent_doc(nlp, item: dict, counts: Counter) -> Doc:
+    """Build one textcat reference doc from an {"text", "cats"[, "pillar"]} record."""
+    doc = nlp.make_doc(item["text"])
+    
+    # Convert intent scores to binary (0 or 1) for multilabel classification
+    # Threshold at 0.5: values >= 0.5 become 1.0, values < 0.5 become 0.0
+    binary_cats = {}
+    for label, value in item["cats"].items():
+        # Ensure values are binary (0.0 or 1.0)
+        if isinstance(value, (int, float)):
+            # Convert to binary: >= 0.5 -> 1.0, < 0.5 -> 0.0
+            binary_value = 1.0 if value >= 0.5 else 0.0
+            if value != binary_value and value not in [0.0, 1.0, 0, 1]:
+                counts["non_binary"] += 1
+            binary_cats[label] = binary_value
+        else:
+            # Handle non-numeric values
+            binary_cats[label] = 1.0 if value else 0.0
+    
+    doc.cats = binary_cats
+    if PILLAR_KEY in item:
+        doc.user_data[PILLAR_KEY] = item[PILLAR_KEY]
+    counts["docs"] += 1
+    return doc
+
+
+def _init_worker():
+    """Pool initializer: forked workers inherit tracemalloc, which only slows them down."""
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def _convert_shard(kind: str, records: List[dict], lang: str = "en") -> Tuple[bytes, List, Counter]:
+    """
+    Worker entry point: convert one chunk of records into a DocBin shard.
+    
+    Returns the serialized shard so it can be sent back to the parent
+    process, together with its docs' pillars and the conversion counts for
+    the chunk.
+    """
+    counts = Counter()
+    if kind == "entities":
+        doc_bin = SpacyDataPreparer.convert_entities_to_spacy(records, lang, counts)
+    else:
+        doc_bin = SpacyDataPreparer.convert_intents_to_spacy(records, lang, counts)
+    return doc_bin.to_bytes(), doc_bin.pillars, counts
+
 
 class SpacyDataPreparer:
     """Prepares JSONL data for spaCy training."""
     
-    def __init__(self, base_dir: str = "entities-intent", output_dir: str = "models/training_data"):
+    def __init__(self, base_dir: str = "entities-intent", output_dir: str = "models/training_data",
+                 workers: int = 1, chunk_size: int = 2000, use_cache: bool = False,
+                 split_mode: str = "random", dedup: bool = False,
+                 near_dup_threshold: float = 0.9, max_per_cluster: int = 5,
+                 sparse_intents: bool = False, profile_memory: bool = False):
         # Resolve paths: script can be run from project root or cyber-train/ directory
-        import os
         # Get script directory
         script_file = os.path.abspath(__file__)
         script_dir = Path(script_file).parent
@@ -68,73 +344,110 @@ class SpacyDataPreparer:
         self.output_dir = self.output_dir.resolve()
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
-        # Statistics
+        # Parallel conversion settings (workers <= 1 converts in this process)
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.chunk_size = max(1, chunk_size)
+        
+        # Per-file DocBin shard cache (only changed files are re-converted)
+        self.use_cache = use_cache
+        self.cache_dir = self.output_dir / "cache"
+        
+        # "random" shuffles the loaded corpus; "hash" streams records into
+        # splits by a stable hash of their text
+        self.split_mode = split_mode
+        
+        # Optional exact + near-duplicate filtering before splitting
+        self.dedup = dedup
+        self.near_dup_threshold = near_dup_threshold
+        self.max_per_cluster = max_per_cluster
+        
+        # Write intent train/dev cats as interned label IDs in a sidecar file
+        self.sparse_intents = sparse_intents
+        
+        # Alignment / conversion counts per kind, summed over all shards
+        self.conversion_counts = {"entities": Counter(), "intents": Counter()}
+        
+        # Per-stage timing and memory figures for preparation_report.json;
+        # tracemalloc roughly doubles run time, so it is opt-in
+        self.profilers = {"entities": StageProfiler(), "intents": StageProfiler()}
+        self.profile_memory = profile_memory
+        if profile_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.started = time.perf_counter()
+        
+        # Statistics (label_counts: spans per entity label / positive
+        # examples per intent label; pillar_counts: examples per directory)
         self.stats = {
-            "entities": {"total": 0, "files": 0, "labels": set()},
-            "intents": {"total": 0, "files": 0, "labels": set()}
+            "entities": {"total": 0, "files": 0, "labels": set(),
+                         "label_counts": Counter(), "pillar_counts": Counter()},
+            "intents": {"total": 0, "files": 0, "labels": set(),
+                        "label_counts": Counter(), "pillar_counts": Counter()}
         }
         
     def find_jsonl_files(self) -> Tuple[List[Path], List[Path]]:
         """Find all entity and intent JSONL files."""
-        entity_files = list(self.base_dir.rglob("*_entities.jsonl"))
-        intent_files = list(self.base_dir.rglob("*_intent.jsonl"))
+        entity_files = list(self.base_dir.rglob(KIND_SETTINGS["entities"]["pattern"]))
+        intent_files = list(self.base_dir.rglob(KIND_SETTINGS["intents"]["pattern"]))
         
         print(f"Found {len(entity_files)} entity files and {len(intent_files)} intent files")
         return entity_files, intent_files
     
     def validate_entity_format(self, data: dict) -> bool:
-        """Validate entity JSONL format."""
-        if "text" not in data:
+        """Validate entity JSONL format (shared schema in jsonl_reader)."""
+        try:
+            check_entity_record(data)
+        except ValueError:
             return False
-        if "entities" not in data:
-            return False
-        if not isinstance(data["entities"], list):
-            return False
-        for entity in data["entities"]:
-            if not isinstance(entity, list) or len(entity) != 3:
-                return False
-            if not isinstance(entity[0], int) or not isinstance(entity[1], int):
-                return False
-            if not isinstance(entity[2], str):
-                return False
         return True
     
     def validate_intent_format(self, data: dict) -> bool:
-        """Validate intent JSONL format."""
-        if "text" not in data:
-            return False
-        # Support both "cats" (dict) and "intents" (dict or list) formats
-        if "cats" in data:
-            if not isinstance(data["cats"], dict):
-                return False
-        elif "intents" in data:
-            # "intents" can be either a dict (same as cats) or a list
-            if not isinstance(data["intents"], (dict, list)):
-                return False
-        else:
+        """Validate intent JSONL format (shared schema in jsonl_reader)."""
+        try:
+            check_intent_record(data)
+        except ValueError:
             return False
         return True
     
-    def load_entity_data(self, file_path: Path) -> List[dict]:
-        """Load and validate entity data from JSONL file."""
-        data = []
-        errors = []
+    @staticmethod
+    def count_labels(kind: str, data: List[dict]) -> Counter:
+        """Spans per entity label, or positive examples per intent label."""
+        counts = Counter()
+        if kind == "entities":
+            for item in data:
+                counts.update(entity[2] for entity in item["entities"])
+        else:
+            for item in data:
+                counts.update(label for label, value in item["cats"].items()
+                              if (value >= 0.5 if isinstance(value, (int, float)) else value))
+        return counts
+    
+    def _relative_source(self, file_path: Path) -> Path:
+        """file_path relative to base_dir; files outside it keep just their directory name."""
+        file_path = Path(file_path).resolve()
+        try:
+            return file_path.relative_to(self.base_dir)
+        except ValueError:
+            return Path(file_path.parent.name) / file_path.name
+    
+    def _load_records(self, kind: str, file_path: Path) -> List[dict]:
+        """
+        Read one JSONL file with the shared typed reader.
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                if not line.strip():
-                    continue
-                try:
-                    item = json.loads(line)
-                    if self.validate_entity_format(item):
-                        data.append(item)
-                        # Track labels
-                        for entity in item["entities"]:
-                            self.stats["entities"]["labels"].add(entity[2])
-                    else:
-                        errors.append(f"{file_path}:{line_num} - Invalid format")
-                except json.JSONDecodeError as e:
-                    errors.append(f"{file_path}:{line_num} - JSON decode error: {e}")
+        Decoding and schema validation happen in one step (in C when msgspec
+        is installed), so both are timed as the load stage. Records come back
+        as {"text", "entities", "pillar"} / {"text", "cats", "pillar"} dicts
+        for the converters; the pillar is the file's directory.
+        """
+        errors = []
+        pillar = self._relative_source(file_path).parent.as_posix()
+        if kind == "entities":
+            data = [{"text": record.text, "entities": record.entities, PILLAR_KEY: pillar}
+                    for record in iter_records(file_path, "entities", errors)]
+            labels = {entity[2] for item in data for entity in item["entities"]}
+        else:
+            data = [{"text": record.text, "cats": record.cats, PILLAR_KEY: pillar}
+                    for record in iter_records(file_path, "intents", errors)]
+            labels = {label for item in data for label in item["cats"]}
         
         if errors:
             print(f"⚠️  {len(errors)} errors in {file_path.name}")
@@ -142,168 +455,92 @@ class SpacyDataPreparer:
                 for err in errors:
                     print(f"   {err}")
         
-        self.stats["entities"]["total"] += len(data)
-        self.stats["entities"]["files"] += 1
+        stats = self.stats[kind]
+        stats["labels"].update(labels)
+        stats["total"] += len(data)
+        stats["files"] += 1
+        stats["label_counts"].update(self.count_labels(kind, data))
+        stats["pillar_counts"][pillar] += len(data)
         return data
     
+    def load_entity_data(self, file_path: Path) -> List[dict]:
+        """Load and validate entity data from JSONL file."""
+        return self._load_records("entities", file_path)
+    
     def load_intent_data(self, file_path: Path) -> List[dict]:
-        """Load and validate intent data from JSONL file."""
-        data = []
-        errors = []
+        """Load and validate intent data from JSONL file (the "intents" key is normalized to "cats")."""
+        return self._load_records("intents", file_path)
+    
+    @staticmethod
+    def convert_entities_to_spacy(data: List[dict], lang: str = "en", counts: Counter = None) -> DocBin:
+        """
+        Convert entity data to spaCy DocBin format.
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                if not line.strip():
-                    continue
-                try:
-                    item = json.loads(line)
-                    if self.validate_intent_format(item):
-                        # Convert "intents" format to "cats" (dict) format
-                        if "intents" in item and "cats" not in item:
-                            if isinstance(item["intents"], dict):
-                                # "intents" is already a dict (same format as "cats")
-                                item["cats"] = item["intents"]
-                            elif isinstance(item["intents"], list):
-                                # Convert list of intent labels to dict with 1.0 for each
-                                item["cats"] = {intent: 1.0 for intent in item["intents"]}
-                            # Remove "intents" key to avoid confusion
-                            del item["intents"]
-                        
-                        data.append(item)
-                        # Track labels
-                        for label in item["cats"].keys():
-                            self.stats["intents"]["labels"].add(label)
-                    else:
-                        errors.append(f"{file_path}:{line_num} - Invalid format")
-                except json.JSONDecodeError as e:
-                    errors.append(f"{file_path}:{line_num} - JSON decode error: {e}")
+        Alignment outcomes and dropped spans are tallied in `counts` (if given)
+        instead of being printed per document.
+        """
+        nlp = _get_blank_nlp(lang)
+        doc_bin = PillarDocBin()
+        counts = counts if counts is not None else Counter()
         
-        if errors:
-            print(f"⚠️  {len(errors)} errors in {file_path.name}")
-            if len(errors) <= 5:
-                for err in errors:
-                    print(f"   {err}")
+        for item in data:
+            doc_bin.add(make_entity_doc(nlp, item, counts))
         
-        self.stats["intents"]["total"] += len(data)
-        self.stats["intents"]["files"] += 1
-        return data
+        return doc_bin
     
-    def convert_entities_to_spacy(self, data: List[dict], lang: str = "en") -> DocBin:
-        """Convert entity data to spaCy DocBin format."""
-        nlp = spacy.blank(lang)
-        doc_bin = DocBin()
+    @staticmethod
+    def convert_intents_to_spacy(data: List[dict], lang: str = "en", counts: Counter = None) -> DocBin:
+        """
+        Convert intent data to spaCy DocBin format.
+        
+        The number of non-binary values that were thresholded is tallied in
+        `counts` (if given) under "non_binary".
+        """
+        nlp = _get_blank_nlp(lang)
+        doc_bin = PillarDocBin()
+        counts = counts if counts is not None else Counter()
         
         for item in data:
-            text = item["text"]
-            doc = nlp.make_doc(text)
-            
-            # Create entity spans with overlap resolution
-            raw_ents = []
-            for start, end, label in item["entities"]:
-                # Handle character offsets - try multiple alignment modes
-                span = None
-                for alignment_mode in ["contract", "expand", "strict"]:
-                    span = doc.char_span(start, end, label=label, alignment_mode=alignment_mode)
-                    if span is not None:
-                        break
-                
-                if span is not None:
-                    raw_ents.append((span.start, span.end, span.label_))
-            
-            # Resolve overlapping entities
-            # Strategy: Sort by start position, then by length (longest first)
-            # Keep entities that don't overlap with previously added ones
-            raw_ents.sort(key=lambda x: (x[0], -(x[1] - x[0])))  # Sort by start, then by length (desc)
-            
-            ents = []
-            used_tokens = set()
-            skipped_count = 0
-            
-            for start, end, label in raw_ents:
-                # Check if this entity overlaps with any already added
-                entity_tokens = set(range(start, end))
-                if not entity_tokens.intersection(used_tokens):
-                    # No overlap, add this entity
-                    span = doc[start:end]
-                    span.label_ = label
-                    ents.append(span)
-                    used_tokens.update(entity_tokens)
-                else:
-                    # Overlap detected, skip this entity
-                    skipped_count += 1
-            
-            # Set entities (spaCy will validate)
-            try:
-                doc.ents = ents
-            except ValueError as e:
-                # If still fails, use spaCy's built-in overlap resolver
-                # This handles edge cases where token boundaries cause issues
-                try:
-                    from spacy.util import filter_spans
-                    filtered_ents = filter_spans(ents)
-                    if filtered_ents:
-                        doc.ents = filtered_ents
-                        if len(filtered_ents) < len(ents):
-                            skipped_count += (len(ents) - len(filtered_ents))
-                    else:
-                        # If no valid entities after filtering, skip this document
-                        print(f"⚠️  Skipping document with no valid entities after filtering: {text[:50]}...")
-                        continue
-                except (ImportError, AttributeError):
-                    # Fallback: manually filter overlapping spans
-                    # Keep only the longest non-overlapping spans
-                    filtered_ents = []
-                    for span in sorted(ents, key=lambda s: (s.start, -(s.end - s.start))):
-                        overlaps = False
-                        for existing in filtered_ents:
-                            if not (span.end <= existing.start or existing.end <= span.start):
-                                overlaps = True
-                                break
-                        if not overlaps:
-                            filtered_ents.append(span)
-                    
-                    if filtered_ents:
-                        doc.ents = filtered_ents
-                    else:
-                        print(f"⚠️  Skipping document with no valid entities: {text[:50]}...")
-                        continue
-            
-            doc_bin.add(doc)
+            doc_bin.add(make_intent_doc(nlp, item, counts))
         
         return doc_bin
     
-    def convert_intents_to_spacy(self, data: List[dict], lang: str = "en") -> DocBin:
-        """Convert intent data to spaCy DocBin format."""
-        nlp = spacy.blank(lang)
-        doc_bin = DocBin()
+    def convert_splits(self, kind: str, splits: Dict[str, List[dict]],
+                       lang: str = "en") -> Dict[str, DocBin]:
+        """
+        Convert each split to a DocBin, in parallel when workers > 1.
         
-        non_binary_count = 0
+        In parallel mode every split is cut into fixed-size chunks and all
+        chunks are submitted to one process pool, so workers stay busy across
+        train/dev/test. Each worker tokenizes its chunk into its own DocBin
+        shard and the shards are merged here in submission order, which keeps
+        the output identical to a serial run.
+        """
+        if self.workers <= 1:
+            converter = (self.convert_entities_to_spacy if kind == "entities"
+                         else self.convert_intents_to_spacy)
+            return {name: converter(data, lang, self.conversion_counts[kind]) for name, data in splits.items()}
         
-        for item in data:
-            text = item["text"]
-            doc = nlp.make_doc(text)
-            
-            # Convert intent scores to binary (0 or 1) for multilabel classification
-            # Threshold at 0.5: values >= 0.5 become 1.0, values < 0.5 become 0.0
-            binary_cats = {}
-            for label, value in item["cats"].items():
-                # Ensure values are binary (0.0 or 1.0)
-                if isinstance(value, (int, float)):
-                    # Convert to binary: >= 0.5 -> 1.0, < 0.5 -> 0.0
-                    binary_value = 1.0 if value >= 0.5 else 0.0
-                    if value != binary_value and value not in [0.0, 1.0, 0, 1]:
-                        non_binary_count += 1
-                    binary_cats[label] = binary_value
-                else:
-                    # Handle non-numeric values
-                    binary_cats[label] = 1.0 if value else 0.0
-            
-            doc.cats = binary_cats
-            doc_bin.add(doc)
+        merged = {name: PillarDocBin() for name in splits}
+        total_chunks = sum((len(data) + self.chunk_size - 1) // self.chunk_size for data in splits.values())
+        print(f"   Using {self.workers} workers for {total_chunks} chunks of up to {self.chunk_size} examples")
         
-        if non_binary_count > 0:
-            print(f"   ⚠️  Converted {non_binary_count} non-binary intent values to binary (threshold: 0.5)")
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as executor:
+            futures = []
+            for name, data in splits.items():
+                for i in range(0, len(data), self.chunk_size):
+                    futures.append((name, executor.submit(_convert_shard, kind, data[i:i + self.chunk_size], lang)))
+            
+            for name, future in futures:
+                self._merge_shard(kind, merged[name], future.result())
         
+        return merged
+    
+    def _merge_shard(self, kind: str, doc_bin: DocBin, result: Tuple[bytes, List, Counter]) -> DocBin:
+        """Merge a worker result into doc_bin and add its conversion counts."""
+        shard_bytes, pillars, counts = result
+        self.conversion_counts[kind].update(counts)
+        doc_bin.merge(PillarDocBin().from_bytes(shard_bytes, pillars))
         return doc_bin
     
     def split_data(self, data: List[dict], train_ratio: float = 0.7, 
@@ -311,6 +548,12 @@ class SpacyDataPreparer:
         """Split data into train/dev/test sets."""
         assert abs(train_ratio + dev_ratio + test_ratio - 1.0) < 0.01, "Ratios must sum to 1.0"
         
+        if self.split_mode == "hash":
+            splits = {"train": [], "dev": [], "test": []}
+            for item in data:
+                splits[assign_split(item["text"], train_ratio, dev_ratio)].append(item)
+            return splits["train"], splits["dev"], splits["test"]
+        
         random.shuffle(data)
         total = len(data)
         
@@ -323,136 +566,356 @@ class SpacyDataPreparer:
         
         return train_data, dev_data, test_data
     
-    def process_entities(self, train_ratio: float = 0.7, dev_ratio: float = 0.15, test_ratio: float = 0.15):
-        """Process all entity files and create .spacy files."""
-        print("\n" + "="*70)
-        print("PROCESSING ENTITY FILES FOR NER TRAINING")
-        print("="*70)
+    def _file_cache_key(self, kind: str, file_path: Path, lang: str = "en") -> str:
+        """Cache key for a source file: content hash plus tokenizer/converter version."""
+        digest = hashlib.sha256()
+        digest.update(f"{CACHE_VERSION}|{kind}|{lang}|{spacy.__version__}|".encode("utf-8"))
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def build_file_shards(self, kind: str, files: List[Path],
+                          lang: str = "en") -> Tuple[List[DocBin], List[List[str]]]:
+        """
+        Return one DocBin shard per source file, reusing cached shards.
         
-        entity_files, _ = self.find_jsonl_files()
+        Shards are stored under <output_dir>/cache/<kind>/ keyed by the file's
+        content hash, so only files that changed since the last run are
+        re-read and re-converted. Label statistics and the records' texts are
+        kept in a JSON sidecar next to each shard so cached files still count
+        towards the report and can be split without deserializing their docs.
+        Returns the shards and, per shard, the texts of its docs.
+        """
+        cache_dir = self.cache_dir / kind
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        load_data = self.load_entity_data if kind == "entities" else self.load_intent_data
+        profiler = self.profilers[kind]
         
-        # Load all entity data
-        all_entity_data = []
-        for file_path in entity_files:
-            data = self.load_entity_data(file_path)
-            all_entity_data.extend(data)
+        shards = [None] * len(files)
+        texts = [None] * len(files)
+        pending = []
+        used_keys = set()
         
-        if len(all_entity_data) == 0:
-            print(f"\n❌ ERROR: No entity data found!")
-            print(f"   Searched in: {self.base_dir}")
-            print(f"   Found {len(entity_files)} entity files")
-            if len(entity_files) == 0:
-                print(f"   ⚠️  No *_entities.jsonl files found in {self.base_dir}")
-                print(f"   Please check the path and ensure files exist")
-            return
+        for index, file_path in enumerate(files):
+            key = self._file_cache_key(kind, file_path, lang)
+            used_keys.add(key)
+            shard_path = cache_dir / f"{key}.spacy"
+            meta_path = cache_dir / f"{key}.json"
+            
+            if shard_path.exists() and meta_path.exists():
+                with profiler.stage("load_cache"):
+                    with open(meta_path, 'r') as f:
+                        meta = json.load(f)
+                    shards[index] = PillarDocBin().from_disk(shard_path)
+                texts[index] = meta["texts"]
+                profiler.add_records("load_cache", meta["total"])
+                self.conversion_counts[kind].update(meta["counts"])
+                self.stats[kind]["total"] += meta["total"]
+                self.stats[kind]["files"] += 1
+                self.stats[kind]["labels"].update(meta["labels"])
+                self.stats[kind]["label_counts"].update(meta["label_counts"])
+                self.stats[kind]["pillar_counts"][Path(meta["source"]).parent.as_posix()] += meta["total"]
+                continue
+            
+            with profiler.stage("load"):
+                data = load_data(file_path)
+            profiler.add_records("load", len(data))
+            labels = set()
+            for item in data:
+                if kind == "entities":
+                    labels.update(entity[2] for entity in item["entities"])
+                else:
+                    labels.update(item["cats"].keys())
+            meta = {
+                "source": str(self._relative_source(file_path)),
+                "total": len(data),
+                "labels": sorted(labels),
+                "label_counts": dict(self.count_labels(kind, data)),
+                "texts": [item["text"] for item in data],
+            }
+            texts[index] = meta["texts"]
+            pending.append((index, shard_path, meta_path, meta, data))
         
-        print(f"\n✅ Loaded {len(all_entity_data)} entity examples from {len(entity_files)} files")
-        print(f"   Unique entity labels: {len(self.stats['entities']['labels'])}")
+        print(f"♻️  Reused {len(files) - len(pending)} cached shards, converting {len(pending)} changed files")
         
-        # Split data
-        train_data, dev_data, test_data = self.split_data(
-            all_entity_data, train_ratio, dev_ratio, test_ratio
-        )
+        if pending:
+            with profiler.stage("tokenize", records=sum(len(data) for *_, data in pending)):
+                if self.workers > 1 and len(pending) > 1:
+                    with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as executor:
+                        futures = [executor.submit(_convert_shard, kind, data, lang) for *_, data in pending]
+                        results = [future.result() for future in futures]
+                else:
+                    results = [_convert_shard(kind, data, lang) for *_, data in pending]
+            
+            for (index, shard_path, meta_path, meta, _), result in zip(pending, results):
+                meta["counts"] = dict(result[2])
+                with profiler.stage("serialize", records=meta["total"]):
+                    doc_bin = self._merge_shard(kind, PillarDocBin(), result)
+                    doc_bin.to_disk(shard_path)
+                    with open(meta_path, 'w') as f:
+                        json.dump(meta, f)
+                shards[index] = doc_bin
         
-        print(f"\n📊 Data Split:")
-        print(f"   Train: {len(train_data)} ({len(train_data)/len(all_entity_data)*100:.1f}%)")
-        print(f"   Dev:   {len(dev_data)} ({len(dev_data)/len(all_entity_data)*100:.1f}%)")
-        print(f"   Test:  {len(test_data)} ({len(test_data)/len(all_entity_data)*100:.1f}%)")
+        # Drop shards (and sidecars) of files that were edited or removed since the last run
+        for stale in cache_dir.iterdir():
+            if stale.name.split(".")[0] not in used_keys:
+                stale.unlink()
         
-        # Convert to spaCy format
-        print("\n🔄 Converting to spaCy format...")
-        train_docbin = self.convert_entities_to_spacy(train_data)
-        dev_docbin = self.convert_entities_to_spacy(dev_data)
-        test_docbin = self.convert_entities_to_spacy(test_data)
+        return shards, texts
+    
+    def stitch_splits(self, shards: List[DocBin], texts: List[List[str]], train_ratio: float = 0.7,
+                      dev_ratio: float = 0.15, test_ratio: float = 0.15,
+                      dedup: CorpusDeduplicator = None, sources: List[str] = None,
+                      profiler: StageProfiler = None) -> Dict[str, DocBin]:
+        """
+        Re-split the docs of all shards into train/dev/test DocBins.
         
-        # Save .spacy files
-        train_path = self.output_dir / "entities_train.spacy"
-        dev_path = self.output_dir / "entities_dev.spacy"
-        test_path = self.output_dir / "entities_test.spacy"
+        Dedup and split assignment only look at the shards' texts; the chosen
+        docs are then copied out of the shards with PillarDocBin.select, so a
+        reused shard is never turned back into Doc objects.
         
-        train_docbin.to_disk(train_path)
-        dev_docbin.to_disk(dev_path)
-        test_docbin.to_disk(test_path)
+        Time spent in dedup is reported to `profiler` (if given) as its own
+        stage; the caller times the rest of the call as the split stage.
+        """
+        sources = sources or [None] * len(shards)
+        dedup_seconds = 0.0
+        checked = 0
         
-        print(f"✅ Saved entity training files:")
-        print(f"   {train_path}")
-        print(f"   {dev_path}")
-        print(f"   {test_path}")
+        # (shard index, doc index) of every kept doc, in corpus order
+        refs = []
+        for shard_index, (shard_texts, source) in enumerate(zip(texts, sources)):
+            for doc_index, text in enumerate(shard_texts):
+                if dedup is not None:
+                    started = time.perf_counter()
+                    keep = dedup.keep(text, source)
+                    dedup_seconds += time.perf_counter() - started
+                    checked += 1
+                    if not keep:
+                        continue
+                refs.append((shard_index, doc_index))
         
-        # Save entity labels
-        labels_path = self.output_dir / "entity_labels.txt"
-        with open(labels_path, 'w') as f:
-            for label in sorted(self.stats['entities']['labels']):
-                f.write(f"{label}\n")
-        print(f"✅ Saved entity labels: {labels_path}")
+        if self.split_mode == "hash":
+            splits = {"train": [], "dev": [], "test": []}
+            for ref in refs:
+                splits[assign_split(texts[ref[0]][ref[1]], train_ratio, dev_ratio)].append(ref)
+        else:
+            train_refs, dev_refs, test_refs = self.split_data(refs, train_ratio, dev_ratio, test_ratio)
+            splits = {"train": train_refs, "dev": dev_refs, "test": test_refs}
+        docbins = {name: PillarDocBin.select(shards, split_refs) for name, split_refs in splits.items()}
         
-        return train_path, dev_path, test_path, labels_path
+        if profiler is not None and dedup is not None:
+            profiler.record("dedup", dedup_seconds, records=checked, calls=checked)
+        return docbins
     
-    def process_intents(self, train_ratio: float = 0.7, dev_ratio: float = 0.15, test_ratio: float = 0.15):
-        """Process all intent files and create .spacy files."""
+    def stream_hash_splits(self, kind: str, files: List[Path], train_ratio: float = 0.7,
+                           dev_ratio: float = 0.15, lang: str = "en",
+                           dedup: CorpusDeduplicator = None) -> Tuple[Dict[str, DocBin], int]:
+        """
+        Build hash-assigned splits in a single streaming pass over the files.
+        
+        Only one file's records (or, in parallel mode, a bounded window of
+        files) are held in memory at a time; each record goes straight to its
+        split's DocBin. Returns the DocBins and the number of records read.
+        """
+        load_data = self.load_entity_data if kind == "entities" else self.load_intent_data
+        profiler = self.profilers[kind]
+        docbins = {"train": PillarDocBin(), "dev": PillarDocBin(), "test": PillarDocBin()}
+        total = 0
+        
+        def file_groups():
+            nonlocal total
+            for file_path in files:
+                groups = {"train": [], "dev": [], "test": []}
+                with profiler.stage("load"):
+                    data = load_data(file_path)
+                profiler.add_records("load", len(data))
+                total += len(data)
+                if dedup is not None:
+                    source = str(self._relative_source(file_path))
+                    with profiler.stage("dedup", records=len(data)):
+                        data = [item for item in data if dedup.keep(item["text"], source)]
+                with profiler.stage("split", records=len(data)):
+                    for item in data:
+                        groups[assign_split(item["text"], train_ratio, dev_ratio)].append(item)
+                yield groups
+        
+        if self.workers <= 1:
+            for groups in file_groups():
+                for name, data in groups.items():
+                    if data:
+                        with profiler.stage("tokenize", records=len(data)):
+                            self._merge_shard(kind, docbins[name], _convert_shard(kind, data, lang))
+            return docbins, total
+        
+        # Keep at most two files per worker in flight so memory stays bounded.
+        # Waiting on a worker counts as tokenize time.
+        max_in_flight = self.workers * 2
+        in_flight = []
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as executor:
+            for groups in file_groups():
+                for name, data in groups.items():
+                    if data:
+                        in_flight.append((name, len(data), executor.submit(_convert_shard, kind, data, lang)))
+                while len(in_flight) > max_in_flight:
+                    name, records, future = in_flight.pop(0)
+                    with profiler.stage("tokenize", records=records):
+                        self._merge_shard(kind, docbins[name], future.result())
+            for name, records, future in in_flight:
+                with profiler.stage("tokenize", records=records):
+                    self._merge_shard(kind, docbins[name], future.result())
+        
+        return docbins, total
+    
+    def _process_kind(self, kind: str, train_ratio: float, dev_ratio: float, test_ratio: float):
+        """Load, split, convert and save one data kind ("entities" or "intents")."""
+        settings = KIND_SETTINGS[kind]
+        noun = settings["noun"]
+        
         print("\n" + "="*70)
-        print("PROCESSING INTENT FILES FOR TEXT CLASSIFICATION TRAINING")
+        print(f"PROCESSING {noun.upper()} FILES FOR {settings['task']}")
         print("="*70)
         
-        _, intent_files = self.find_jsonl_files()
+        entity_files, intent_files = self.find_jsonl_files()
+        files = entity_files if kind == "entities" else intent_files
+        
+        dedup = None
+        if self.dedup:
+            dedup = CorpusDeduplicator(self.near_dup_threshold, self.max_per_cluster)
+        profiler = self.profilers[kind]
         
-        # Load all intent data
-        all_intent_data = []
-        for file_path in intent_files:
-            data = self.load_intent_data(file_path)
-            all_intent_data.extend(data)
+        if self.use_cache:
+            shards, texts = self.build_file_shards(kind, files)
+            total = sum(len(shard) for shard in shards)
+        elif self.split_mode == "hash":
+            print("\n🔄 Streaming files into hash-assigned splits...")
+            docbins, total = self.stream_hash_splits(kind, files, train_ratio, dev_ratio, dedup=dedup)
+        else:
+            # Load all data
+            load_data = self.load_entity_data if kind == "entities" else self.load_intent_data
+            all_data = []
+            total = 0
+            for file_path in files:
+                with profiler.stage("load"):
+                    data = load_data(file_path)
+                profiler.add_records("load", len(data))
+                total += len(data)
+                if dedup is not None:
+                    source = str(self._relative_source(file_path))
+                    with profiler.stage("dedup", records=len(data)):
+                        data = [item for item in data if dedup.keep(item["text"], source)]
+                all_data.extend(data)
         
-        if len(all_intent_data) == 0:
-            print(f"\n❌ ERROR: No intent data found!")
+        if total == 0:
+            print(f"\n❌ ERROR: No {noun} data found!")
             print(f"   Searched in: {self.base_dir}")
-            print(f"   Found {len(intent_files)} intent files")
-            if len(intent_files) == 0:
-                print(f"   ⚠️  No *_intent.jsonl files found in {self.base_dir}")
+            print(f"   Found {len(files)} {noun} files")
+            if len(files) == 0:
+                print(f"   ⚠️  No {settings['pattern']} files found in {self.base_dir}")
                 print(f"   Please check the path and ensure files exist")
             return
         
-        print(f"\n✅ Loaded {len(all_intent_data)} intent examples from {len(intent_files)} files")
-        print(f"   Unique intent labels: {len(self.stats['intents']['labels'])}")
+        print(f"\n✅ Loaded {total} {noun} examples from {len(files)} files")
+        print(f"   Unique {noun} labels: {len(self.stats[kind]['labels'])}")
         
-        # Split data
-        train_data, dev_data, test_data = self.split_data(
-            all_intent_data, train_ratio, dev_ratio, test_ratio
-        )
+        if self.use_cache:
+            # Split and re-stitch the cached shards
+            print("\n🔄 Stitching cached shards into splits...")
+            sources = [str(self._relative_source(file_path)) for file_path in files]
+            with profiler.stage("split", records=total):
+                docbins = self.stitch_splits(shards, texts, train_ratio, dev_ratio, test_ratio,
+                                             dedup=dedup, sources=sources, profiler=profiler)
+        elif self.split_mode != "hash":
+            # Split data
+            with profiler.stage("split", records=len(all_data)):
+                train_data, dev_data, test_data = self.split_data(
+                    all_data, train_ratio, dev_ratio, test_ratio
+                )
+            
+            # Convert to spaCy format
+            print("\n🔄 Converting to spaCy format...")
+            with profiler.stage("tokenize", records=len(all_data)):
+                docbins = self.convert_splits(kind, {"train": train_data, "dev": dev_data, "test": test_data})
         
-        print(f"\n📊 Data Split:")
-        print(f"   Train: {len(train_data)} ({len(train_data)/len(all_intent_data)*100:.1f}%)")
-        print(f"   Dev:   {len(dev_data)} ({len(dev_data)/len(all_intent_data)*100:.1f}%)")
-        print(f"   Test:  {len(test_data)} ({len(test_data)/len(all_intent_data)*100:.1f}%)")
+        counts = self.conversion_counts[kind]
+        if kind == "entities":
+            print(f"\n🧩 Span alignment: {counts['aligned_contract']} contract, "
+                  f"{counts['aligned_expand']} expand of {counts['spans']} spans")
+            dropped = {reason: counts[f"dropped_{reason}"] for reason in ("overlap", "empty", "invalid")}
+            if any(dropped.values()):
+                print(f"   ⚠️  Dropped {dropped['overlap']} overlapping, {dropped['empty']} whitespace-only "
+                      f"and {dropped['invalid']} out-of-range spans")
+        elif counts["non_binary"]:
+            print(f"\n   ⚠️  Converted {counts['non_binary']} non-binary intent values to binary (threshold: 0.5)")
         
-        # Convert to spaCy format
-        print("\n🔄 Converting to spaCy format...")
-        train_docbin = self.convert_intents_to_spacy(train_data)
-        dev_docbin = self.convert_intents_to_spacy(dev_data)
-        test_docbin = self.convert_intents_to_spacy(test_data)
+        prefix = settings["prefix"]
+        if dedup is not None:
+            dedup_path = self.output_dir / f"{prefix}_dedup_report.json"
+            with open(dedup_path, 'w') as f:
+                json.dump(dedup.report(), f, indent=2)
+            print(f"\n🧹 Deduplication: {dedup.summary_line()}")
+            print(f"   Report: {dedup_path}")
+        
+        split_total = sum(len(doc_bin) for doc_bin in docbins.values()) or 1
+        print(f"\n📊 Data Split:")
+        print(f"   Train: {len(docbins['train'])} ({len(docbins['train'])/split_total*100:.1f}%)")
+        print(f"   Dev:   {len(docbins['dev'])} ({len(docbins['dev'])/split_total*100:.1f}%)")
+        print(f"   Test:  {len(docbins['test'])} ({len(docbins['test'])/split_total*100:.1f}%)")
         
         # Save .spacy files
-        train_path = self.output_dir / "intents_train.spacy"
-        dev_path = self.output_dir / "intents_dev.spacy"
-        test_path = self.output_dir / "intents_test.spacy"
+        train_path = self.output_dir / f"{prefix}_train.spacy"
+        dev_path = self.output_dir / f"{prefix}_dev.spacy"
+        test_path = self.output_dir / f"{prefix}_test.spacy"
         
-        train_docbin.to_disk(train_path)
-        dev_docbin.to_disk(dev_path)
-        test_docbin.to_disk(test_path)
+        sparse = kind == "intents" and self.sparse_intents
+        for name, path in (("train", train_path), ("dev", dev_path), ("test", test_path)):
+            with profiler.stage("serialize", records=len(docbins[name])):
+                # The test split stays dense so `spacy evaluate` can read it directly
+                if sparse and name != "test":
+                    self.save_sparse_intents(docbins[name], path, sorted(self.stats[kind]['labels']))
+                else:
+                    sparse_cats_path(path).unlink(missing_ok=True)
+                    docbins[name].to_disk(path)
         
-        print(f"✅ Saved intent training files:")
+        print(f"✅ Saved {noun} training files:")
         print(f"   {train_path}")
         print(f"   {dev_path}")
         print(f"   {test_path}")
+        if sparse:
+            print(f"   Train/dev categories stored as sparse label IDs "
+                  f"({sparse_cats_path(train_path).name}, {sparse_cats_path(dev_path).name})")
         
-        # Save intent labels
-        labels_path = self.output_dir / "intent_labels.txt"
+        # Save labels
+        labels_path = self.output_dir / settings["labels_file"]
         with open(labels_path, 'w') as f:
-            for label in sorted(self.stats['intents']['labels']):
+            for label in sorted(self.stats[kind]['labels']):
                 f.write(f"{label}\n")
-        print(f"✅ Saved intent labels: {labels_path}")
+        print(f"✅ Saved {noun} labels: {labels_path}")
+        print(f"\n⏱️  Stages: {profiler.summary_line()}")
         
         return train_path, dev_path, test_path, labels_path
     
+    @staticmethod
+    def save_sparse_intents(doc_bin: DocBin, path: Path, labels: List[str]):
+        """
+        Save an intent DocBin with its cats moved to a sparse sidecar file.
+        
+        The DocBin is written with empty cats; the labels are interned against
+        `labels` and stored as per-doc ID lists in <name>.cats.npz, which
+        corpus_readers.SparseIntentCorpus reads back during training.
+        """
+        save_sparse_cats(sparse_cats_path(path), encode_sparse_cats(doc_bin.cats, labels))
+        doc_bin.cats = [{} for _ in doc_bin.cats]
+        doc_bin.to_disk(path)
+    
+    def process_entities(self, train_ratio: float = 0.7, dev_ratio: float = 0.15, test_ratio: float = 0.15):
+        """Process all entity files and create .spacy files."""
+        return self._process_kind("entities", train_ratio, dev_ratio, test_ratio)
+    
+    def process_intents(self, train_ratio: float = 0.7, dev_ratio: float = 0.15, test_ratio: float = 0.15):
+        """Process all intent files and create .spacy files."""
+        return self._process_kind("intents", train_ratio, dev_ratio, test_ratio)
+    
     def generate_report(self):
         """Generate a comprehensive report of the data preparation."""
         report_path = self.output_dir / "preparation_report.txt"
@@ -468,8 +931,9 @@ class SpacyDataPreparer:
             f.write(f"Total examples: {self.stats['entities']['total']}\n")
             f.write(f"Files processed: {self.stats['entities']['files']}\n")
             f.write(f"Unique labels: {len(self.stats['entities']['labels'])}\n")
-            f.write(f"\nTop 20 Entity Labels:\n")
-            # Count label frequency would require re-reading files
+            f.write(f"\nTop 20 Entity Labels (spans):\n")
+            for label, count in self.stats['entities']['label_counts'].most_common(20):
+                f.write(f"  {label:40s} {count:8d}\n")
             f.write("(See entity_labels.txt for full list)\n\n")
             
             f.write("INTENT DATA STATISTICS\n")
@@ -477,7 +941,9 @@ class SpacyDataPreparer:
             f.write(f"Total examples: {self.stats['intents']['total']}\n")
             f.write(f"Files processed: {self.stats['intents']['files']}\n")
             f.write(f"Unique labels: {len(self.stats['intents']['labels'])}\n")
-            f.write(f"\nTop 20 Intent Labels:\n")
+            f.write(f"\nTop 20 Intent Labels (positive examples):\n")
+            for label, count in self.stats['intents']['label_counts'].most_common(20):
+                f.write(f"  {label:40s} {count:8d}\n")
             f.write("(See intent_labels.txt for full list)\n\n")
             
             f.write("NEXT STEPS\n")
@@ -492,6 +958,49 @@ class SpacyDataPreparer:
             f.write("4. Evaluate the models on test sets\n")
         
         print(f"\n✅ Generated report: {report_path}")
+        
+        json_path = self.output_dir / "preparation_report.json"
+        with open(json_path, 'w') as f:
+            json.dump(self.build_json_report(), f, indent=2)
+        print(f"✅ Generated JSON report: {json_path}")
+    
+    def build_json_report(self) -> Dict:
+        """
+        Machine-readable run summary: settings, per-stage timings and memory,
+        conversion counts and label/pillar histograms for each data kind.
+        """
+        # None where the resource module is unavailable (Windows)
+        peak_rss, children_peak_rss = peak_rss_mb(), peak_rss_mb(children=True)
+        report = {
+            "generated": datetime.now().isoformat(timespec="seconds"),
+            "settings": {
+                "base_dir": str(self.base_dir),
+                "workers": self.workers,
+                "chunk_size": self.chunk_size,
+                "cache": self.use_cache,
+                "split_mode": self.split_mode,
+                "dedup": self.dedup,
+                "sparse_intents": self.sparse_intents,
+                "tracemalloc": self.profile_memory,
+            },
+            "wall_seconds": round(time.perf_counter() - self.started, 3),
+            "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None,
+            # Pool workers are not covered by RUSAGE_SELF or tracemalloc
+            "children_peak_rss_mb": round(children_peak_rss, 1) if children_peak_rss is not None else None,
+        }
+        for kind in ("entities", "intents"):
+            stats = self.stats[kind]
+            report[kind] = {
+                "total": stats["total"],
+                "files": stats["files"],
+                "unique_labels": len(stats["labels"]),
+                "stages": self.profilers[kind].report(),
+                "profiler_overhead_seconds": round(self.profilers[kind].overhead_seconds, 3),
+                "conversion_counts": dict(self.conversion_counts[kind]),
+                "label_counts": dict(stats["label_counts"].most_common()),
+                "pillar_counts": dict(stats["pillar_counts"].most_common()),
+            }
+        return report
 
 
 def main():
@@ -536,6 +1045,59 @@ def main():
         action="store_true",
         help="Only process intent files"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes for DocBin conversion (0 = all cores, default: 1)"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=2000,
+        help="Examples per worker chunk in parallel mode (default: 2000)"
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Cache converted shards per file and only re-convert changed files"
+    )
+    parser.add_argument(
+        "--split-mode",
+        choices=["random", "hash"],
+        default="random",
+        help="random: shuffle the whole corpus; hash: stream records into splits "
+             "by a stable hash of their normalized text (default: random)"
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Drop exact duplicates and cap near-duplicate clusters before splitting"
+    )
+    parser.add_argument(
+        "--near-dup-threshold",
+        type=float,
+        default=0.9,
+        help="MinHash similarity for near duplicates with --dedup (0 = exact only, default: 0.9)"
+    )
+    parser.add_argument(
+        "--max-per-cluster",
+        type=int,
+        default=5,
+        help="Examples kept per near-duplicate cluster with --dedup (default: 5)"
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Trace Python allocations per stage with tracemalloc for "
+             "preparation_report.json (slower; worker processes are not traced)"
+    )
+    parser.add_argument(
+        "--sparse-intents",
+        action="store_true",
+        help="Store intent train/dev categories as interned label IDs in "
+             "intents_<split>.cats.npz (train with train_spacy_models.py --sparse-intents)"
+    )
     
     args = parser.parse_args()
     
@@ -544,7 +1106,13 @@ def main():
         print("❌ Error: train_ratio + dev_ratio + test_ratio must equal 1.0")
         return
     
-    preparer = SpacyDataPreparer(args.base_dir, args.output_dir)
+    preparer = SpacyDataPreparer(args.base_dir, args.output_dir,
+                                 workers=args.workers, chunk_size=args.chunk_size,
+                                 use_cache=args.cache, split_mode=args.split_mode,
+                                 dedup=args.dedup, near_dup_threshold=args.near_dup_threshold,
+                                 max_per_cluster=args.max_per_cluster,
+                                 sparse_intents=args.sparse_intents,
+                                 profile_memory=args.profile_memory)
     
     if not args.intents_only:
         preparer.process_entities(args.train_ratio, args.dev_ratio, args.test_ratio)
@@ -13,22 +13,32 @@ echo ""
 NER_MODEL="cyber-train/models/ner_model/model-best"
 INTENT_MODEL="cyber-train/models/intent_model/model-best"
 
-if [ ! -d "$NER_MODEL" ]; then
+# Set INFERENCE_SERVER to use a running server instead of loading the models:
+#   python3 cyber-train/inference_server.py serve &
+#   INFERENCE_SERVER=http://127.0.0.1:8765 ./cyber-train/quick_test.sh
+SERVER_ARGS=""
+if [ -n "$INFERENCE_SERVER" ]; then
+    SERVER_ARGS="--server $INFERENCE_SERVER"
+    echo "🔌 Using inference server at: $INFERENCE_SERVER"
+    INTENT_AVAILABLE=true
+elif [ ! -d "$NER_MODEL" ]; then
     echo "❌ NER model not found at: $NER_MODEL"
     exit 1
 fi
 
-if [ ! -d "$INTENT_MODEL" ]; then
-    echo "⚠️  Intent model not found at: $INTENT_MODEL"
-    echo "   You can train it with: python3 cyber-train/train_spacy_models.py --intent-only"
-    INTENT_AVAILABLE=false
-else
-    INTENT_AVAILABLE=true
-fi
+if [ -z "$INFERENCE_SERVER" ]; then
+    if [ ! -d "$INTENT_MODEL" ]; then
+        echo "⚠️  Intent model not found at: $INTENT_MODEL"
+        echo "   You can train it with: python3 cyber-train/train_spacy_models.py --intent-only"
+        INTENT_AVAILABLE=false
+    else
+        INTENT_AVAILABLE=true
+    fi
 
-echo "✅ NER model found"
-if [ "$INTENT_AVAILABLE" = true ]; then
-    echo "✅ Intent model found"
+    echo "✅ NER model found"
+    if [ "$INTENT_AVAILABLE" = true ]; then
+        echo "✅ Intent model found"
+    fi
 fi
 echo ""
 
@@ -37,7 +47,7 @@ echo "Running test suite..."
 echo ""
 
 if [ "$INTENT_AVAILABLE" = true ]; then
-    python3 cyber-train/test_models.py --test-suite
+    python3 cyber-train/test_models.py --test-suite $SERVER_ARGS
 else
     echo "Testing NER model only..."
     python3 cyber-train/test_models.py --test-suite 2>&1 | head -100
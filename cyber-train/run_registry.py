@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Local registry of training runs (one SQLite file).
+
+train_spacy_models.py overwrites models/ner_model and models/intent_model on
+every run. It records each run here so the data, config and machine behind a
+model can be traced, and slowdowns or accuracy drops show up over time:
+1. Fingerprints: SHA-256 of the train/dev/test corpus files (including
+   sparse cats sidecars) and of the training config
+2. Label counts of the training split (preparation_report.json covers the
+   whole corpus, so the train file itself is counted)
+3. Throughput and memory: training words/sec (in-process runs; `spacy
+   train` does not report it) and peak RSS of this process and its children
+4. Wall time per phase (config, train, evaluate)
+5. Final scores: test-set evaluation plus the best dev score, and the
+   model-best artifact path
+6. Host: hostname, platform, cores, GPU flag, Python and spaCy versions
+
+Peak RSS comes from getrusage, so it is a high-water mark for the whole
+process (or its largest child) up to the end of the run; runs that share a
+process (NER then intent) report the larger of the two.
+
+Usage:
+    python cyber-train/run_registry.py list [--model ner] [--limit 20]
+    python cyber-train/run_registry.py show 12
+    python cyber-train/run_registry.py compare 11 12
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import socket
+import sqlite3
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from stage_profiler import peak_rss_mb
+
+DEFAULT_REGISTRY = "cyber-train/models/run_registry.sqlite"
+
+# Headline score per model type, used for trends and regressions
+MAIN_SCORES = {"ner": "ents_f", "intent": "cats_score"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model TEXT NOT NULL,
+    started TEXT NOT NULL,
+    status TEXT NOT NULL,
+    corpus_hash TEXT,
+    config_hash TEXT,
+    config_path TEXT,
+    data_dir TEXT,
+    artifact_path TEXT,
+    label_counts TEXT,
+    words_per_sec REAL,
+    peak_rss_mb REAL,
+    wall_seconds REAL,
+    phases TEXT,
+    score REAL,
+    scores TEXT,
+    host TEXT,
+    settings TEXT
+)
+"""
+
+# Columns stored as JSON text
+JSON_COLUMNS = ("label_counts", "phases", "scores", "host", "settings")
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    """Open (and create if needed) a registry database."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute(SCHEMA)
+    return conn
+
+
+def file_digest(paths: Iterable[Path]) -> Optional[str]:
+    """SHA-256 over the names and contents of the existing files, in the given order."""
+    digest = hashlib.sha256()
+    found = False
+    for path in paths:
+        path = Path(path)
+        if not path.exists():
+            continue
+        found = True
+        digest.update(f"{path.name}|".encode("utf-8"))
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest() if found else None
+
+
+def corpus_files(data_dir: Path, prefix: str) -> List[Path]:
+    """The split files of one corpus, with their sparse cats and pillar sidecars."""
+    from corpus_readers import pillars_path, sparse_cats_path
+
+    files = []
+    for split in ("train", "dev", "test"):
+        spacy_path = Path(data_dir) / f"{prefix}_{split}.spacy"
+        files.extend([spacy_path, sparse_cats_path(spacy_path), pillars_path(spacy_path)])
+    return files
+
+
+def label_counts(train_path: Path) -> Dict[str, int]:
+    """Label counts of the training split, read from the train corpus itself."""
+    if not Path(train_path).exists():
+        return {}
+    import spacy
+    from corpus_readers import SparseIntentCorpus, reference_labels
+
+    counts = Counter()
+    vocab = spacy.blank("en").vocab
+    for doc in SparseIntentCorpus(train_path).read_docbin(vocab, [Path(train_path)]):
+        counts.update(reference_labels(doc))
+    return dict(counts)
+
+
+def host_info(gpu: bool = False) -> Dict:
+    try:
+        import spacy
+        spacy_version = spacy.__version__
+    except ImportError:
+        spacy_version = None
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    return {
+        "hostname": socket.gethostname(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "available_cores": cores,
+        "gpu": gpu,
+        "python": platform.python_version(),
+        "spacy": spacy_version,
+    }
+
+
+def _float_scores(scores: Dict) -> Dict[str, float]:
+    return {key: float(value) for key, value in (scores or {}).items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)}
+
+
+class RunRecorder:
+    """
+    Records one training run; created before training, finished after evaluation.
+
+    With db_path=None nothing is written, so callers can time phases
+    unconditionally.
+    """
+
+    def __init__(self, db_path: Optional[Path], model: str, data_dir: Path, config_path: Path,
+                 corpus_paths: List[Path], train_path: Path, model_dir: Path,
+                 gpu: bool = False, settings: Dict = None):
+        self.db_path = Path(db_path) if db_path else None
+        self.model = model
+        self.data_dir = Path(data_dir)
+        self.config_path = Path(config_path)
+        self.corpus_paths = corpus_paths
+        self.train_path = Path(train_path)
+        self.model_dir = Path(model_dir)
+        self.gpu = gpu
+        self.settings = settings or {}
+        self.phases = {}
+        self.run_id = None
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a phase; repeated phases add up."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(self.phases.get(name, 0.0) + time.perf_counter() - started, 2)
+
+    def start(self):
+        """Insert the run as "running" with its fingerprints."""
+        if self.db_path is None:
+            return
+        row = {
+            "model": self.model,
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "status": "running",
+            "corpus_hash": file_digest(self.corpus_paths),
+            "data_dir": str(self.data_dir),
+            "label_counts": label_counts(self.train_path),
+            "host": host_info(self.gpu),
+            "settings": self.settings,
+        }
+        with connect(self.db_path) as conn:
+            self.run_id = insert_run(conn, row)
+        print(f"🗂️  Run {self.run_id} ({self.model}) recorded in {self.db_path}")
+
+    def _written_by_run(self, path: Path) -> bool:
+        """Whether path was (re)written since the run started."""
+        return path.exists() and path.stat().st_mtime >= self.started_at
+
+    def finish(self, succeeded: bool, task_type: str):
+        """Store status, timings, throughput, scores and the artifact of the run."""
+        if self.db_path is None or self.run_id is None:
+            return
+        state_path = self.model_dir / "training_state.json"
+        state = None
+        # Files left by an earlier run say nothing about this one
+        if self._written_by_run(state_path):
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+        if succeeded:
+            status = "finished"
+        elif state is not None and not state.get("finished"):
+            status = "interrupted"
+        else:
+            status = "failed"
+        best_model = self.model_dir / "model-best"
+        scores = {}
+        evaluation_path = self.model_dir / f"{task_type}_evaluation.json"
+        if self._written_by_run(evaluation_path):
+            with open(evaluation_path, 'r') as f:
+                scores.update(_float_scores(json.load(f)))
+        meta_path = best_model / "meta.json"
+        # model-best is rewritten (meta.json included) whenever the run improves on it
+        best_written = self._written_by_run(meta_path)
+        if best_written:
+            with open(meta_path, 'r') as f:
+                performance = json.load(f).get("performance", {})
+            scores.update({f"dev_{key}": value for key, value in _float_scores(performance).items()})
+
+        # The driver's figure leaves out evaluation and checkpoint time
+        words_per_sec = state.get("words_per_sec") if state is not None else None
+
+        peak_rss = peak_rss_mb()
+        if peak_rss is not None:
+            peak_rss = round(max(peak_rss, peak_rss_mb(children=True)), 1)
+
+        main_score = MAIN_SCORES.get(self.model)
+        row = {
+            "status": status,
+            # Hashed now: configs are (re)written during the config phase
+            "config_hash": file_digest([self.config_path]),
+            "config_path": str(self.config_path),
+            "artifact_path": str(best_model.resolve()) if best_written else None,
+            "words_per_sec": words_per_sec,
+            "peak_rss_mb": peak_rss,
+            "wall_seconds": round(time.perf_counter() - self.started, 2),
+            "phases": self.phases,
+            "score": scores.get(main_score, scores.get(f"dev_{main_score}")),
+            "scores": scores,
+        }
+        with connect(self.db_path) as conn:
+            update_run(conn, self.run_id, row)
+
+
+def _encode(row: Dict) -> Dict:
+    return {key: json.dumps(value) if key in JSON_COLUMNS else value for key, value in row.items()}
+
+
+def insert_run(conn: sqlite3.Connection, row: Dict) -> int:
+    row = _encode(row)
+    columns = ", ".join(row)
+    placeholders = ", ".join("?" for _ in row)
+    cursor = conn.execute(f"INSERT INTO runs ({columns}) VALUES ({placeholders})", list(row.values()))
+    return cursor.lastrowid
+
+
+def update_run(conn: sqlite3.Connection, run_id: int, row: Dict):
+    row = _encode(row)
+    assignments = ", ".join(f"{key} = ?" for key in row)
+    conn.execute(f"UPDATE runs SET {assignments} WHERE id = ?", [*row.values(), run_id])
+
+
+def load_runs(conn: sqlite3.Connection, model: str = None, run_ids: List[int] = None) -> List[Dict]:
+    """Runs as dicts (JSON columns decoded), oldest first."""
+    query = "SELECT * FROM runs"
+    clauses, params = [], []
+    if model:
+        clauses.append("model = ?")
+        params.append(model)
+    if run_ids:
+        clauses.append(f"id IN ({', '.join('?' for _ in run_ids)})")
+        params.extend(run_ids)
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    runs = []
+    for row in conn.execute(query + " ORDER BY id", params):
+        run = dict(row)
+        for key in JSON_COLUMNS:
+            run[key] = json.loads(run[key]) if run[key] else {}
+        runs.append(run)
+    return runs
+
+
+def _short(value: Optional[str]) -> str:
+    return value[:8] if value else "-"
+
+
+def _number(value, fmt: str) -> str:
+    return format(value, fmt) if value is not None else "-"
+
+
+def print_runs(runs: List[Dict], regression: float, limit: int = 0):
+    """
+    Run table with score and throughput changes against the previous
+    finished run of the same model; only the last `limit` rows are printed.
+    """
+    print(f"{'id':>4}  {'started':19s} {'model':6s} {'status':9s} {'corpus':8s} {'config':8s} "
+          f"{'words/s':>9s} {'RSS MB':>7s} {'train s':>8s} {'score':>7s} {'Δscore':>8s}")
+    previous = {}
+    first_shown = len(runs) - limit if limit else 0
+    for i, run in enumerate(runs):
+        before = previous.get(run["model"])
+        delta = ""
+        flag = ""
+        if before and run["score"] is not None and before["score"] is not None:
+            change = run["score"] - before["score"]
+            delta = f"{change:+.4f}"
+            if change < -regression:
+                flag = " ⚠️ score"
+        if before and run["words_per_sec"] and before["words_per_sec"] and \
+                run["words_per_sec"] < before["words_per_sec"] * (1 - regression):
+            flag += " ⚠️ slower"
+        if i >= first_shown:
+            print(f"{run['id']:4d}  {run['started']:19s} {run['model']:6s} {run['status']:9s} "
+                  f"{_short(run['corpus_hash']):8s} {_short(run['config_hash']):8s} "
+                  f"{_number(run['words_per_sec'], ',.0f'):>9s} {_number(run['peak_rss_mb'], '.0f'):>7s} "
+                  f"{_number(run['phases'].get('train'), '.0f'):>8s} {_number(run['score'], '.4f'):>7s} "
+                  f"{delta:>8s}{flag}")
+        if run["status"] == "finished":
+            previous[run["model"]] = run
+
+
+def print_run(run: Dict):
+    print(f"\nRun {run['id']} ({run['model']}, {run['status']}) started {run['started']}")
+    for key in ("corpus_hash", "config_hash", "config_path", "data_dir", "artifact_path",
+                "words_per_sec", "peak_rss_mb", "wall_seconds", "score"):
+        print(f"  {key:14s} {run[key] if run[key] is not None else '-'}")
+    print(f"  {'phases':14s} " + ", ".join(f"{k} {v:.1f}s" for k, v in run["phases"].items()))
+    print(f"  {'host':14s} " + ", ".join(f"{k}={v}" for k, v in run["host"].items()))
+    print(f"  {'labels':14s} {len(run['label_counts'])} labels, "
+          f"{sum(run['label_counts'].values()):,} annotations")
+    for key, value in sorted(run["scores"].items()):
+        print(f"  {key:30s} {value:.4f}")
+
+
+def print_comparison(a: Dict, b: Dict):
+    """Side-by-side view of two runs: what changed and how the numbers moved."""
+    print(f"\n{'':24s} {'run ' + str(a['id']):>18s} {'run ' + str(b['id']):>18s} {'change':>10s}")
+    for key in ("model", "corpus_hash", "config_hash"):
+        same = "" if a[key] == b[key] else "changed"
+        print(f"{key:24s} {_short(a[key]) if 'hash' in key else a[key]:>18s} "
+              f"{_short(b[key]) if 'hash' in key else b[key]:>18s} {same:>10s}")
+    host_changes = sorted(k for k in set(a["host"]) | set(b["host"]) if a["host"].get(k) != b["host"].get(k))
+    print(f"{'host':24s} {'':>18s} {'':>18s} {', '.join(host_changes) or '':>10s}")
+
+    def numeric_row(name: str, x, y):
+        change = f"{(y - x) / x:+.1%}" if x and y is not None else ""
+        print(f"{name:24s} {_number(x, ',.4g'):>18s} {_number(y, ',.4g'):>18s} {change:>10s}")
+
+    for key in ("words_per_sec", "peak_rss_mb", "wall_seconds", "score"):
+        numeric_row(key, a[key], b[key])
+    for phase in sorted(set(a["phases"]) | set(b["phases"])):
+        numeric_row(f"phase {phase} s", a["phases"].get(phase), b["phases"].get(phase))
+    for key in sorted(set(a["scores"]) & set(b["scores"])):
+        if key.endswith(("_f", "_p", "_r", "_score", "_auc")):
+            numeric_row(key, a["scores"][key], b["scores"][key])
+
+    labels_a, labels_b = a["label_counts"], b["label_counts"]
+    added = sorted(set(labels_b) - set(labels_a))
+    removed = sorted(set(labels_a) - set(labels_b))
+    print(f"\nLabels: {len(labels_a)} → {len(labels_b)} "
+          f"(+{len(added)} / -{len(removed)}), annotations "
+          f"{sum(labels_a.values()):,} → {sum(labels_b.values()):,}")
+    if added:
+        print(f"  added: {', '.join(added[:15])}{' ...' if len(added) > 15 else ''}")
+    if removed:
+        print(f"  removed: {', '.join(removed[:15])}{' ...' if len(removed) > 15 else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List and compare recorded training runs")
+    parser.add_argument("--registry", default=DEFAULT_REGISTRY, help="Registry SQLite file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="Runs with score/throughput changes")
+    list_parser.add_argument("--model", choices=sorted(MAIN_SCORES), help="Only this model")
+    list_parser.add_argument("--limit", type=int, default=20, help="Most recent runs to show (default: 20)")
+    list_parser.add_argument(
+        "--regression",
+        type=float,
+        default=0.05,
+        help="Flag score drops above this (absolute) and throughput drops above this "
+             "fraction (default: 0.05)"
+    )
+
+    show_parser = subparsers.add_parser("show", help="All details of one run")
+    show_parser.add_argument("run_id", type=int)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two runs")
+    compare_parser.add_argument("run_a", type=int)
+    compare_parser.add_argument("run_b", type=int)
+
+    args = parser.parse_args()
+    if not Path(args.registry).exists():
+        print(f"❌ No registry at {args.registry}")
+        sys.exit(1)
+    conn = connect(Path(args.registry))
+
+    if args.command == "list":
+        print_runs(load_runs(conn, args.model), args.regression, args.limit)
+    elif args.command == "show":
+        runs = load_runs(conn, run_ids=[args.run_id])
+        if not runs:
+            print(f"❌ No run {args.run_id}")
+            sys.exit(1)
+        print_run(runs[0])
+    elif args.command == "compare":
+        runs = {run["id"]: run for run in load_runs(conn, run_ids=[args.run_a, args.run_b])}
+        missing = [run_id for run_id in (args.run_a, args.run_b) if run_id not in runs]
+        if missing:
+            print(f"❌ No run {', '.join(map(str, missing))}")
+            sys.exit(1)
+        print_comparison(runs[args.run_a], runs[args.run_b])
+
+
+if __name__ == "__main__":
+    main()
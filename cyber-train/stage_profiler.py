@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Lightweight per-stage timing and memory instrumentation.
+
+Wrap each pipeline stage in `profiler.stage(name, records)`; time spent in a
+nested stage is charged to the inner stage only, so the per-stage seconds
+add up to the wall time of the instrumented code. For every stage the
+profiler keeps:
+- wall time, number of calls, records handled and records/sec
+- the process peak RSS (high-water mark) after the stage, and how much the
+  stage raised it
+- with tracemalloc running: the largest amount of memory one call of the
+  stage allocated on top of what was live when it started, and the top live
+  allocations at the end of that call
+
+Peak RSS comes from the resource module, which is Unix-only; elsewhere the
+RSS figures are left out.
+
+Used by prepare_spacy_training.py to write preparation_report.json.
+"""
+
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Snapshots cost seconds on a large heap, so a stage is only re-snapshotted
+# when a call's traced peak beats the last snapshotted one by this factor
+_SNAPSHOT_GROWTH = 1.5
+
+# Frames from these files are instrumentation noise in allocation listings
+_IGNORED_FRAMES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """Peak resident set size of this process (or its finished children) in MB; None without resource."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return usage.ru_maxrss / divisor
+
+
+class StageProfiler:
+    """Collects per-stage wall time, throughput and memory figures."""
+
+    def __init__(self, top_allocations: int = 10):
+        self.top_allocations = top_allocations
+        self.stages = {}
+        self._stack = []
+        # Time spent taking tracemalloc snapshots, kept out of stage timings
+        self.overhead_seconds = 0.0
+
+    def _entry(self, name: str) -> Dict:
+        if name not in self.stages:
+            self.stages[name] = {"seconds": 0.0, "calls": 0, "records": 0}
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name: str, records: int = 0):
+        """Time a block of work as one call of stage `name`."""
+        tracing = tracemalloc.is_tracing()
+        frame = {"child_seconds": 0.0, "child_traced_peak": 0}
+        if tracing:
+            # reset_peak() is global, so keep what the enclosing stage has seen
+            if self._stack:
+                parent = self._stack[-1]
+                parent["child_traced_peak"] = max(parent["child_traced_peak"],
+                                                  tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        self._stack.append(frame)
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]["child_seconds"] += elapsed
+
+            entry = self._entry(name)
+            entry["seconds"] += elapsed - frame["child_seconds"]
+            entry["calls"] += 1
+            entry["records"] += records
+            rss_after = peak_rss_mb()
+            if rss_after is not None:
+                entry["peak_rss_mb"] = max(entry.get("peak_rss_mb", 0.0), rss_after)
+                entry["rss_growth_mb"] = entry.get("rss_growth_mb", 0.0) + rss_after - rss_before
+
+            if tracing:
+                traced_peak = max(tracemalloc.get_traced_memory()[1], frame["child_traced_peak"])
+                if self._stack:
+                    parent = self._stack[-1]
+                    parent["child_traced_peak"] = max(parent["child_traced_peak"], traced_peak)
+                stage_peak = traced_peak - traced_before
+                entry["traced_peak_bytes"] = max(entry.get("traced_peak_bytes", 0), stage_peak)
+                if stage_peak > entry.get("snapshot_peak_bytes", 0) * _SNAPSHOT_GROWTH:
+                    snapshot_start = time.perf_counter()
+                    entry["snapshot_peak_bytes"] = stage_peak
+                    entry["top_allocations"] = self._top_allocations()
+                    overhead = time.perf_counter() - snapshot_start
+                    self.overhead_seconds += overhead
+                    if self._stack:
+                        self._stack[-1]["child_seconds"] += overhead
+
+    def record(self, name: str, seconds: float, records: int = 0, calls: int = 1):
+        """
+        Add time measured by the caller to stage `name`.
+
+        For fine-grained work (e.g. per-record validation) where entering a
+        context manager per call would cost more than the work itself. No
+        memory figures are kept for such stages.
+        """
+        if self._stack:
+            self._stack[-1]["child_seconds"] += seconds
+        entry = self._entry(name)
+        entry["seconds"] += seconds
+        entry["calls"] += calls
+        entry["records"] += records
+
+    def add_records(self, name: str, records: int):
+        """Add records to a stage whose record count is known only afterwards."""
+        self._entry(name)["records"] += records
+
+    def _top_allocations(self) -> List[Dict]:
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED_FRAMES)
+        return [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_mb": round(stat.size / (1024 * 1024), 3),
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics("lineno")[:self.top_allocations]
+        ]
+
+    def report(self) -> Dict[str, Dict]:
+        """Per-stage figures, in the order stages were first entered."""
+        report = {}
+        for name, entry in self.stages.items():
+            stage = {
+                "seconds": round(entry["seconds"], 4),
+                "calls": entry["calls"],
+                "records": entry["records"],
+                "records_per_sec": round(entry["records"] / entry["seconds"], 1) if entry["seconds"] > 0 else None,
+            }
+            if "peak_rss_mb" in entry:
+                stage["peak_rss_mb"] = round(entry["peak_rss_mb"], 1)
+                stage["rss_growth_mb"] = round(entry["rss_growth_mb"], 1)
+            if "traced_peak_bytes" in entry:
+                stage["traced_peak_mb"] = round(entry["traced_peak_bytes"] / (1024 * 1024), 2)
+                stage["top_allocations"] = entry.get("top_allocations", [])
+            report[name] = stage
+        return report
+
+    def summary_line(self) -> str:
+        parts = []
+        for name, entry in self.stages.items():
+            part = f"{name} {entry['seconds']:.2f}s"
+            if entry["records"] and entry["seconds"] > 0:
+                part += f" ({entry['records'] / entry['seconds']:,.0f}/s)"
+            parts.append(part)
+        return ", ".join(parts)
@@ -2,6 +2,17 @@
 """
 Test script for trained spaCy NER and Intent Classification models.
 This script validates model performance and provides examples of usage.
+
+The *_batch methods run many texts through nlp.pipe (--batch-size,
+--n-process) and return results in input order; the test suite uses them.
+The post-processing filter is added to the NER pipeline as a component, so
+it runs inside the nlp.pipe workers. --patterns puts the regex/catalog ruler
+(pattern_ruler.py) in front of ner; --pattern-only runs the ruler alone.
+With --server the models aren't loaded here: a running inference_server.py
+answers instead. Predictions are cached per text (inference_cache.py; in
+memory, plus on disk with --cache-db) for the fingerprint of the models.
+Top intents come from the textcat score matrix (intent_scoring.py), not by
+sorting every doc.cats.
 """
 
 import spacy
@@ -9,10 +20,16 @@ from pathlib import Path
 import json
 from typing import List, Dict, Tuple
 import argparse
+from contextlib import ExitStack
+
+import pattern_ruler
+from inference_cache import open_cache
+from intent_scoring import IntentScorer
+from inference_server import InferenceClient
 
 # Import post-processing filter
 try:
-    from fix_entity_extraction import post_process_entities
+    from fix_entity_extraction import ENTITY_FILTER_COMPONENT, add_entity_filter
     USE_FILTER = True
 except ImportError:
     USE_FILTER = False
@@ -22,9 +39,23 @@ except ImportError:
 class ModelTester:
     """Test and evaluate trained spaCy models."""
     
-    def __init__(self, ner_model_path: str = None, intent_model_path: str = None):
+    def __init__(self, ner_model_path: str = None, intent_model_path: str = None,
+                 batch_size: int = 256, n_process: int = 1, patterns: bool = False,
+                 pattern_only: bool = False, server: str = None, cache: bool = True,
+                 cache_db: str = None):
         self.ner_model = None
         self.intent_model = None
+        self.client = InferenceClient(server) if server else None
+        self.use_cache = cache
+        self.cache_db = Path(cache_db) if cache_db else None
+        self.cache = None
+        self.intent_scorer = None
+        self.has_ner = False
+        self.has_intent = False
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.patterns = patterns or pattern_only
+        self.pattern_only = pattern_only
         
         # Default paths
         if ner_model_path is None:
@@ -41,10 +72,18 @@ class ModelTester:
         print("LOADING TRAINED MODELS")
         print("="*70)
         
+        if self.client is not None:
+            self._connect()
+            return
+        
         if self.ner_model_path.exists():
             try:
                 print(f"\n📦 Loading NER model from: {self.ner_model_path}")
                 self.ner_model = spacy.load(str(self.ner_model_path))
+                if USE_FILTER:
+                    add_entity_filter(self.ner_model)
+                if self.patterns:
+                    pattern_ruler.add_pattern_ruler(self.ner_model)
                 print(f"✅ NER model loaded successfully")
                 print(f"   Pipeline: {self.ner_model.pipe_names}")
             except Exception as e:
@@ -53,7 +92,11 @@ class ModelTester:
         else:
             print(f"⚠️  NER model not found at: {self.ner_model_path}")
         
-        if self.intent_model_path.exists():
+        if self.ner_model is not None and self.intent_model_path.resolve() == self.ner_model_path.resolve():
+            # A merged pipeline (merge_pipelines.py) sets ents and cats in one pass
+            self.intent_model = self.ner_model
+            print(f"✅ Using the NER pipeline for intents too (merged pipeline)")
+        elif self.intent_model_path.exists():
             try:
                 print(f"\n📦 Loading Intent model from: {self.intent_model_path}")
                 self.intent_model = spacy.load(str(self.intent_model_path))
@@ -65,39 +108,148 @@ class ModelTester:
         else:
             print(f"⚠️  Intent model not found at: {self.intent_model_path}")
         
+        self.has_ner = self.ner_model is not None
+        self.has_intent = self.intent_model is not None
+        if self.has_intent:
+            try:
+                self.intent_scorer = IntentScorer(self.intent_model)
+            except ValueError as e:
+                print(f"⚠️  {e}")
+                self.has_intent = False
+        self._open_cache(
+            [self.ner_model_path, self.intent_model_path],
+            [self.ner_model.pipe_names if self.has_ner else None,
+             self.intent_model.pipe_names if self.has_intent else None],
+        )
+        print()
+    
+    def _open_cache(self, model_paths: List[Path], pipelines: List):
+        if not self.use_cache or not (self.has_ner or self.has_intent):
+            return
+        if any(pattern_ruler.PATTERN_RULER in (pipeline or []) for pipeline in pipelines):
+            # Catalog edits change the ruler's entities without touching the models
+            model_paths = [*model_paths, pattern_ruler.CATALOG_DIR]
+        self.cache = open_cache(model_paths, {"pipelines": pipelines, "pattern_only": self.pattern_only},
+                                db_path=self.cache_db)
+        if self.cache_db is not None:
+            print(f"♻️  Prediction cache: {self.cache_db} (model fingerprint {self.cache.fingerprint})")
+    
+    def _connect(self):
+        """Use the models of a running inference server."""
+        print(f"\n🔌 Using inference server at: {self.client.url}")
+        try:
+            info = self.client.health()
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"❌ Inference server not reachable: {e}")
+            return
+        self.has_ner = info["ner"] is not None
+        self.has_intent = info["intent"] is not None
+        print(f"✅ NER: {info['ner']} {info['ner_pipeline']}")
+        print(f"✅ Intent: {info['intent']} {info['intent_pipeline']}")
+        self._open_cache(
+            [Path(info["ner"]) if info["ner"] else None, Path(info["intent"]) if info["intent"] else None],
+            [info["ner_pipeline"], info["intent_pipeline"]],
+        )
         print()
     
     def test_ner(self, text: str, use_filter: bool = True) -> List[Tuple[str, str]]:
         """Test NER model on a text."""
-        if self.ner_model is None:
-            return []
-        
-        doc = self.ner_model(text)
-        entities = [(ent.text, ent.label_) for ent in doc.ents]
-        
-        # Apply post-processing filter to remove false positives
-        if use_filter and USE_FILTER:
-            entities = post_process_entities(entities, apply_filter=True, apply_validation=True)
-        
-        return entities
+        return self.test_ner_batch([text], use_filter)[0]
     
     def test_intent(self, text: str, top_n: int = 5) -> List[Tuple[str, float]]:
         """Test Intent model on a text."""
-        if self.intent_model is None:
-            return []
+        return self.test_intent_batch([text], top_n)[0]
+    
+    def _pipe(self, nlp, texts: List[str]):
+        return nlp.pipe(texts, batch_size=self.batch_size, n_process=self.n_process)
+    
+    def test_ner_batch(self, texts: List[str], use_filter: bool = True) -> List[List[Tuple[str, str]]]:
+        """Test NER model on many texts with nlp.pipe; one entity list per text, in order."""
+        if self.cache is None:
+            return self._ner_batch(texts, use_filter)
+        cached = self.cache.map("ner", texts, lambda misses: self._ner_batch(misses, use_filter),
+                                options=use_filter)
+        return [[tuple(entity) for entity in entities] for entities in cached]
+    
+    def _ner_batch(self, texts: List[str], use_filter: bool) -> List[List[Tuple[str, str]]]:
+        if self.client is not None and self.has_ner:
+            results = self.client.predict(texts, intents=False, filter=use_filter,
+                                          pattern_only=self.pattern_only)
+            return [[(entity[0], entity[1]) for entity in result["entities"]] for result in results]
+        if self.ner_model is None:
+            return [[] for _ in texts]
         
-        doc = self.intent_model(text)
-        intents = sorted(doc.cats.items(), key=lambda x: x[1], reverse=True)[:top_n]
-        return intents
+        with ExitStack() as stack:
+            if self.pattern_only:
+                stack.enter_context(pattern_ruler.pattern_only(self.ner_model))
+            elif not use_filter and USE_FILTER and ENTITY_FILTER_COMPONENT in self.ner_model.pipe_names:
+                stack.enter_context(self.ner_model.select_pipes(disable=[ENTITY_FILTER_COMPONENT]))
+            return [self._entities(doc) for doc in self._pipe(self.ner_model, texts)]
+    
+    def test_intent_batch(self, texts: List[str], top_n: int = 5) -> List[List[Tuple[str, float]]]:
+        """Test Intent model on many texts with nlp.pipe; one top-n list per text, in order."""
+        if self.cache is None:
+            return self._intent_batch(texts, top_n)
+        cached = self.cache.map("intent", texts, lambda misses: self._intent_batch(misses, top_n),
+                                options=top_n)
+        return [[tuple(intent) for intent in intents] for intents in cached]
+    
+    def _intent_batch(self, texts: List[str], top_n: int) -> List[List[Tuple[str, float]]]:
+        if self.client is not None and self.has_intent:
+            results = self.client.predict(texts, entities=False, top_n=top_n)
+            return [[(label, score) for label, score in result["intents"]] for result in results]
+        if self.intent_scorer is None:
+            return [[] for _ in texts]
+        
+        return self.intent_scorer.top_k(texts, top_n, batch_size=self.batch_size, n_process=self.n_process)
+    
+    @staticmethod
+    def _entities(doc) -> List[Tuple[str, str]]:
+        # False positives were already removed by the filter component
+        return [(ent.text, ent.label_) for ent in doc.ents]
     
     def test_combined(self, text: str):
         """Test both models on the same text."""
+        self.print_combined(text, self.test_ner(text), self.test_intent(text, top_n=5))
+    
+    def test_combined_batch(self, texts: List[str]):
+        """Test both models on many texts, then print the results in order."""
+        one_pass = self.client is not None or (
+            self.intent_scorer is not None and self.intent_model is self.ner_model and not self.pattern_only)
+        if not one_pass:
+            # Separate models: each call is cached on its own
+            entities = self.test_ner_batch(texts)
+            intents = self.test_intent_batch(texts, top_n=5)
+        elif self.cache is not None:
+            cached = self.cache.map("combined", texts, self._combined_batch)
+            entities = [[tuple(entity) for entity in result[0]] for result in cached]
+            intents = [[tuple(intent) for intent in result[1]] for result in cached]
+        else:
+            entities, intents = zip(*self._combined_batch(texts)) if texts else ((), ())
+        for i, text in enumerate(texts):
+            print(f"\n[Test {i + 1}/{len(texts)}]")
+            self.print_combined(text, entities[i], intents[i])
+    
+    def _combined_batch(self, texts: List[str]) -> List[Tuple[List, List]]:
+        """(entities, top 5 intents) per text, in one pass (server or merged pipeline)."""
+        if self.client is not None:
+            results = self.client.predict(texts, top_n=5, pattern_only=self.pattern_only)
+            return [([(entity[0], entity[1]) for entity in result["entities"]],
+                     [(label, score) for label, score in result["intents"]]) for result in results]
+        # The textcat is scored from the same docs instead of filling doc.cats
+        with self.ner_model.select_pipes(disable=[self.intent_scorer.name]):
+            docs = list(self._pipe(self.ner_model, texts))
+        return list(zip([self._entities(doc) for doc in docs],
+                        self.intent_scorer.top_k(docs, 5, batch_size=self.batch_size)))
+    
+    def print_combined(self, text: str, entities: List[Tuple[str, str]],
+                       intents: List[Tuple[str, float]]):
+        """Print the NER and intent results for one text."""
         print(f"\n📝 Text: {text}")
         print("-" * 70)
         
         # NER results
-        if self.ner_model:
-            entities = self.test_ner(text)
+        if self.has_ner:
             if entities:
                 print("🏷️  Entities Found:")
                 for entity_text, label in entities:
@@ -108,8 +260,7 @@ class ModelTester:
             print("🏷️  NER model not available")
         
         # Intent results
-        if self.intent_model:
-            intents = self.test_intent(text, top_n=5)
+        if self.has_intent:
             if intents:
                 print("\n🎯 Top Intents:")
                 for intent, score in intents:
@@ -151,15 +302,14 @@ class ModelTester:
         
         print("\n🔒 CYBERSECURITY TEST CASES")
         print("="*70)
-        for i, test in enumerate(cybersecurity_tests, 1):
-            print(f"\n[Test {i}/{len(cybersecurity_tests)}]")
-            self.test_combined(test)
+        self.test_combined_batch(cybersecurity_tests)
         
         print("\n\n🌐 OSINT TEST CASES")
         print("="*70)
-        for i, test in enumerate(osint_tests, 1):
-            print(f"\n[Test {i}/{len(osint_tests)}]")
-            self.test_combined(test)
+        self.test_combined_batch(osint_tests)
+        
+        if self.cache is not None:
+            print(f"\n{self.cache.summary()}")
     
     def evaluate_on_test_set(self, test_file: str, model_type: str = "ner"):
         """Evaluate model on the test set."""
@@ -259,10 +409,48 @@ def main():
         "--text",
         help="Test a single text string"
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help="Texts per nlp.pipe batch (default: 256)"
+    )
+    parser.add_argument(
+        "--n-process",
+        type=int,
+        default=1,
+        help="Processes per model for nlp.pipe (default: 1)"
+    )
+    parser.add_argument(
+        "--server",
+        help="Use a running inference_server.py (e.g. http://127.0.0.1:8765) instead of loading the models"
+    )
+    parser.add_argument(
+        "--patterns",
+        action="store_true",
+        help="Label regex/catalog entities before ner (pattern_ruler.py)"
+    )
+    parser.add_argument(
+        "--pattern-only",
+        action="store_true",
+        help="Extract entities with the regex/catalog ruler only, skipping ner"
+    )
+    parser.add_argument(
+        "--cache-db",
+        help="SQLite file that keeps predictions between runs (invalidated when the models change)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Don't cache predictions"
+    )
     
     args = parser.parse_args()
     
-    tester = ModelTester(args.ner_model, args.intent_model)
+    tester = ModelTester(args.ner_model, args.intent_model,
+                         batch_size=args.batch_size, n_process=args.n_process,
+                         patterns=args.patterns, pattern_only=args.pattern_only,
+                         server=args.server, cache=not args.no_cache, cache_db=args.cache_db)
     tester.load_models()
     
     if args.text:
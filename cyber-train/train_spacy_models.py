@@ -11,12 +11,20 @@ This script:
 5. Generates training reports
 """
 
+import json
 import subprocess
 import sys
+from contextlib import ExitStack
 from pathlib import Path
 import argparse
 from datetime import datetime
 
+from run_registry import RunRecorder, corpus_files
+
+# Registers the custom corpus readers (cyber.SparseIntentCorpus.v1)
+CORPUS_READERS = Path(__file__).resolve().parent / "corpus_readers.py"
+TRAINING_DRIVER = Path(__file__).resolve().parent / "training_driver.py"
+
 
 def run_command(cmd: list, description: str, show_output: bool = True):
     """Run a command and handle errors."""
@@ -126,10 +134,89 @@ def create_intent_config(output_path: Path, train_path: Path, dev_path: Path,
     return True
 
 
-def train_ner_model(config_path: Path, output_dir: Path, train_path: Path, 
-                   dev_path: Path, gpu: bool = False):
-    """Train NER model."""
-    output_dir.mkdir(parents=True, exist_ok=True)
+def corpus_overrides(sparse: bool = False, weights_file: Path = None) -> dict:
+    """
+    Config overrides that switch train/dev to the readers in corpus_readers.py.
+    
+    sparse=True reads intent corpora with cyber.SparseIntentCorpus.v1;
+    weights_file oversamples the training corpus with cyber.WeightedCorpus.v1
+    (which also reads sparse sidecars). Empty when neither is used.
+    """
+    overrides = {}
+    if sparse:
+        overrides["corpora.train.@readers"] = "cyber.SparseIntentCorpus.v1"
+        overrides["corpora.dev.@readers"] = "cyber.SparseIntentCorpus.v1"
+    if weights_file:
+        overrides["corpora.train.@readers"] = "cyber.WeightedCorpus.v1"
+        overrides["corpora.train.weights_file"] = str(weights_file)
+    return overrides
+
+
+def add_mini_dev_corpus(config_path: Path, size: int) -> Path:
+    """
+    Write a copy of a training config with a [corpora.dev_mini] section.
+
+    training_driver.py then evaluates on a stratified `size`-doc subset of
+    the dev set every eval_frequency steps and on the full dev set only
+    every few evaluations (see cyber.StratifiedDevCorpus.v1). The copy sits
+    next to the config (config_ner_mini_dev.cfg), so the config itself, which
+    --skip-config reuses, is left as it was; returns the copy's path.
+    """
+    from spacy import util
+
+    config = util.load_config(config_path, interpolate=False)
+    config["corpora"]["dev_mini"] = {
+        "@readers": "cyber.StratifiedDevCorpus.v1",
+        "path": "${paths.dev}",
+        "size": size,
+        "seed": 0,
+        "gold_preproc": False,
+        "max_length": 0,
+        "limit": 0,
+        "augmenter": None,
+    }
+    mini_config_path = config_path.with_name(f"{config_path.stem}_mini_dev{config_path.suffix}")
+    config.to_disk(mini_config_path)
+    print(f"🧩 Mini-dev evaluation ({size} docs) added in {mini_config_path.name}")
+    return mini_config_path
+
+
+def train_command(config_path: Path, output_dir: Path, train_path: Path, dev_path: Path,
+                  gpu: bool = False, sparse: bool = False, in_process: bool = False,
+                  resume: bool = False, warm_start: Path = None, rehearsal_path: Path = None,
+                  warm_steps: int = 0, weights_file: Path = None) -> list:
+    """
+    Build the training command line.
+
+    `spacy train` by default; with in_process=True, training_driver.py (used
+    when jobs run in parallel, so each still gets metrics and checkpoints).
+    sparse/weights_file: see corpus_overrides.
+    warm_start/rehearsal_path/warm_steps need in_process=True.
+    """
+    readers = corpus_overrides(sparse, weights_file)
+    if in_process:
+        cmd = [
+            sys.executable, str(TRAINING_DRIVER),
+            str(config_path),
+            "--output", str(output_dir),
+            "--train", str(train_path),
+            "--dev", str(dev_path),
+            # Also registers the reader of an optional [corpora.dev_mini]
+            "--code", str(CORPUS_READERS),
+        ]
+        for key, value in readers.items():
+            cmd.extend(["--override", f"{key}={value}"])
+        if resume:
+            cmd.append("--resume")
+        if warm_start:
+            cmd.extend(["--warm-start", str(warm_start)])
+        if rehearsal_path:
+            cmd.extend(["--rehearsal", str(rehearsal_path)])
+        if warm_steps:
+            cmd.extend(["--override", f"training.max_steps={warm_steps}"])
+        if gpu:
+            cmd.append("--gpu")
+        return cmd
     
     cmd = [
         sys.executable, "-m", "spacy", "train",
@@ -139,30 +226,58 @@ def train_ner_model(config_path: Path, output_dir: Path, train_path: Path,
         "--paths.dev", str(dev_path),
     ]
     
+    if readers:
+        cmd.extend(["--code", str(CORPUS_READERS)])
+        for key, value in readers.items():
+            cmd.extend([f"--{key}", value])
+    
     if gpu:
         cmd.append("--gpu-id")
         cmd.append("0")
     
+    return cmd
+
+
+def train_ner_model(config_path: Path, output_dir: Path, train_path: Path, 
+                   dev_path: Path, gpu: bool = False, in_process: bool = False,
+                   resume: bool = False, weights_file: Path = None, **warm):
+    """Train NER model (weights_file: see corpus_overrides; warm: see warm_start_options)."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    if in_process:
+        overrides = corpus_overrides(weights_file=weights_file)
+        return train_in_process(config_path, output_dir, train_path, dev_path,
+                                "Training NER Model", gpu=gpu, resume=resume,
+                                overrides=overrides, code_path=CORPUS_READERS,
+                                **warm)
+    
+    cmd = train_command(config_path, output_dir, train_path, dev_path, gpu, weights_file=weights_file)
     return run_command(cmd, "Training NER Model")
 
 
 def train_intent_model(config_path: Path, output_dir: Path, train_path: Path,
-                      dev_path: Path, gpu: bool = False):
-    """Train Intent Classification model."""
-    output_dir.mkdir(parents=True, exist_ok=True)
+                      dev_path: Path, gpu: bool = False, sparse: bool = False,
+                      in_process: bool = False, resume: bool = False,
+                      weights_file: Path = None, **warm):
+    """
+    Train Intent Classification model.
     
-    cmd = [
-        sys.executable, "-m", "spacy", "train",
-        str(config_path),
-        "--output", str(output_dir),
-        "--paths.train", str(train_path),
-        "--paths.dev", str(dev_path),
-    ]
+    With sparse=True the train/dev corpora are read with
+    cyber.SparseIntentCorpus.v1, which takes the categories from the
+    .cats.npz files written by prepare_spacy_training.py --sparse-intents.
+    weights_file: see corpus_overrides; warm: see warm_start_options.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
     
-    if gpu:
-        cmd.append("--gpu-id")
-        cmd.append("0")
+    if in_process:
+        overrides = corpus_overrides(sparse, weights_file)
+        return train_in_process(config_path, output_dir, train_path, dev_path,
+                                "Training Intent Classification Model", gpu=gpu, resume=resume,
+                                overrides=overrides, code_path=CORPUS_READERS,
+                                **warm)
     
+    cmd = train_command(config_path, output_dir, train_path, dev_path, gpu, sparse=sparse,
+                        weights_file=weights_file)
     return run_command(cmd, "Training Intent Classification Model")
 
 
@@ -182,6 +297,127 @@ def evaluate_model(model_path: Path, test_path: Path, task_type: str):
     return run_command(cmd, f"Evaluating {task_type} model on test set")
 
 
+def train_in_process(config_path: Path, output_dir: Path, train_path: Path, dev_path: Path,
+                     description: str, gpu: bool = False, resume: bool = False,
+                     overrides: dict = None, code_path: Path = None,
+                     warm_start: Path = None, rehearsal_path: Path = None, warm_steps: int = 0):
+    """
+    Train with training_driver.TrainingDriver instead of `spacy train`.
+
+    Progress is printed as it happens, per-step metrics go to
+    <output_dir>/training_metrics.jsonl, and with resume=True training
+    continues from model-last after an interruption. warm_start fine-tunes
+    an existing pipeline for warm_steps steps, optionally with a rehearsal
+    sample of an older training corpus.
+    """
+    from training_driver import TrainingDriver
+
+    print(f"\n{'='*70}")
+    print(f"{description} (in-process)")
+    print(f"{'='*70}")
+    config_overrides = {"paths.train": str(train_path), "paths.dev": str(dev_path)}
+    config_overrides.update(overrides or {})
+    if warm_steps:
+        config_overrides["training.max_steps"] = warm_steps
+    driver = TrainingDriver(config_path, output_dir, config_overrides, gpu=gpu, code_path=code_path,
+                            warm_start=warm_start, rehearsal_path=rehearsal_path)
+    try:
+        driver.run(resume=resume)
+    except Exception as e:
+        print(f"❌ Error: {description}: {e}")
+        return False
+    state = driver.load_state()
+    # An interrupted run leaves a checkpoint to resume, not a model to evaluate
+    return bool(state and state.get("finished"))
+
+
+def warm_start_options(args, model_dir: Path, train_name: str) -> dict:
+    """
+    Warm-start keyword arguments for one model, or {} for a fresh run.
+
+    Starts from <model_dir>/model-last; the rehearsal corpus is
+    <rehearsal-dir>/<train_name> when --rehearsal-dir is given.
+    """
+    if not args.warm_start or args.resume:
+        return {}
+    model_last = model_dir / "model-last"
+    if not model_last.exists():
+        print(f"⚠️  No {model_last} to warm-start from, training from scratch")
+        return {}
+    warm = {"warm_start": model_last, "warm_steps": args.warm_steps}
+    if args.rehearsal_dir:
+        rehearsal_path = Path(args.rehearsal_dir) / train_name
+        if rehearsal_path.exists():
+            warm["rehearsal_path"] = rehearsal_path
+        else:
+            print(f"⚠️  No rehearsal corpus {rehearsal_path}, fine-tuning without rehearsal")
+    return warm
+
+
+def run_parallel_training(jobs: list, args, output_dir: Path):
+    """
+    Run the collected (name, cmd, model_dir, test_path, task_type, run)
+    training jobs concurrently, then evaluate the models that finished.
+    Every job's run is charged the joint training wall time.
+    """
+    from parallel_training import TrainingJob, run_jobs, split_cores
+
+    names = [name for name, *_ in jobs]
+    shares = {"ner": args.ner_cores, "intent": args.intent_cores}
+    try:
+        cores = split_cores(names, {name: shares[name] for name in names if shares[name]})
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        return False
+    if len(jobs) > 1 and cores[names[0]] == cores[names[1]]:
+        print("⚠️  Fewer cores than jobs: both jobs will share the same cores")
+    
+    log_path = Path(args.log_file) if args.log_file else output_dir / "training_parallel.log"
+    print(f"\n{'='*70}")
+    print(f"Training {' and '.join(names)} in parallel")
+    print(f"{'='*70}")
+    print(f"Merged log: {log_path}")
+    with ExitStack() as stack:
+        for *_, run in jobs:
+            stack.enter_context(run.phase("train"))
+        results = run_jobs([TrainingJob(name, cmd, cores[name]) for name, cmd, *_ in jobs], log_path)
+    
+    for name, _, model_dir, test_path, task_type, run in jobs:
+        if not results[name]:
+            print(f"❌ Error: training {name} failed (see {log_path})")
+            run.finish(False, task_type)
+            continue
+        state_path = model_dir / "training_state.json"
+        if args.in_process and state_path.exists():
+            with open(state_path, 'r') as f:
+                if not json.load(f).get("finished"):
+                    print(f"💾 {name} was interrupted; continue with --resume")
+                    run.finish(False, task_type)
+                    continue
+        best_model = model_dir / "model-best"
+        if best_model.exists():
+            with run.phase("evaluate"):
+                evaluate_model(best_model, test_path, task_type)
+        run.finish(True, task_type)
+    return all(results.values())
+
+
+def new_run(args, model: str, data_dir: Path, config_path: Path, prefix: str,
+            model_dir: Path) -> RunRecorder:
+    """Start a registry entry for one model (a no-op recorder with --no-registry)."""
+    registry = None
+    if not args.no_registry:
+        registry = Path(args.registry) if args.registry else Path(args.output_dir) / "run_registry.sqlite"
+    settings = {key: getattr(args, key) for key in (
+        "gpu", "in_process", "resume", "parallel", "sparse_intents", "sample_weights",
+        "warm_start", "warm_steps", "mini_dev", "skip_config",
+    )}
+    run = RunRecorder(registry, model, data_dir, config_path, corpus_files(data_dir, prefix),
+                      data_dir / f"{prefix}_train.spacy", model_dir, gpu=args.gpu, settings=settings)
+    run.start()
+    return run
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Train spaCy models for Cybersecurity and OSINT"
@@ -216,8 +452,89 @@ def main():
         action="store_true",
         help="Skip config creation (use existing configs)"
     )
+    parser.add_argument(
+        "--sparse-intents",
+        action="store_true",
+        help="Read intent categories from the sparse .cats.npz files "
+             "(requires prepare_spacy_training.py --sparse-intents)"
+    )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Train with training_driver.py: live progress, per-step metrics JSONL, "
+             "clean checkpoint on Ctrl+C"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue interrupted training from model-last (implies --in-process)"
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Train NER and intent models at the same time in separate processes, "
+             "each pinned to its own cores"
+    )
+    parser.add_argument(
+        "--ner-cores",
+        type=int,
+        default=0,
+        help="Cores for the NER job with --parallel (default: even split)"
+    )
+    parser.add_argument(
+        "--intent-cores",
+        type=int,
+        default=0,
+        help="Cores for the intent job with --parallel (default: even split)"
+    )
+    parser.add_argument(
+        "--log-file",
+        help="Merged log for --parallel (default: <output-dir>/training_parallel.log)"
+    )
+    parser.add_argument(
+        "--sample-weights",
+        help="JSON file with pillar_weights/label_weights/pillar_targets: oversample the "
+             "training corpus on the fly with cyber.WeightedCorpus.v1 (see corpus_readers.py)"
+    )
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="Fine-tune the existing <model>/model-last on the updated data instead of "
+             "training from scratch (implies --in-process)"
+    )
+    parser.add_argument(
+        "--warm-steps",
+        type=int,
+        default=2000,
+        help="max_steps for --warm-start (default: 2000)"
+    )
+    parser.add_argument(
+        "--mini-dev",
+        type=int,
+        default=0,
+        metavar="SIZE",
+        help="Evaluate on a stratified SIZE-doc dev subset between full dev evaluations "
+             "(writes copies of the configs with [corpora.dev_mini]; implies --in-process)"
+    )
+    parser.add_argument(
+        "--registry",
+        help="Run registry SQLite file (default: <output-dir>/run_registry.sqlite); "
+             "see run_registry.py to list and compare runs"
+    )
+    parser.add_argument(
+        "--no-registry",
+        action="store_true",
+        help="Don't record this run in the run registry"
+    )
+    parser.add_argument(
+        "--rehearsal-dir",
+        help="Directory with the previous entities_train.spacy/intents_train.spacy; "
+             "a sample of it is mixed in with --warm-start"
+    )
     
     args = parser.parse_args()
+    if args.resume or args.warm_start or args.mini_dev:
+        args.in_process = True
     
     data_dir = Path(args.data_dir)
     output_dir = Path(args.output_dir)
@@ -241,6 +558,10 @@ def main():
     print(f"Output directory: {output_dir}")
     print(f"GPU: {args.gpu}")
     
+    # With --parallel the training commands are collected here and started
+    # together once both configs exist
+    parallel_jobs = []
+    
     # Train NER model
     if not args.intent_only:
         if not all([entity_train.exists(), entity_dev.exists(), entity_test.exists(), entity_labels.exists()]):
@@ -251,17 +572,36 @@ def main():
         config_dir = output_dir / "configs"
         config_dir.mkdir(exist_ok=True)
         ner_config = config_dir / "config_ner.cfg"
+        ner_model_dir = output_dir / "ner_model"
+        ner_run = new_run(args, "ner", data_dir, ner_config, "entities", ner_model_dir)
         
-        if not args.skip_config:
-            if not create_ner_config(ner_config, entity_train, entity_dev, entity_labels, args.gpu):
-                return
+        with ner_run.phase("config"):
+            if not args.skip_config:
+                if not create_ner_config(ner_config, entity_train, entity_dev, entity_labels, args.gpu):
+                    ner_run.finish(False, "NER")
+                    return
+            if args.mini_dev:
+                ner_config = ner_run.config_path = add_mini_dev_corpus(ner_config, args.mini_dev)
         
-        ner_model_dir = output_dir / "ner_model"
-        if train_ner_model(ner_config, ner_model_dir, entity_train, entity_dev, args.gpu):
-            # Evaluate on test set
-            best_model = ner_model_dir / "model-best"
-            if best_model.exists():
-                evaluate_model(best_model, entity_test, "NER")
+        ner_warm = warm_start_options(args, ner_model_dir, entity_train.name)
+        if args.parallel:
+            parallel_jobs.append(("ner", train_command(
+                ner_config, ner_model_dir, entity_train, entity_dev, args.gpu,
+                in_process=args.in_process, resume=args.resume,
+                weights_file=args.sample_weights, **ner_warm
+            ), ner_model_dir, entity_test, "NER", ner_run))
+        else:
+            with ner_run.phase("train"):
+                trained = train_ner_model(ner_config, ner_model_dir, entity_train, entity_dev, args.gpu,
+                                          in_process=args.in_process, resume=args.resume,
+                                          weights_file=args.sample_weights, **ner_warm)
+            if trained:
+                # Evaluate on test set
+                best_model = ner_model_dir / "model-best"
+                if best_model.exists():
+                    with ner_run.phase("evaluate"):
+                        evaluate_model(best_model, entity_test, "NER")
+            ner_run.finish(trained, "NER")
     
     # Train Intent Classification model
     if not args.ner_only:
@@ -270,34 +610,66 @@ def main():
             print("   Run prepare_spacy_training.py first")
             return
         
+        if args.sparse_intents:
+            from corpus_readers import sparse_cats_path
+            missing = [p for p in (sparse_cats_path(intent_train), sparse_cats_path(intent_dev)) if not p.exists()]
+            if missing:
+                print(f"\n❌ Missing sparse intent files: {', '.join(str(p) for p in missing)}")
+                print("   Run prepare_spacy_training.py --sparse-intents first")
+                return
+        
         config_dir = output_dir / "configs"
         config_dir.mkdir(exist_ok=True)
         intent_config = config_dir / "config_intent.cfg"
+        intent_model_dir = output_dir / "intent_model"
+        intent_run = new_run(args, "intent", data_dir, intent_config, "intents", intent_model_dir)
         
-        if not args.skip_config:
-            if not create_intent_config(intent_config, intent_train, intent_dev, intent_labels, args.gpu):
-                # Fallback to manual config creation
-                print("\n⚠️  CLI config creation failed, trying manual creation...")
-                import subprocess
-                fallback_cmd = [
-                    sys.executable, "cyber-train/create_config_manual.py",
-                    "--type", "intent",
-                    "--data-dir", str(data_dir),
-                    "--output-dir", str(config_dir)
-                ]
-                if subprocess.run(fallback_cmd).returncode == 0:
-                    print("✅ Manual config creation succeeded")
-                else:
-                    print("❌ Manual config creation also failed")
-                    print("   You can create the config manually or use --skip-config")
-                    return
+        with intent_run.phase("config"):
+            if not args.skip_config:
+                if not create_intent_config(intent_config, intent_train, intent_dev, intent_labels, args.gpu):
+                    # Fallback to manual config creation
+                    print("\n⚠️  CLI config creation failed, trying manual creation...")
+                    import subprocess
+                    fallback_cmd = [
+                        sys.executable, "cyber-train/create_config_manual.py",
+                        "--type", "intent",
+                        "--data-dir", str(data_dir),
+                        "--output-dir", str(config_dir)
+                    ]
+                    if subprocess.run(fallback_cmd).returncode == 0:
+                        print("✅ Manual config creation succeeded")
+                    else:
+                        print("❌ Manual config creation also failed")
+                        print("   You can create the config manually or use --skip-config")
+                        intent_run.finish(False, "INTENT")
+                        return
+            if args.mini_dev:
+                intent_config = intent_run.config_path = add_mini_dev_corpus(intent_config, args.mini_dev)
         
-        intent_model_dir = output_dir / "intent_model"
-        if train_intent_model(intent_config, intent_model_dir, intent_train, intent_dev, args.gpu):
-            # Evaluate on test set
-            best_model = intent_model_dir / "model-best"
-            if best_model.exists():
-                evaluate_model(best_model, intent_test, "INTENT")
+        intent_warm = warm_start_options(args, intent_model_dir, intent_train.name)
+        if args.parallel:
+            parallel_jobs.append(("intent", train_command(
+                intent_config, intent_model_dir, intent_train, intent_dev, args.gpu,
+                sparse=args.sparse_intents, in_process=args.in_process, resume=args.resume,
+                weights_file=args.sample_weights, **intent_warm
+            ), intent_model_dir, intent_test, "INTENT", intent_run))
+        else:
+            with intent_run.phase("train"):
+                trained = train_intent_model(intent_config, intent_model_dir, intent_train, intent_dev,
+                                             args.gpu, sparse=args.sparse_intents,
+                                             in_process=args.in_process, resume=args.resume,
+                                             weights_file=args.sample_weights, **intent_warm)
+            if trained:
+                # Evaluate on test set
+                best_model = intent_model_dir / "model-best"
+                if best_model.exists():
+                    with intent_run.phase("evaluate"):
+                        evaluate_model(best_model, intent_test, "INTENT")
+            intent_run.finish(trained, "INTENT")
+    
+    if parallel_jobs:
+        if not run_parallel_training(parallel_jobs, args, output_dir):
+            return
     
     print("\n" + "="*70)
     print("✅ TRAINING COMPLETE!")
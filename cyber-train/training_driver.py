@@ -0,0 +1,619 @@
+#!/usr/bin/env python3
+"""
+In-process spaCy training driver with streaming metrics and resumable checkpoints.
+
+`python -m spacy train` run through subprocess gives no feedback until the
+process exits and always starts from scratch. This driver runs the same
+update steps as spacy.training.loop.train_while_improving in-process, but
+numbers them from the resumed step and evaluates itself (every
+eval_frequency steps counted from step 0, and at max_steps), and:
+1. Streams one JSON line per step to a metrics log (losses, words/sec, and
+   dev scores on evaluation steps), flushed as it goes
+2. Stops early after N evaluations without improvement (on top of the
+   config's own `patience`)
+3. Handles SIGINT/SIGTERM by finishing the current step, writing a
+   checkpoint and exiting cleanly (a second signal aborts immediately)
+4. Writes model-last atomically together with training_state.json, and
+   resumes from them: weights, step, epoch and best score are restored and
+   the learning-rate schedule is fast-forwarded. Optimizer moments restart,
+   since thinc keys them by in-memory model IDs. Resuming a completed run
+   with a larger training.max_steps trains it further (hyperparam_sweep.py
+   grows its trials this way).
+5. Warm-starts from an existing pipeline (e.g. models/ner_model/model-last)
+   instead of random weights: labels that are new in the training corpus are
+   added to the trained components, and a sample of an older training
+   corpus can be mixed in (rehearsal) so a short fine-tuning run on fixed
+   data doesn't forget what the fixes didn't touch
+6. With a [corpora.dev_mini] section in the config (e.g. the
+   cyber.StratifiedDevCorpus.v1 reader over ${paths.dev}), evaluates on
+   that small subset every eval_frequency steps and on the full dev set
+   only every --full-eval-every evaluations and at the end. Checkpoints,
+   model-best, early stopping, the config's patience and best_score follow
+   the full dev score; the metrics log has both ("mini_score" and "score")
+
+Usage:
+    python cyber-train/training_driver.py cyber-train/models/configs/config_ner.cfg \\
+        --output cyber-train/models/ner_model \\
+        --train cyber-train/spacy-training/entities_train.spacy \\
+        --dev cyber-train/spacy-training/entities_dev.spacy
+    # after an interruption
+    python cyber-train/training_driver.py ... --resume
+    # fine-tune the existing model after a data fix
+    python cyber-train/training_driver.py ... --warm-start cyber-train/models/ner_model/model-last \
+        --override training.max_steps=2000 --rehearsal old/entities_train.spacy
+    # frequent mini-dev evaluation (config has [corpora.dev_mini])
+    python cyber-train/training_driver.py ... --code cyber-train/corpus_readers.py --full-eval-every 5
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import signal
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import spacy
+from spacy import util
+from spacy.pipeline import EntityRecognizer, TextCategorizer
+from spacy.schemas import ConfigSchemaTraining
+from spacy.training import Corpus
+from spacy.training.initialize import init_nlp
+from spacy.training.loop import (
+    create_before_to_disk_callback,
+    create_evaluation_callback,
+    create_train_batches,
+    subdivide_batch,
+    update_meta,
+)
+from thinc.api import constant, fix_random_seed, require_gpu, set_gpu_allocator
+
+DIR_MODEL_BEST = "model-best"
+DIR_MODEL_LAST = "model-last"
+STATE_FILE = "training_state.json"
+METRICS_FILE = "training_metrics.jsonl"
+# Optional small dev corpus for frequent evaluation
+MINI_DEV_CORPUS = "corpora.dev_mini"
+
+
+def _float_scores(scores: Optional[Dict]) -> Dict:
+    """Drop per-type breakdowns so metric lines stay small."""
+    if not scores:
+        return {}
+    return {key: float(value) for key, value in scores.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)}
+
+
+def train_steps(nlp, optimizer, train_data, *, start_step: int, eval_frequency: int,
+                max_steps: int, dropout, accumulate_gradient: int, exclude: List[str],
+                annotating_components: List[str], before_update=None):
+    """
+    The update steps of spaCy's train_while_improving, numbered from start_step.
+    
+    Yields (batch, info, is_eval) per step, where is_eval marks steps on
+    which the caller should evaluate: every eval_frequency steps counted from
+    step 0 (so a resumed run keeps the schedule) and the max_steps step.
+    info["losses"] accumulates until the next evaluation step, like spaCy's.
+    """
+    dropouts = constant(dropout) if isinstance(dropout, float) else dropout
+    losses: Dict[str, float] = {}
+    words_seen = 0
+    for step, (epoch, batch) in enumerate(train_data, start_step):
+        if before_update:
+            before_update(nlp, {"step": step, "epoch": epoch})
+        drop = next(dropouts)
+        for subbatch in subdivide_batch(batch, accumulate_gradient):
+            nlp.update(subbatch, drop=drop, losses=losses, sgd=False,
+                       exclude=exclude, annotates=annotating_components)
+        for name, proc in nlp.pipeline:
+            if name not in exclude and getattr(proc, "is_trainable", False) and \
+                    proc.model not in (True, False, None):
+                proc.finish_update(optimizer)
+        optimizer.step_schedules()
+        words_seen += sum(len(eg) for eg in batch)
+        is_eval = step % eval_frequency == 0 or step == max_steps
+        yield batch, {"epoch": epoch, "step": step, "losses": losses, "words": words_seen}, is_eval
+        if is_eval:
+            losses = {}
+        if max_steps and step >= max_steps:
+            break
+
+
+class TrainingDriver:
+    """Runs spaCy training in this process; see module docstring."""
+
+    def __init__(self, config_path: Path, output_dir: Path, overrides: Dict[str, str] = None,
+                 gpu: bool = False, metrics_path: Path = None,
+                 early_stop_patience: int = 0, min_delta: float = 0.0,
+                 code_path: Path = None, warm_start: Path = None,
+                 rehearsal_path: Path = None, rehearsal_fraction: float = 0.2,
+                 rehearsal_seed: int = 0, full_eval_every: int = 5):
+        self.config_path = Path(config_path)
+        self.output_dir = Path(output_dir)
+        self.overrides = dict(overrides or {})
+        self.gpu = gpu
+        self.metrics_path = Path(metrics_path) if metrics_path else self.output_dir / METRICS_FILE
+        self.early_stop_patience = early_stop_patience
+        self.min_delta = min_delta
+        self.code_path = Path(code_path) if code_path else None
+        self.warm_start = Path(warm_start) if warm_start else None
+        self.rehearsal_path = Path(rehearsal_path) if rehearsal_path else None
+        self.rehearsal_fraction = rehearsal_fraction
+        self.rehearsal_seed = rehearsal_seed
+        self.full_eval_every = max(1, full_eval_every)
+        self._stop_signal = None
+
+    # ------------------------------------------------------------------
+    # Checkpoints
+    # ------------------------------------------------------------------
+
+    @property
+    def state_path(self) -> Path:
+        return self.output_dir / STATE_FILE
+
+    def load_state(self) -> Optional[Dict]:
+        """Return the saved training state if model-last and its state exist."""
+        if not self.state_path.exists() or not (self.output_dir / DIR_MODEL_LAST).exists():
+            return None
+        with open(self.state_path, 'r') as f:
+            return json.load(f)
+
+    def _write_model(self, nlp, name: str):
+        """Write a pipeline directory via a temp dir so a crash never leaves it half-written."""
+        target = self.output_dir / name
+        tmp = self.output_dir / f"{name}.tmp"
+        old = self.output_dir / f"{name}.old"
+        for leftover in (tmp, old):
+            if leftover.exists():
+                shutil.rmtree(leftover)
+        nlp.to_disk(tmp)
+        if target.exists():
+            target.rename(old)
+        tmp.rename(target)
+        if old.exists():
+            shutil.rmtree(old)
+
+    def _write_state(self, state: Dict):
+        tmp = self.state_path.with_suffix(".json.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, self.state_path)
+
+    # ------------------------------------------------------------------
+    # Signals
+    # ------------------------------------------------------------------
+
+    def _handle_signal(self, signum, frame):
+        self._stop_signal = signal.Signals(signum).name
+        print(f"\n⚠️  Received {self._stop_signal}: saving a checkpoint after this step "
+              f"(send again to abort immediately)", flush=True)
+        # A second signal falls through to the default behaviour
+        signal.signal(signum, signal.SIG_DFL if signum == signal.SIGTERM else signal.default_int_handler)
+
+    # ------------------------------------------------------------------
+    # Training
+    # ------------------------------------------------------------------
+
+    def _load_nlp(self, resume_state: Optional[Dict]):
+        if self.code_path is not None:
+            util.import_file("cyber_train_code", self.code_path)
+        if self.gpu:
+            require_gpu(0)
+        if resume_state is not None:
+            # model-last carries the full training config; re-apply the
+            # overrides so corpus paths and readers follow this invocation
+            return spacy.load(self.output_dir / DIR_MODEL_LAST, config=self.overrides)
+        if self.warm_start is not None:
+            # The pipeline's own config is kept (its weights only fit that
+            # architecture), but the training schedule and corpora come from
+            # the config given here
+            config = util.load_config(self.config_path, overrides=self.overrides, interpolate=False)
+            sections = {section: config[section] for section in ("paths", "corpora", "training")}
+            return spacy.load(self.warm_start, config={**sections, **self.overrides})
+        config = util.load_config(self.config_path, overrides=self.overrides, interpolate=False)
+        return init_nlp(config, use_gpu=0 if self.gpu else -1)
+
+    @staticmethod
+    def _add_new_labels(nlp, corpus, frozen_components: List[str]) -> Dict[str, List[str]]:
+        """Add labels seen in the training corpus to already-trained NER/textcat pipes."""
+        found = defaultdict(set)
+        for example in corpus(nlp):
+            reference = example.reference
+            found["ents"].update(ent.label_ for ent in reference.ents)
+            found["cats"].update(reference.cats)
+
+        added = {}
+        for name, pipe in nlp.pipeline:
+            if name in frozen_components:
+                continue
+            if isinstance(pipe, EntityRecognizer):
+                labels = found["ents"]
+            elif isinstance(pipe, TextCategorizer):
+                labels = found["cats"]
+            else:
+                continue
+            # add_label resizes the output layer and keeps the trained weights
+            new = sorted(label for label in labels if label not in pipe.labels)
+            for label in new:
+                pipe.add_label(label)
+            if new:
+                added[name] = new
+        return added
+
+    def _with_rehearsal(self, train_corpus):
+        """Wrap the train corpus so it also yields a fixed sample of the rehearsal corpus."""
+        from corpus_readers import SparseIntentCorpus, sparse_cats_path
+
+        # Intent corpora written with --sparse-intents keep their cats in a sidecar
+        sparse = sparse_cats_path(self.rehearsal_path).exists()
+        old_corpus = (SparseIntentCorpus if sparse else Corpus)(self.rehearsal_path)
+        fraction = self.rehearsal_fraction
+        seed = self.rehearsal_seed
+        sample = None
+
+        def draw_sample(nlp) -> list:
+            # Old copies of texts that are still in the corpus would undo the fixes
+            texts = set()
+            n_train = 0
+            for example in train_corpus(nlp):
+                texts.add(example.reference.text)
+                n_train += 1
+            old = [example for example in old_corpus(nlp) if example.reference.text not in texts]
+            drawn = random.Random(seed).sample(old, min(len(old), round(n_train * fraction)))
+            print(f"♻️  Rehearsal: {len(drawn)} of {len(old)} old examples "
+                  f"mixed into {n_train} training examples", flush=True)
+            return drawn
+
+        def rehearsal_corpus(nlp):
+            nonlocal sample
+            # Drawn once: with max_epochs = -1 the corpus is re-read every epoch
+            if sample is None:
+                sample = draw_sample(nlp)
+            yield from train_corpus(nlp)
+            for example in sample:
+                yield example.copy()
+
+        return rehearsal_corpus
+
+    def run(self, resume: bool = False) -> Path:
+        """Train (or continue training) and return the model-last path."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        state = self.load_state() if resume else None
+        if resume and state is None:
+            print(f"⚠️  No checkpoint in {self.output_dir}, starting from scratch")
+        if state is not None and state.get("finished") and state.get("stop_reason") != "completed":
+            print(f"✅ Training in {self.output_dir} already stopped at step {state['step']} "
+                  f"({state.get('stop_reason')})")
+            return self.output_dir / DIR_MODEL_LAST
+
+        nlp = self._load_nlp(state)
+        config = nlp.config.interpolate()
+        T = util.registry.resolve(config["training"], schema=ConfigSchemaTraining)
+        start_step = state["step"] + 1 if state else 0
+        if T["seed"] is not None:
+            # Offset the seed on resume so the shuffles don't replay epoch 0
+            fix_random_seed(T["seed"] + start_step)
+        if self.gpu and T["gpu_allocator"]:
+            set_gpu_allocator(T["gpu_allocator"])
+
+        train_corpus, dev_corpus = util.resolve_dot_names(config, [T["train_corpus"], T["dev_corpus"]])
+        mini_corpus = None
+        if "dev_mini" in config.get("corpora", {}):
+            mini_corpus = util.resolve_dot_names(config, [MINI_DEV_CORPUS])[0]
+        optimizer = T["optimizer"]
+        before_to_disk = create_before_to_disk_callback(T["before_to_disk"])
+        frozen_components = T["frozen_components"]
+        if state is None and self.warm_start is not None:
+            print(f"🔄 Warm start from {self.warm_start}", flush=True)
+            for name, labels in self._add_new_labels(nlp, train_corpus, frozen_components).items():
+                print(f"🧩 Added {len(labels)} new labels to {name}: {', '.join(labels[:10])}"
+                      f"{' ...' if len(labels) > 10 else ''}", flush=True)
+        if self.rehearsal_path is not None:
+            train_corpus = self._with_rehearsal(train_corpus)
+
+        max_steps = T["max_steps"]
+        # A completed run can be extended by resuming with a larger max_steps
+        if state is not None and state.get("finished") and not max_steps:
+            print(f"✅ Training in {self.output_dir} already finished at step {state['step']}")
+            return self.output_dir / DIR_MODEL_LAST
+        if max_steps and start_step >= max_steps:
+            # train_steps would still run the step after the checkpoint
+            print(f"✅ Checkpoint is already at max_steps ({max_steps})")
+            if not state.get("finished"):
+                self._write_state({**state, "finished": True, "stop_reason": "completed"})
+            return self.output_dir / DIR_MODEL_LAST
+        # Fast-forward learning-rate and other schedules to the resumed step
+        for _ in range(start_step):
+            optimizer.step_schedules()
+
+        best_score = state["best_score"] if state else None
+        best_step = state["best_step"] if state else None
+        checkpoints = state["checkpoints"] if state else []
+        evals_since_best = state.get("evals_since_best", 0) if state else 0
+        epoch_offset = state["epoch"] if state else 0
+        words_before = state["words"] if state else 0
+        seconds_before = state["seconds"] if state else 0.0
+        # Wall time minus evaluations and checkpoint writes; older states only have "seconds"
+        train_seconds = state.get("train_seconds", seconds_before) if state else 0.0
+
+        steps = train_steps(
+            nlp,
+            optimizer,
+            create_train_batches(nlp, train_corpus, T["batcher"], T["max_epochs"]),
+            start_step=start_step,
+            eval_frequency=T["eval_frequency"],
+            max_steps=max_steps,
+            dropout=T["dropout"],
+            accumulate_gradient=T["accumulate_gradient"],
+            exclude=frozen_components,
+            annotating_components=T["annotating_components"],
+            before_update=T["before_update"],
+        )
+
+        def averaged(evaluate):
+            # Score the averaged weights, as spaCy's loop does
+            def averaged_evaluate():
+                if optimizer.averages:
+                    with nlp.use_params(optimizer.averages):
+                        return evaluate()
+                return evaluate()
+            return averaged_evaluate
+
+        step_evaluate = averaged(create_evaluation_callback(nlp, mini_corpus or dev_corpus, T["score_weights"]))
+        full_evaluate = None
+        if mini_corpus is not None:
+            full_evaluate = averaged(create_evaluation_callback(nlp, dev_corpus, T["score_weights"]))
+
+        def full_eval_due(step: int) -> bool:
+            # By step, so a resumed run keeps the same schedule
+            return (step // T["eval_frequency"]) % self.full_eval_every == 0
+
+        def snapshot_state(step: int, epoch: int, words: int, seconds: float, **flags) -> Dict:
+            return {
+                "config": str(self.config_path),
+                "overrides": self.overrides,
+                "step": step,
+                "epoch": epoch,
+                "words": words,
+                "seconds": round(seconds, 2),
+                "train_seconds": round(train_seconds, 2),
+                "words_per_sec": round(words / train_seconds, 1) if train_seconds else None,
+                "best_score": best_score,
+                "best_step": best_step,
+                "checkpoints": checkpoints,
+                "evals_since_best": evals_since_best,
+                "warm_start": str(self.warm_start) if self.warm_start else None,
+                **flags,
+            }
+
+        def save_checkpoint(state_dict: Dict, is_best: bool):
+            if optimizer.averages:
+                with nlp.use_params(optimizer.averages):
+                    self._write_model(before_to_disk(nlp), DIR_MODEL_LAST)
+            else:
+                self._write_model(before_to_disk(nlp), DIR_MODEL_LAST)
+            if is_best:
+                best_tmp = self.output_dir / f"{DIR_MODEL_BEST}.tmp"
+                if best_tmp.exists():
+                    shutil.rmtree(best_tmp)
+                shutil.copytree(self.output_dir / DIR_MODEL_LAST, best_tmp)
+                if (self.output_dir / DIR_MODEL_BEST).exists():
+                    shutil.rmtree(self.output_dir / DIR_MODEL_BEST)
+                best_tmp.rename(self.output_dir / DIR_MODEL_BEST)
+            self._write_state(state_dict)
+
+        def record_eval(info: Dict, step: int) -> bool:
+            """Track a full dev evaluation; returns whether it is the new best."""
+            nonlocal best_score, best_step, evals_since_best
+            score = float(info["score"])
+            checkpoints.append([score, step])
+            is_best = best_score is None or score > best_score + self.min_delta
+            if is_best:
+                best_score, best_step, evals_since_best = score, step, 0
+            else:
+                evals_since_best += 1
+            with nlp.select_pipes(disable=frozen_components):
+                update_meta(T, nlp, info)
+            return is_best
+
+        previous_handlers = {sig: signal.signal(sig, self._handle_signal)
+                             for sig in (signal.SIGINT, signal.SIGTERM)}
+        if start_step == 0 and self.metrics_path.exists():
+            self.metrics_path.unlink()
+
+        print(f"🚀 Training {nlp.pipe_names} from step {start_step} "
+              f"(max_steps: {max_steps or 'unlimited'}, eval every {T['eval_frequency']})", flush=True)
+        print(f"   Metrics: {self.metrics_path}", flush=True)
+        if full_evaluate is not None:
+            print(f"   Mini-dev every {T['eval_frequency']} steps, full dev every "
+                  f"{T['eval_frequency'] * self.full_eval_every} steps and at the end", flush=True)
+
+        stop_reason = "completed"
+        step = start_step - 1
+        epoch = epoch_offset
+        words = words_before
+        started = time.perf_counter()
+        last_time = started
+        last_words = 0
+        # Training-only time and words since the last printed evaluation
+        interval_seconds = 0.0
+        interval_words = 0
+        try:
+            with open(self.metrics_path, 'a') as metrics:
+                for batch, info, is_eval in steps:
+                    step = info["step"]
+                    epoch = epoch_offset + info["epoch"]
+                    words = words_before + info["words"]
+                    now = time.perf_counter()
+                    step_seconds = now - last_time
+                    step_words = info["words"] - last_words
+                    words_per_sec = step_words / step_seconds if step_seconds else 0.0
+                    last_words = info["words"]
+                    interval_seconds += step_seconds
+                    interval_words += step_words
+                    train_seconds += step_seconds
+
+                    record = {
+                        "step": step,
+                        "epoch": epoch,
+                        "words": words,
+                        "words_per_sec": round(words_per_sec, 1),
+                        "seconds": round(seconds_before + now - started, 2),
+                        "losses": {name: round(loss, 4) for name, loss in info["losses"].items()},
+                    }
+
+                    if is_eval:
+                        score, other_scores = step_evaluate()
+                        info = {**info, "score": score, "other_scores": other_scores}
+                        score_text = ""
+                        if full_evaluate is not None:
+                            record["mini_score"] = float(info["score"])
+                            score_text = f"mini {record['mini_score']:.4f}  "
+                        if full_evaluate is None or full_eval_due(step):
+                            if full_evaluate is not None:
+                                full_score, full_scores = full_evaluate()
+                                info = {**info, "score": full_score, "other_scores": full_scores}
+                            is_best = record_eval(info, step)
+                            record.update({
+                                "score": float(info["score"]),
+                                "is_best": is_best,
+                                "scores": _float_scores(info["other_scores"]),
+                            })
+                            save_checkpoint(snapshot_state(step, epoch, words, record["seconds"]), is_best)
+                            score_text += f"score {record['score']:.4f}{' ★' if is_best else ''}"
+                        loss_text = " ".join(f"{name} {loss:.2f}" for name, loss in info["losses"].items())
+                        interval_speed = interval_words / interval_seconds if interval_seconds else 0.0
+                        print(f"📊 step {step:6d}  epoch {epoch:3d}  loss {loss_text}  "
+                              f"{score_text.rstrip()}  {interval_speed:,.0f} words/s", flush=True)
+                        interval_seconds, interval_words = 0.0, 0
+
+                    metrics.write(json.dumps(record) + "\n")
+                    metrics.flush()
+                    # The next step's time starts after evaluations and checkpoint writes
+                    last_time = time.perf_counter()
+
+                    if self._stop_signal:
+                        stop_reason = f"signal:{self._stop_signal}"
+                        break
+                    if T["patience"] and best_step is not None and step - best_step >= T["patience"]:
+                        print(f"⏹️  No dev improvement in {step - best_step} steps (patience)", flush=True)
+                        break
+                    if self.early_stop_patience and evals_since_best >= self.early_stop_patience:
+                        stop_reason = "early_stop"
+                        print(f"⏹️  No improvement in {evals_since_best} evaluations, stopping early", flush=True)
+                        break
+        finally:
+            for sig, handler in previous_handlers.items():
+                signal.signal(sig, handler)
+
+        finished = not stop_reason.startswith("signal")
+        is_best = False
+        if finished and full_evaluate is not None and step >= start_step and \
+                not (checkpoints and checkpoints[-1][1] == step):
+            # The last steps were only scored on the mini-dev set
+            score, scores = full_evaluate()
+            is_best = record_eval({"score": score, "other_scores": scores, "losses": info["losses"]}, step)
+            print(f"📊 step {step:6d}  final full dev score {float(score):.4f}{' ★' if is_best else ''}",
+                  flush=True)
+            with open(self.metrics_path, 'a') as metrics:
+                metrics.write(json.dumps({"step": step, "score": float(score), "is_best": is_best,
+                                          "scores": _float_scores(scores), "final": True}) + "\n")
+        save_checkpoint(snapshot_state(step, epoch, words, seconds_before + time.perf_counter() - started,
+                                       finished=finished, stop_reason=stop_reason), is_best)
+        if finished:
+            best_text = f"{best_score:.4f} at step {best_step}" if best_score is not None else "n/a"
+            print(f"✅ Training {stop_reason} at step {step}; best score {best_text}")
+        else:
+            print(f"💾 Checkpoint saved at step {step}; continue with --resume")
+        return self.output_dir / DIR_MODEL_LAST
+
+
+def parse_overrides(pairs) -> Dict[str, str]:
+    """Turn ["section.key=value", ...] into a config override dict."""
+    overrides = {}
+    for pair in pairs or []:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise ValueError(f"Override {pair!r} must look like section.key=value")
+        # Values are config strings; let numbers/booleans/JSON pass through
+        try:
+            overrides[key] = json.loads(value)
+        except json.JSONDecodeError:
+            overrides[key] = value
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train a spaCy pipeline in-process with streaming metrics and resume"
+    )
+    parser.add_argument("config", help="Training config (.cfg)")
+    parser.add_argument("--output", required=True, help="Output directory for model-last/model-best")
+    parser.add_argument("--train", help="Training corpus (sets paths.train)")
+    parser.add_argument("--dev", help="Dev corpus (sets paths.dev)")
+    parser.add_argument(
+        "--override",
+        action="append",
+        metavar="KEY=VALUE",
+        help="Config override, e.g. training.max_steps=5000 (repeatable)"
+    )
+    parser.add_argument("--code", help="Python file with registered functions (e.g. corpus_readers.py)")
+    parser.add_argument("--gpu", action="store_true", help="Train on GPU 0")
+    parser.add_argument("--resume", action="store_true", help="Continue from model-last in the output directory")
+    parser.add_argument("--metrics", help=f"Metrics JSONL path (default: <output>/{METRICS_FILE})")
+    parser.add_argument(
+        "--early-stop-patience",
+        type=int,
+        default=0,
+        help="Stop after this many evaluations without improvement (0 = only the config's patience)"
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=0.0,
+        help="Minimum score gain that counts as an improvement (default: 0)"
+    )
+    parser.add_argument(
+        "--warm-start",
+        help="Initialize from this trained pipeline (e.g. models/ner_model/model-last) "
+             "instead of random weights"
+    )
+    parser.add_argument(
+        "--rehearsal",
+        help="Older training corpus (.spacy) to mix a sample of into the training data"
+    )
+    parser.add_argument(
+        "--rehearsal-fraction",
+        type=float,
+        default=0.2,
+        help="Rehearsal sample size relative to the training corpus (default: 0.2)"
+    )
+    parser.add_argument(
+        "--full-eval-every",
+        type=int,
+        default=5,
+        help="With [corpora.dev_mini] in the config: evaluations between full dev "
+             "evaluations (default: 5)"
+    )
+    args = parser.parse_args()
+
+    overrides = parse_overrides(args.override)
+    if args.train:
+        overrides["paths.train"] = args.train
+    if args.dev:
+        overrides["paths.dev"] = args.dev
+
+    driver = TrainingDriver(args.config, Path(args.output), overrides, gpu=args.gpu,
+                            metrics_path=args.metrics, early_stop_patience=args.early_stop_patience,
+                            min_delta=args.min_delta, code_path=args.code,
+                            warm_start=args.warm_start, rehearsal_path=args.rehearsal,
+                            rehearsal_fraction=args.rehearsal_fraction,
+                            full_eval_every=args.full_eval_every)
+    driver.run(resume=args.resume)
+
+
+if __name__ == "__main__":
+    main()